@@ -11,6 +11,37 @@ class Config:
     # 监控配置
     MONITOR_INTERVAL = 60  # 秒
     SIGNAL_THRESHOLD = 4   # 触发信号的指标数量阈值
+    MONITOR_WORKERS = 16   # 监控列表并发检查的线程数
+    MONITOR_HISTORY_TTL = 1800  # 监控使用的历史K线缓存时间（秒），当日K线由实时快照更新
+    
+    # 阻塞任务（数据获取、指标计算）线程池大小
+    BLOCKING_WORKERS = 8
+    
+    # 指标序列计算后端：pandas / numpy / numba（numba未安装时使用numpy实现）
+    INDICATOR_BACKEND = os.getenv("INDICATOR_BACKEND", "pandas")
+    
+    # 回测参数扫描的进程数
+    BACKTEST_PROCESSES = 4
+    
+    # 后台回测任务线程数和结果缓存条数
+    BACKTEST_JOB_WORKERS = 2
+    BACKTEST_CACHE_SIZE = 256
+    
+    # 行业映射刷新
+    INDUSTRY_REFRESH_CONCURRENCY = 8  # 并发获取行业成分股的线程数
+    INDUSTRY_FETCH_RETRIES = 3        # 单个行业获取失败的重试次数
+    INDUSTRY_RETRY_DELAY = 1          # 重试间隔基数（秒），按重试次数递增
+    INDUSTRY_RETRY_INTERVAL = 300     # 整体刷新失败后再次发起的最小间隔（秒）
+    INDUSTRY_MAX_FAILED_RATIO = 0.2   # 获取失败的行业占比超过该值时放弃本次刷新
+    
+    # 实时行情快照
+    SPOT_CACHE_TTL = 10  # 全市场行情快照缓存时间（秒）
+    
+    # 历史K线内存缓存上限（MB），超出后按最近最少使用淘汰
+    STOCK_CACHE_MAX_MB = 128
+    
+    # 本地最早K线晚于覆盖起点超过该天数时视为期间上市，更早的区间没有K线（不会再下载）
+    BAR_LISTING_GAP_DAYS = 15
     
     # 指标参数
     MACD_FAST = 12
@@ -25,6 +56,12 @@ class Config:
     
     # 数据库
     DATABASE_URL = "sqlite:///./stock_monitor.db"
+    DB_WRITE_BATCH_SIZE = 500  # 指标历史/提醒缓冲写入的批量大小，达到后立即写入
+    HISTORY_RETENTION_DAYS = 7  # 分钟级指标历史保留天数，更早的记录压缩为日汇总
+    HISTORY_COMPACT_HOUR = 3    # 每天执行历史压缩的时间（点）
+    
+    # 使用orjson编码REST响应和WebSocket JSON消息（需安装orjson，未安装时自动回退）
+    FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
     
     # API配置
     API_HOST = "0.0.0.0"
@@ -32,5 +69,6 @@ class Config:
     
     # WebSocket
     WS_HEARTBEAT_INTERVAL = 30
+    WS_SEND_QUEUE_SIZE = 100  # 每个连接的发送队列长度，溢出的慢客户端会被断开
 
 config = Config()
@@ -1,5 +1,6 @@
 # 数据库模型
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, Float, Date, DateTime, Text, Boolean, Index, UniqueConstraint
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -14,6 +15,7 @@ class Stock(Base):
     code = Column(String(10), unique=True, index=True)
     name = Column(String(100))
     industry = Column(String(100), index=True, nullable=True)  # 所属行业
+    watched = Column(Boolean, default=True, index=True)  # 是否在监控列表中（行业同步写入的股票为False）
     created_at = Column(DateTime, default=datetime.now)
 
 
@@ -31,10 +33,11 @@ class Industry(Base):
 
 class IndicatorHistory(Base):
     __tablename__ = "indicator_history"
+    __table_args__ = (Index("ix_indicator_history_code_time", "stock_code", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    stock_code = Column(String(10), index=True)
-    timestamp = Column(DateTime, default=datetime.now)
+    stock_code = Column(String(10))
+    timestamp = Column(DateTime, default=datetime.now, index=True)  # 按时间范围清理/查询
 
     # 指标状态
     macd_signal = Column(String(20))
@@ -53,11 +56,32 @@ class IndicatorHistory(Base):
     final_signal = Column(String(20))
 
 
+class IndicatorDaily(Base):
+    """指标历史日汇总表（超过保留期的分钟级记录压缩为每股每日一行）"""
+
+    __tablename__ = "indicator_daily"
+    __table_args__ = (UniqueConstraint("stock_code", "date", name="uq_indicator_daily_code_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_code = Column(String(10))
+    date = Column(Date)
+    sample_count = Column(Integer, default=0)  # 当日原始记录数
+    rsi_count = Column(Integer, default=0)  # 有RSI值的记录数（rsi_avg的权重）
+    rsi_avg = Column(Float)
+    rsi_min = Column(Float)
+    rsi_max = Column(Float)
+    buy_signals_max = Column(Integer, default=0)
+    sell_signals_max = Column(Integer, default=0)
+    buy_count = Column(Integer, default=0)  # 最终信号为BUY的记录数
+    sell_count = Column(Integer, default=0)  # 最终信号为SELL的记录数
+
+
 class SignalAlert(Base):
     __tablename__ = "signal_alerts"
+    __table_args__ = (Index("ix_signal_alerts_code_time", "stock_code", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    stock_code = Column(String(10), index=True)
+    stock_code = Column(String(10))
     timestamp = Column(DateTime, default=datetime.now)
     signal_type = Column(String(10))
     signal_count = Column(Integer)
@@ -65,14 +89,97 @@ class SignalAlert(Base):
     price = Column(Float)
 
 
+class DailyBar(Base):
+    """日线行情表（前复权），按股票代码+日期唯一"""
+
+    __tablename__ = "daily_bars"
+    __table_args__ = (UniqueConstraint("stock_code", "date", name="uq_daily_bars_code_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_code = Column(String(10))
+    date = Column(Date)
+    open = Column(Float)
+    close = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    volume = Column(Float)
+    amount = Column(Float)
+
+
+class BarSync(Base):
+    """日线同步记录：本地已覆盖的起始日期和最近一次同步日期"""
+
+    __tablename__ = "bar_sync"
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_code = Column(String(10), unique=True, index=True)
+    start_date = Column(Date)  # 本地数据覆盖的最早请求日期
+    synced_on = Column(Date)  # 最近一次同步的日期（早于该日的K线同步时已收盘）
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
 # 数据库配置
 DATABASE_URL = "sqlite:///./stock_monitor.db"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎（aiosqlite），供事件循环中的读写使用，不占用线程池
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./stock_monitor.db"
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+# SQLite连接参数：WAL模式下读写互不阻塞，synchronous=NORMAL只在检查点时fsync
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64000,  # 约64MB页缓存
+    "busy_timeout": 5000,  # 写锁等待（毫秒）
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新建的SQLite连接设置PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _create_missing_indexes()
+
+
+def _add_missing_columns():
+    """为已有数据库补充新增的列（create_all不会修改已存在的表）"""
+    columns = {column["name"] for column in inspect(engine).get_columns("stocks")}
+    if "watched" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE stocks ADD COLUMN watched BOOLEAN DEFAULT 1"))
+
+    columns = {column["name"] for column in inspect(engine).get_columns("indicator_daily")}
+    if "rsi_count" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE indicator_daily ADD COLUMN rsi_count INTEGER DEFAULT 0"))
+            # 已有汇总无法区分RSI为空的记录，按全部记录计
+            conn.execute(text(
+                "UPDATE indicator_daily SET rsi_count = sample_count WHERE rsi_avg IS NOT NULL"
+            ))
+
+
+def _create_missing_indexes():
+    """为已有数据库补充新增的索引（create_all不会为已存在的表建索引）"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 
 def get_db():
@@ -81,3 +188,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
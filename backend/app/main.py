@@ -4,60 +4,117 @@ import json
 from datetime import datetime
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from contextlib import asynccontextmanager
 
-from app.database import init_db
+from app.config import config
+from app.database import init_db, async_engine
 from app.routers import stocks, indicators, backtest, industries
+from app.services.backtest_service import backtest_service
+from app.services.broadcast_hub import (
+    ALL_TOPIC,
+    broadcast_hub,
+    delta_topic,
+    industry_topic,
+    stock_topic,
+    stock_topics,
+)
+from app.services.delta_encoder import delta_encoder
+from app.services.history_service import history_service
+from app.services.industry_service import industry_service
 from app.services.monitor_service import monitor_service
+from app.services.serialization import (
+    MSGPACK_SUBPROTOCOL,
+    FastJSONResponse,
+    loads_msgpack,
+    msgpack_available,
+)
+from app.services.worker_pool import worker_pool
+from app.services.write_buffer import write_buffer
 
-# 存储WebSocket连接
-websocket_connections: list = []
+# 应用事件循环（供工作线程中的回调投递消息）
+event_loop: asyncio.AbstractEventLoop = None
 
 
-async def broadcast_to_clients(message: dict):
-    """广播消息到所有WebSocket客户端"""
-    disconnected = []
-    for ws in websocket_connections:
-        try:
-            await ws.send_json(message)
-        except Exception:
-            disconnected.append(ws)
+async def publish_stock_message(code: str, message: dict, include_all: bool = True):
+    """
+    推送某只股票的消息给订阅了该股票或其所属行业的客户端
 
-    # 移除断开的连接
-    for ws in disconnected:
-        if ws in websocket_connections:
-            websocket_connections.remove(ws)
+    include_all为True时同时推送给未订阅任何主题的客户端（兼容旧客户端）。
+    """
+    topics = stock_topics(code, industry_service.get_cached_stock_industry(code))
+    if include_all:
+        topics.append(ALL_TOPIC)
+    broadcast_hub.publish(topics, message)
 
 
 def on_signal_triggered(result: dict):
-    """信号触发回调"""
-    asyncio.create_task(broadcast_to_clients({"type": "signal", "data": result}))
+    """信号触发回调（在工作线程中调用，投递到事件循环推送）"""
+    if event_loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(
+        publish_stock_message(result["stock_code"], {"type": "signal", "data": result}),
+        event_loop,
+    )
 
 
 async def monitor_task():
-    """定时监控任务"""
-    result = monitor_service.check_signals()
-    if result:
-        await broadcast_to_clients({"type": "indicators", "data": result})
+    """定时监控任务：扫描监控列表中的所有股票（在线程池中执行，不阻塞事件循环）"""
+    results = await worker_pool.run(monitor_service.check_watchlist)
+    # 本轮的指标历史和提醒记录在一个事务中写入（异步引擎）
+    await write_buffer.flush_async()
+    for result in results:
+        # 每只股票的指标推送给其订阅者；当前关注股票同时推送给未订阅的客户端，兼容单股仪表盘
+        code = result["stock_code"]
+        await publish_stock_message(
+            code,
+            {"type": "indicators", "data": result},
+            include_all=code == monitor_service.current_stock,
+        )
+        # 增量模式的订阅者只收到变化的字段
+        delta = delta_encoder.update(code, result)
+        if delta is not None:
+            industry = industry_service.get_cached_stock_industry(code)
+            broadcast_hub.publish(stock_topics(code, industry, delta=True), delta)
+    if results:
+        broadcast_hub.publish([ALL_TOPIC], {"type": "watchlist", "data": results})
+
+
+async def compact_history_task():
+    """定时压缩保留期之前的指标历史"""
+    result = await worker_pool.run(history_service.compact_history)
+    if result["rows"]:
+        print(f"指标历史压缩完成: {result['days']}天, {result['rows']}条记录")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
+    global event_loop
+
     # 启动时初始化
+    event_loop = asyncio.get_running_loop()
     init_db()
+    industry_service.warm_start()
     monitor_service.register_callback(on_signal_triggered)
 
     # 启动调度器
     scheduler = AsyncIOScheduler()
     scheduler.add_job(
         monitor_task,
-        trigger=IntervalTrigger(seconds=60),
+        trigger=IntervalTrigger(seconds=config.MONITOR_INTERVAL),
         id="monitor_task",
         replace_existing=True,
     )
+    scheduler.add_job(
+        compact_history_task,
+        trigger=CronTrigger(hour=config.HISTORY_COMPACT_HOUR),
+        id="compact_history_task",
+        replace_existing=True,
+    )
     scheduler.start()
 
     print("=" * 50)
@@ -69,6 +126,9 @@ async def lifespan(app: FastAPI):
 
     # 关闭时清理
     scheduler.shutdown()
+    backtest_service.shutdown()
+    await write_buffer.flush_async()
+    await async_engine.dispose()
     print("股票监控系统已关闭")
 
 
@@ -78,6 +138,7 @@ app = FastAPI(
     description="A股技术指标监控与信号提醒系统",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse if config.FAST_JSON else JSONResponse,
 )
 
 # CORS配置
@@ -97,31 +158,77 @@ app.include_router(industries.router)
 
 
 # WebSocket端点
+def send_snapshots(websocket: WebSocket, stocks: list, industries: list):
+    """发送股票（及行业内已有监控结果的股票）的指标快照"""
+    codes = list(stocks)
+    if industries:
+        industries = set(industries)
+        codes += [
+            code
+            for code in delta_encoder.codes()
+            if industry_service.get_cached_stock_industry(code) in industries
+        ]
+    for message in delta_encoder.snapshots(dict.fromkeys(codes)):
+        broadcast_hub.send(websocket, message)
+
+
+async def receive_message(websocket: WebSocket) -> dict:
+    """接收一条客户端消息（JSON文本帧或MessagePack二进制帧）"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return loads_msgpack(message["bytes"])
+    return json.loads(message["text"])
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    websocket_connections.append(websocket)
-    print(f"WebSocket客户端已连接，当前连接数: {len(websocket_connections)}")
+    # 客户端在握手时声明msgpack子协议则以MessagePack二进制帧推送
+    binary = msgpack_available() and MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if binary else None)
+    broadcast_hub.connect(websocket, binary=binary)
+    print(f"WebSocket客户端已连接，当前连接数: {len(broadcast_hub)}")
 
     try:
         while True:
-            # 接收心跳
-            data = await websocket.receive_text()
-            msg = json.loads(data)
+            # 接收心跳和订阅消息
+            msg = await receive_message(websocket)
 
             if msg.get("type") == "ping":
-                await websocket.send_json(
-                    {"type": "pong", "time": datetime.now().isoformat()}
+                broadcast_hub.send(
+                    websocket, {"type": "pong", "time": datetime.now().isoformat()}
                 )
 
+            # 订阅/取消订阅股票或行业：{"type": "subscribe", "stocks": [...], "industries": [...]}
+            # mode为"delta"时先收到快照，之后只收到变化的字段（带序列号）
+            elif msg.get("type") in ("subscribe", "unsubscribe"):
+                stocks = msg.get("stocks", [])
+                industries = msg.get("industries", [])
+                topics = [stock_topic(code) for code in stocks] + [
+                    industry_topic(name) for name in industries
+                ]
+                delta = msg.get("mode") == "delta"
+                if delta:
+                    topics = [delta_topic(topic) for topic in topics]
+                if msg["type"] == "subscribe":
+                    subscribed = broadcast_hub.subscribe(websocket, topics)
+                else:
+                    subscribed = broadcast_hub.unsubscribe(websocket, topics)
+                broadcast_hub.send(websocket, {"type": "subscribed", "topics": subscribed})
+                if delta and msg["type"] == "subscribe":
+                    send_snapshots(websocket, stocks, industries)
+
+            # 增量模式下序列号不连续时重新请求快照：{"type": "snapshot", "stocks": [...]}
+            elif msg.get("type") == "snapshot":
+                send_snapshots(websocket, msg.get("stocks", []), msg.get("industries", []))
+
     except WebSocketDisconnect:
-        if websocket in websocket_connections:
-            websocket_connections.remove(websocket)
-        print(f"WebSocket客户端已断开，当前连接数: {len(websocket_connections)}")
+        broadcast_hub.disconnect(websocket)
+        print(f"WebSocket客户端已断开，当前连接数: {len(broadcast_hub)}")
     except Exception as e:
         print(f"WebSocket错误: {e}")
-        if websocket in websocket_connections:
-            websocket_connections.remove(websocket)
+        broadcast_hub.disconnect(websocket)
 
 
 @app.get("/")
@@ -1,8 +1,10 @@
 # 回测路由
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
-from typing import List
-from app.services.backtest_service import backtest_service
+from typing import List, Optional
+from app.services.backtest_service import backtest_service, SWEEP_SORT_FIELDS
+from app.services.backtest_jobs import backtest_jobs
+from app.services.worker_pool import worker_pool
 
 router = APIRouter(prefix="/api/backtest", tags=["backtest"])
 
@@ -15,6 +17,23 @@ class BacktestRequest(BaseModel):
     min_buy_signals: int = Field(
         default=None, description="最少买入信号数（默认等于indicators长度）"
     )
+    mode: str = Field(
+        default="vectorized", description="回测模式: vectorized-向量化, loop-逐日计算"
+    )
+
+
+class SweepRequest(BaseModel):
+    stocks: List[str] = Field(..., min_length=1, description="股票代码列表")
+    combinations: Optional[List[List[str]]] = Field(
+        default=None, description="指标组合列表（默认全部组合）"
+    )
+    hold_days: List[int] = Field(default=[5], min_length=1, description="持有天数列表")
+    min_buy_signals: Optional[List[int]] = Field(
+        default=None, description="最少买入信号数列表（默认每个组合的指标全部满足）"
+    )
+    days_history: int = Field(default=365, ge=30, le=1095, description="回测历史天数")
+    sort_by: str = Field(default="avg_return", description="排序字段: avg_return/win_rate/total_signals")
+    limit: int = Field(default=100, ge=1, le=5000, description="返回的结果条数")
 
 
 class BacktestResponse(BaseModel):
@@ -31,11 +50,12 @@ class BacktestResponse(BaseModel):
     max_return: float
     min_return: float
     trades: List[dict]
+    metrics: dict = Field(default=None, description="资金曲线绩效：收益、最大回撤、夏普/索提诺、持仓重叠、基准对比")
+    equity_curve: List[dict] = Field(default=None, description="每日资金曲线（策略与买入持有基准，初始为1）")
 
 
-@router.post("/run", response_model=BacktestResponse)
-def run_backtest(request: BacktestRequest):
-    """运行回测"""
+def validate_request(request: BacktestRequest):
+    """验证回测参数，无效时抛出400"""
     # 验证指标
     available_indicators = [
         i["key"] for i in backtest_service.get_available_indicators()
@@ -46,14 +66,17 @@ def run_backtest(request: BacktestRequest):
     if invalid_indicators:
         raise HTTPException(status_code=400, detail=f"无效的指标: {invalid_indicators}")
 
+    if request.mode not in ("vectorized", "loop"):
+        raise HTTPException(status_code=400, detail=f"无效的回测模式: {request.mode}")
+
+
+@router.post("/run", response_model=BacktestResponse)
+async def run_backtest(request: BacktestRequest):
+    """运行回测（相同参数且数据未更新时直接返回缓存结果）"""
+    validate_request(request)
+
     # 运行回测
-    result = backtest_service.run_backtest(
-        stock_code=request.stock_code,
-        indicators=request.indicators,
-        hold_days=request.hold_days,
-        days_history=request.days_history,
-        min_buy_signals=request.min_buy_signals,
-    )
+    result = await worker_pool.run(backtest_jobs.run, request.model_dump())
 
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
@@ -61,6 +84,55 @@ def run_backtest(request: BacktestRequest):
     return result
 
 
+@router.post("/jobs")
+def submit_backtest_job(request: BacktestRequest):
+    """提交后台回测任务，返回任务ID（命中缓存时任务直接完成）"""
+    validate_request(request)
+    return backtest_jobs.submit(request.model_dump())
+
+
+@router.get("/jobs/{job_id}")
+def get_backtest_job(job_id: str):
+    """查询回测任务状态和进度（status: pending/running/done/failed），完成后包含结果"""
+    job = backtest_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="回测任务不存在")
+    return job
+
+
+@router.post("/sweep")
+async def run_sweep(request: SweepRequest):
+    """多股票、多指标组合、多持有天数的回测扫描，返回排序后的结果表"""
+    available_indicators = [
+        i["key"] for i in backtest_service.get_available_indicators()
+    ]
+    invalid_indicators = sorted({
+        i for combo in request.combinations or [] for i in combo
+        if i not in available_indicators
+    })
+    if invalid_indicators:
+        raise HTTPException(status_code=400, detail=f"无效的指标: {invalid_indicators}")
+    if request.combinations is not None and not all(request.combinations):
+        raise HTTPException(status_code=400, detail="指标组合不能为空")
+
+    if any(not 1 <= days <= 30 for days in request.hold_days):
+        raise HTTPException(status_code=400, detail="持有天数应在1-30之间")
+
+    if request.sort_by not in SWEEP_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"无效的排序字段: {request.sort_by}")
+
+    return await worker_pool.run(
+        backtest_service.run_sweep,
+        request.stocks,
+        request.combinations,
+        request.hold_days,
+        request.min_buy_signals,
+        request.days_history,
+        request.sort_by,
+        request.limit,
+    )
+
+
 @router.get("/indicators")
 def get_available_indicators():
     """获取可用的指标列表"""
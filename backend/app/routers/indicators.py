@@ -1,8 +1,12 @@
 # 指标查询路由
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from app.services.monitor_service import monitor_service
 from app.services.data_service import data_service
+from app.services.history_service import history_service
+from app.services.worker_pool import worker_pool
+from app.services.write_buffer import write_buffer
 
 router = APIRouter(prefix="/api/indicators", tags=["indicators"])
 
@@ -11,17 +15,65 @@ class StockSwitchRequest(BaseModel):
     name: str = ""
 
 @router.get("/current")
-def get_current_indicators():
+async def get_current_indicators():
     """获取当前指标"""
-    result = monitor_service.check_signals()
+    result = await worker_pool.run(monitor_service.check_signals)
+    await write_buffer.flush_async()
     if result is None:
         raise HTTPException(status_code=500, detail="获取指标失败")
     return result
 
 @router.get("/alerts")
-def get_recent_alerts(limit: int = 20):
+async def get_recent_alerts(limit: int = 20, code: str = None):
     """获取最近信号"""
-    return monitor_service.get_recent_alerts(limit)
+    return await monitor_service.get_recent_alerts(limit, code)
+
+@router.get("/history")
+async def get_indicator_history(
+    code: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    signal: str = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str = None,
+):
+    """
+    分页查询指标历史（按时间倒序）
+    
+    Args:
+        code: 股票代码（不传则查询所有股票）
+        start/end: 时间范围 [start, end)
+        signal: 最终信号（BUY/SELL/HOLD）
+        limit: 每页条数
+        cursor: 上一页返回的next_cursor
+    """
+    try:
+        return await history_service.get_history(code, start, end, signal, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+@router.get("/scan")
+async def scan_market(
+    days: int = Query(120, ge=60, le=750),
+    min_buy_signals: int = Query(1, ge=0, le=6),
+    limit: int = Query(100, ge=1, le=5000),
+):
+    """用本地日线横截面扫描所有股票最近一个交易日的信号（days为交易日数，按买入信号数降序）"""
+    return await worker_pool.run(monitor_service.scan_market, days, min_buy_signals, limit)
+
+@router.get("/watchlist")
+def get_watchlist_indicators():
+    """获取监控列表中各股票最近一次的指标结果"""
+    watchlist = monitor_service.load_watchlist()
+    return {
+        "stocks": [
+            monitor_service.latest_results[code]
+            for code in watchlist
+            if code in monitor_service.latest_results
+        ],
+        "count": len(watchlist),
+        "last_sweep": monitor_service.last_sweep,
+    }
 
 @router.post("/switch")
 def switch_stock(request: StockSwitchRequest):
@@ -4,6 +4,7 @@ from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
 from app.services.industry_service import industry_service
+from app.services.worker_pool import worker_pool
 
 router = APIRouter(prefix="/api/industries", tags=["行业板块"])
 
@@ -45,7 +46,7 @@ async def get_all_industries():
         }
     """
     try:
-        industries = industry_service.get_all_industries()
+        industries = await worker_pool.run(industry_service.get_all_industries)
         return {"industries": industries, "count": len(industries)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取行业列表失败: {str(e)}")
@@ -81,7 +82,9 @@ async def get_industry_stocks(
         if sort_by not in valid_sort_fields:
             sort_by = "change"
 
-        result = industry_service.get_industry_stocks_with_quote(industry, sort_by)
+        result = await worker_pool.run(
+            industry_service.get_industry_stocks_with_quote, industry, sort_by
+        )
 
         if result.get("error"):
             raise HTTPException(status_code=500, detail=result["error"])
@@ -109,7 +112,7 @@ async def get_stock_industry(code: str):
         }
     """
     try:
-        industry = industry_service.get_stock_industry(code)
+        industry = await worker_pool.run(industry_service.get_stock_industry, code)
         return {"code": code, "industry": industry}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取股票行业失败: {str(e)}")
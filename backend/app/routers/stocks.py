@@ -20,30 +20,38 @@ class StockResponse(BaseModel):
 
 @router.get("/", response_model=List[StockResponse])
 def get_stocks(db: Session = Depends(get_db)):
-    """获取所有股票"""
-    stocks = db.query(Stock).all()
+    """获取所有监控中的股票"""
+    stocks = db.query(Stock).filter(Stock.watched == True).all()
     return stocks
 
 @router.post("/", response_model=StockResponse)
 def create_stock(stock: StockCreate, db: Session = Depends(get_db)):
     """添加股票"""
     db_stock = db.query(Stock).filter(Stock.code == stock.code).first()
-    if db_stock:
+    if db_stock and db_stock.watched:
         raise HTTPException(status_code=400, detail="股票已存在")
     
-    db_stock = Stock(code=stock.code, name=stock.name)
-    db.add(db_stock)
+    if db_stock:
+        # 行业同步写入的股票，加入监控列表
+        db_stock.name = stock.name
+        db_stock.watched = True
+    else:
+        db_stock = Stock(code=stock.code, name=stock.name)
+        db.add(db_stock)
     db.commit()
     db.refresh(db_stock)
     return db_stock
 
 @router.delete("/{code}")
 def delete_stock(code: str, db: Session = Depends(get_db)):
-    """删除股票"""
+    """删除股票（移出监控列表，保留行业信息）"""
     db_stock = db.query(Stock).filter(Stock.code == code).first()
-    if not db_stock:
+    if not db_stock or not db_stock.watched:
         raise HTTPException(status_code=404, detail="股票不存在")
     
-    db.delete(db_stock)
+    if db_stock.industry:
+        db_stock.watched = False
+    else:
+        db.delete(db_stock)
     db.commit()
     return {"message": "删除成功"}
@@ -0,0 +1,194 @@
+# 回测任务队列
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional
+
+import pandas as pd
+
+from app.config import config
+from app.services.backtest_service import backtest_service, BacktestService
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def data_version(bar) -> list:
+    """
+    数据版本：最后一根K线的日期和价格、成交量
+
+    盘中最新一根K线仍在变化，只用日期会让盘中较早算出的结果一直沿用到下一个交易日。
+    """
+    return [
+        pd.Timestamp(bar["date"]).date().isoformat(),
+        *(float(bar[field]) for field in ("close", "high", "low", "volume")),
+    ]
+
+
+def cache_key(params: dict, version: list) -> str:
+    """回测结果的缓存键：(股票, 指标, 持有天数, 历史天数, 最少信号数, 数据版本) 的哈希"""
+    min_buy_signals = params.get("min_buy_signals")
+    if min_buy_signals is None:
+        min_buy_signals = len(params["indicators"])
+    key = [
+        params["stock_code"],
+        list(params["indicators"]),
+        params.get("hold_days", 5),
+        params.get("days_history", 365),
+        min_buy_signals,
+        version,
+    ]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+class BacktestJobQueue:
+    """
+    异步回测任务队列
+
+    submit 立即返回任务ID，回测在后台线程中执行，通过 get_job 查询状态和进度。
+    结果按 cache_key 缓存：最后一根K线（日期和价格）不变时相同的请求直接返回缓存结果，
+    出现新的交易日数据或盘中最新K线变化后重新计算。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        cache_size: int = 256,
+        max_jobs: int = 1000,
+        service: BacktestService = backtest_service,
+    ):
+        self.service = service
+        self.cache_size = cache_size
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="backtest"
+        )
+        self._jobs: OrderedDict = OrderedDict()  # 任务ID -> 任务
+        self._cache: OrderedDict = OrderedDict()  # 缓存键 -> 回测结果，按最近使用排序
+        self._lock = threading.Lock()
+
+    def submit(self, params: dict) -> dict:
+        """提交回测任务，返回任务状态（命中缓存时任务直接完成）"""
+        job = self._new_job(params)
+
+        # 内存中已有最新数据时不必进入队列即可判断缓存
+        last_bar = self.service.data_service.cached_last_bar(
+            params["stock_code"], days=params.get("days_history", 365) + 50
+        )
+        result = None
+        if last_bar is not None:
+            result = self._cache_get(cache_key(params, data_version(last_bar)))
+        if result is not None:
+            self._finish(job, result, cached=True)
+        else:
+            self._executor.submit(self._run_job, job)
+        return self.get_job(job["job_id"])
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """任务状态和进度，完成后包含回测结果；任务不存在时返回None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def run(self, params: dict) -> dict:
+        """同步运行回测（使用同一结果缓存）"""
+        result, _ = self._execute(params)
+        return result
+
+    def _new_job(self, params: dict) -> dict:
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": PENDING,
+            "progress": 0,
+            "cached": False,
+            "params": dict(params),
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            # 只保留最近的任务
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return job
+
+    def _update(self, job: dict, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _finish(self, job: dict, result: dict, cached: bool = False):
+        if "error" in result:
+            self._update(
+                job, status=FAILED, progress=100, error=result["error"],
+                finished_at=datetime.now().isoformat(),
+            )
+        else:
+            self._update(
+                job, status=DONE, progress=100, cached=cached, result=result,
+                finished_at=datetime.now().isoformat(),
+            )
+
+    def _run_job(self, job: dict):
+        self._update(job, status=RUNNING, progress=10)
+        try:
+            result, cached = self._execute(
+                job["params"], lambda progress: self._update(job, progress=progress)
+            )
+            self._finish(job, result, cached)
+        except Exception as e:
+            print(f"回测任务失败 {job['job_id']}: {e}")
+            self._finish(job, {"error": str(e)})
+
+    def _execute(self, params: dict, on_progress: Callable[[int], None] = None):
+        """获取数据并回测，返回 (结果, 是否来自缓存)"""
+        days_history = params.get("days_history", 365)
+        df = self.service.data_service.get_stock_data(
+            params["stock_code"], days=days_history + 50
+        )
+        if df is None or len(df) < 50:
+            return {"error": "无法获取足够的历史数据"}, False
+
+        key = cache_key(params, data_version(df.iloc[-1]))
+        result = self._cache_get(key)
+        if result is not None:
+            return result, True
+
+        if on_progress:
+            on_progress(50)
+        result = self.service.backtest_frame(
+            params["stock_code"],
+            df,
+            params["indicators"],
+            hold_days=params.get("hold_days", 5),
+            days_history=days_history,
+            min_buy_signals=params.get("min_buy_signals"),
+            mode=params.get("mode", "vectorized"),
+        )
+        self._cache_put(key, result)
+        return result, False
+
+    def _cache_get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+            return result
+
+    def _cache_put(self, key: str, result: dict):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+backtest_jobs = BacktestJobQueue(config.BACKTEST_JOB_WORKERS, config.BACKTEST_CACHE_SIZE)
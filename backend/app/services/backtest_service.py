@@ -1,16 +1,191 @@
 # 回测服务
+import itertools
+import multiprocessing
+import threading
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
+from app.config import config
 from app.services.data_service import data_service
-from app.services.indicator_service import indicator_service
+from app.services.indicator_service import indicator_service, SIGNAL_COLUMNS
+
+# 可选指标（顺序与 calculate_buy_signal_series 的列一致）
+INDICATOR_KEYS = list(SIGNAL_COLUMNS)
+
+# 参数扫描结果的排序字段
+SWEEP_SORT_FIELDS = ("avg_return", "win_rate", "total_signals")
+
+# 年化使用的每年交易日数
+TRADING_DAYS_PER_YEAR = 252
+
+
+def all_indicator_combinations() -> List[List[str]]:
+    """全部非空指标组合（6个指标共63种）"""
+    return [
+        list(combo)
+        for size in range(1, len(INDICATOR_KEYS) + 1)
+        for combo in itertools.combinations(INDICATOR_KEYS, size)
+    ]
+
+
+def _max_drawdown(equity: np.ndarray) -> float:
+    """最大回撤（%，负数）"""
+    return float((equity / np.maximum.accumulate(equity) - 1).min() * 100)
+
+
+def _sharpe_sortino(daily: np.ndarray) -> tuple:
+    """年化夏普比率和索提诺比率（无风险利率按0计）"""
+    if len(daily) < 2:
+        return 0.0, 0.0
+    scale = np.sqrt(TRADING_DAYS_PER_YEAR)
+    mean = daily.mean()
+    std = daily.std(ddof=1)
+    downside = np.sqrt(np.mean(np.minimum(daily, 0) ** 2))
+    sharpe = mean / std * scale if std > 0 else 0.0
+    sortino = mean / downside * scale if downside > 0 else 0.0
+    return float(sharpe), float(sortino)
+
+
+def performance_metrics(
+    close: np.ndarray,
+    dates: List[str],
+    buy_idx: np.ndarray,
+    hold_days: int,
+    start: int = 30,
+) -> tuple:
+    """
+    按日计算回测期（第start天起）的资金曲线和绩效指标
+
+    每笔交易在买入日收盘买入、持有hold_days天后收盘卖出，同一股票的持仓每日收益相同，
+    因此有任一持仓的交易日策略收益等于当日涨跌幅，空仓日为0。持仓数由买入/卖出的
+    差分数组累加得到，全部指标在整段收益序列上一次计算。基准为同期买入持有。
+
+    返回 (指标dict, 资金曲线列表)
+    """
+    n = len(close)
+    if n - start < 2:
+        return {}, []
+
+    # 每日持仓数：买入次日至卖出日之间持有
+    changes = np.bincount(buy_idx + 1, minlength=n + 1) - \
+        np.bincount(buy_idx + hold_days + 1, minlength=n + 1)
+    open_positions = np.cumsum(changes[:n])[start:]
+    in_market = open_positions > 0
+
+    window = close[start:]
+    benchmark_daily = np.zeros(len(window))
+    benchmark_daily[1:] = window[1:] / window[:-1] - 1
+    strategy_daily = np.where(in_market, benchmark_daily, 0.0)
+
+    equity = np.cumprod(1 + strategy_daily)
+    benchmark = np.cumprod(1 + benchmark_daily)
+    sharpe, sortino = _sharpe_sortino(strategy_daily[1:])
+    benchmark_sharpe, _ = _sharpe_sortino(benchmark_daily[1:])
+    years = (len(window) - 1) / TRADING_DAYS_PER_YEAR
+    total_return = (equity[-1] - 1) * 100
+    benchmark_return = (benchmark[-1] - 1) * 100
+
+    metrics = {
+        "total_return": round(float(total_return), 2),
+        "annual_return": round(float((equity[-1] ** (1 / years) - 1) * 100), 2),
+        "max_drawdown": round(_max_drawdown(equity), 2),
+        "sharpe": round(sharpe, 3),
+        "sortino": round(sortino, 3),
+        "exposure": round(float(in_market.mean() * 100), 2),
+        "avg_overlap": round(float(open_positions[in_market].mean()), 2) if in_market.any() else 0,
+        "max_overlap": int(open_positions.max()),
+        "benchmark_return": round(float(benchmark_return), 2),
+        "benchmark_max_drawdown": round(_max_drawdown(benchmark), 2),
+        "benchmark_sharpe": round(benchmark_sharpe, 3),
+        "excess_return": round(float(total_return - benchmark_return), 2),
+    }
+    equity_curve = [
+        {"date": d, "equity": e, "benchmark": b}
+        for d, e, b in zip(
+            dates[start:], np.round(equity, 4).tolist(), np.round(benchmark, 4).tolist()
+        )
+    ]
+    return metrics, equity_curve
+
+
+def format_dates(df: pd.DataFrame) -> List[str]:
+    """日期列格式化为 YYYY-MM-DD 字符串"""
+    dates = df["date"]
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        dates = dates.dt.strftime("%Y-%m-%d")
+    return dates.astype(str).tolist()
+
+
+def sweep_stock(
+    stock_code: str,
+    df: pd.DataFrame,
+    combinations: List[List[str]],
+    hold_days_list: List[int],
+    min_buy_signals_list: List[Optional[int]],
+) -> List[dict]:
+    """
+    对一只股票评估所有参数组合（在进程池中执行）
+
+    指标序列只计算一次；每日各组合的买入信号数通过 信号矩阵(n×6) @ 组合矩阵(6×C)
+    一次得到，每个 (hold_days, min_buy_signals) 用布尔掩码同时统计所有组合。
+    统计口径与 run_backtest 一致（收益率保留两位小数后统计）。
+    min_buy_signals为None表示组合内指标全部满足。
+    """
+    n = len(df)
+    signals = indicator_service.calculate_buy_signal_series(df)[INDICATOR_KEYS].to_numpy()
+    membership = np.array(
+        [[key in combo for combo in combinations] for key in INDICATOR_KEYS], dtype=np.int64
+    )
+    counts = signals.astype(np.int64) @ membership  # n × C
+    sizes = membership.sum(axis=0)
+    close = df["close"].to_numpy(dtype=float)
+
+    rows = []
+    for hold_days in hold_days_list:
+        if n - hold_days > 30:
+            buy = close[30 : n - hold_days]
+            returns = np.round((close[30 + hold_days :] - buy) / buy * 100, 2)
+            window = counts[30 : n - hold_days]
+        else:
+            returns = np.empty(0)
+            window = counts[:0]
+
+        for min_buy_signals in min_buy_signals_list:
+            thresholds = sizes if min_buy_signals is None else np.full(len(combinations), min_buy_signals)
+            mask = window >= thresholds  # 交易日 × 组合
+            totals = mask.sum(axis=0)
+            wins = (mask & (returns > 0)[:, None]).sum(axis=0)
+            sums = returns @ mask
+            maxs = np.where(mask, returns[:, None], -np.inf).max(axis=0, initial=-np.inf)
+            mins = np.where(mask, returns[:, None], np.inf).min(axis=0, initial=np.inf)
+
+            for j, combo in enumerate(combinations):
+                total = int(totals[j])
+                rows.append({
+                    "stock_code": stock_code,
+                    "indicators": combo,
+                    "hold_days": hold_days,
+                    "min_buy_signals": int(thresholds[j]),
+                    "total_signals": total,
+                    "win_count": int(wins[j]),
+                    "loss_count": total - int(wins[j]),
+                    "win_rate": round(int(wins[j]) / total * 100, 2) if total else 0,
+                    "avg_return": round(float(sums[j]) / total, 2) if total else 0,
+                    "max_return": round(float(maxs[j]), 2) if total else 0,
+                    "min_return": round(float(mins[j]), 2) if total else 0,
+                    "return_sum": float(sums[j]),
+                })
+    return rows
 
 
 class BacktestService:
     def __init__(self):
         self.data_service = data_service
         self.indicator_service = indicator_service
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
 
     def run_backtest(
         self,
@@ -19,6 +194,7 @@ class BacktestService:
         hold_days: int = 5,
         days_history: int = 365,
         min_buy_signals: int = None,
+        mode: str = "vectorized",
     ) -> dict:
         """
         运行回测
@@ -29,19 +205,216 @@ class BacktestService:
         - hold_days: 持有天数
         - days_history: 回测历史天数
         - min_buy_signals: 最少买入信号数（默认等于indicators长度，即全部满足）
+        - mode: 回测模式，vectorized-整段一次计算指标（默认），loop-逐日切片重新计算
 
         返回:
         - 回测统计结果
         """
-        if min_buy_signals is None:
-            min_buy_signals = len(indicators)
-
         # 获取历史数据
         df = self.data_service.get_stock_data(stock_code, days=days_history + 50)
         if df is None or len(df) < 50:
             return {"error": "无法获取足够的历史数据"}
 
+        return self.backtest_frame(
+            stock_code, df, indicators, hold_days, days_history, min_buy_signals, mode
+        )
+
+    def backtest_frame(
+        self,
+        stock_code: str,
+        df: pd.DataFrame,
+        indicators: List[str],
+        hold_days: int = 5,
+        days_history: int = 365,
+        min_buy_signals: int = None,
+        mode: str = "vectorized",
+    ) -> dict:
+        """在已获取的历史数据上运行回测（参数同 run_backtest）"""
+        if min_buy_signals is None:
+            min_buy_signals = len(indicators)
+
+        if mode == "loop":
+            trades, buy_idx = self._collect_trades_loop(
+                df, indicators, hold_days, min_buy_signals
+            )
+        else:
+            trades, buy_idx = self._collect_trades_vectorized(
+                df, indicators, hold_days, min_buy_signals
+            )
+
+        # 资金曲线和绩效指标
+        metrics, equity_curve = performance_metrics(
+            df["close"].to_numpy(dtype=float), format_dates(df), buy_idx, hold_days
+        )
+
+        # 统计结果
+        if not trades:
+            return {
+                "stock_code": stock_code,
+                "total_signals": 0,
+                "win_count": 0,
+                "loss_count": 0,
+                "win_rate": 0,
+                "avg_return": 0,
+                "max_return": 0,
+                "min_return": 0,
+                "trades": [],
+                "metrics": metrics,
+                "equity_curve": equity_curve,
+            }
+
+        returns = np.array([t["return_pct"] for t in trades])
+        win_count = int((returns > 0).sum())
+        loss_count = len(returns) - win_count
+
+        return {
+            "stock_code": stock_code,
+            "indicators": indicators,
+            "hold_days": hold_days,
+            "days_history": days_history,
+            "min_buy_signals": min_buy_signals,
+            "total_signals": len(trades),
+            "win_count": win_count,
+            "loss_count": loss_count,
+            "win_rate": round(win_count / len(trades) * 100, 2),
+            "avg_return": round(float(returns.mean()), 2),
+            "max_return": round(float(returns.max()), 2),
+            "min_return": round(float(returns.min()), 2),
+            "trades": trades,
+            "metrics": metrics,
+            "equity_curve": equity_curve,
+        }
+
+    def run_sweep(
+        self,
+        stocks: List[str],
+        combinations: List[List[str]] = None,
+        hold_days: List[int] = None,
+        min_buy_signals: List[Optional[int]] = None,
+        days_history: int = 365,
+        sort_by: str = "avg_return",
+        limit: int = 100,
+    ) -> dict:
+        """
+        多股票、多参数组合的回测扫描
+
+        参数:
+        - stocks: 股票代码列表
+        - combinations: 指标组合列表（默认全部63种组合）
+        - hold_days: 持有天数列表
+        - min_buy_signals: 最少买入信号数列表（默认每个组合的指标全部满足）
+        - sort_by: 排序字段 avg_return/win_rate/total_signals
+
+        返回:
+        - results: 每个 (股票, 参数组合) 的统计，按sort_by降序
+        - summary: 每个参数组合在所有股票上的汇总统计，按sort_by降序
+        """
+        combinations = combinations or all_indicator_combinations()
+        hold_days = hold_days or [5]
+        min_buy_signals = min_buy_signals or [None]
+
+        # 历史数据并发获取
+        with ThreadPoolExecutor(max_workers=config.MONITOR_WORKERS) as executor:
+            frames = list(executor.map(
+                lambda code: self.data_service.get_stock_data(code, days=days_history + 50),
+                stocks,
+            ))
+        valid = [(code, df) for code, df in zip(stocks, frames) if df is not None and len(df) >= 50]
+        skipped = [code for code, df in zip(stocks, frames) if df is None or len(df) < 50]
+
+        # 各股票分到进程池中计算
+        args = [
+            (code, df, combinations, hold_days, min_buy_signals) for code, df in valid
+        ]
+        if len(valid) > 1 and config.BACKTEST_PROCESSES > 1:
+            stock_rows = list(self._get_process_pool().map(sweep_stock, *zip(*args)))
+        else:
+            stock_rows = [sweep_stock(*arg) for arg in args]
+        rows = [row for result in stock_rows for row in result]
+
+        summary = self._summarize_sweep(rows)
+        for row in rows:
+            del row["return_sum"]
+
+        def rank(row):
+            return (row[sort_by], row["total_signals"])
+
+        rows.sort(key=rank, reverse=True)
+        summary.sort(key=rank, reverse=True)
+
+        return {
+            "stock_count": len(valid),
+            "combination_count": len(combinations) * len(hold_days) * len(min_buy_signals),
+            "skipped": skipped,
+            "results": rows[:limit],
+            "summary": summary[:limit],
+        }
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """
+        获取参数扫描进程池（首次使用时创建）
+
+        使用spawn方式启动子进程：服务进程中有事件循环、调度器和数据库连接池等线程及其持有的锁，
+        fork出的子进程可能因继承已加锁的锁而死锁。
+        """
+        with self._pool_lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=config.BACKTEST_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._process_pool
+
+    def shutdown(self):
+        """关闭参数扫描进程池"""
+        with self._pool_lock:
+            pool, self._process_pool = self._process_pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _summarize_sweep(rows: List[dict]) -> List[dict]:
+        """按参数组合汇总所有股票的交易"""
+        groups: Dict[tuple, dict] = {}
+        for row in rows:
+            key = (tuple(row["indicators"]), row["hold_days"], row["min_buy_signals"])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    "indicators": row["indicators"],
+                    "hold_days": row["hold_days"],
+                    "min_buy_signals": row["min_buy_signals"],
+                    "stock_count": 0,
+                    "total_signals": 0,
+                    "win_count": 0,
+                    "return_sum": 0.0,
+                }
+            if row["total_signals"]:
+                group["stock_count"] += 1
+            group["total_signals"] += row["total_signals"]
+            group["win_count"] += row["win_count"]
+            group["return_sum"] += row["return_sum"]
+
+        summary = []
+        for group in groups.values():
+            total = group["total_signals"]
+            return_sum = group.pop("return_sum")
+            group["loss_count"] = total - group["win_count"]
+            group["win_rate"] = round(group["win_count"] / total * 100, 2) if total else 0
+            group["avg_return"] = round(return_sum / total, 2) if total else 0
+            summary.append(group)
+        return summary
+
+    def _collect_trades_loop(
+        self,
+        df: pd.DataFrame,
+        indicators: List[str],
+        hold_days: int,
+        min_buy_signals: int,
+    ) -> tuple:
+        """逐日切片计算指标并收集交易（O(n²)，保留用于结果对照），返回 (交易列表, 买入日下标数组)"""
         trades = []
+        buy_idx = []
 
         # 从第30天开始（确保指标计算有足够数据）
         for i in range(30, len(df) - hold_days):
@@ -65,6 +438,7 @@ class BacktestService:
 
                 # 计算卖出点（持有hold_days天后）
                 if i + hold_days < len(df):
+                    buy_idx.append(i)
                     sell_date = df["date"].iloc[i + hold_days]
                     sell_price = df["close"].iloc[i + hold_days]
 
@@ -86,39 +460,51 @@ class BacktestService:
                         }
                     )
 
-        # 统计结果
-        if not trades:
-            return {
-                "stock_code": stock_code,
-                "total_signals": 0,
-                "win_count": 0,
-                "loss_count": 0,
-                "win_rate": 0,
-                "avg_return": 0,
-                "max_return": 0,
-                "min_return": 0,
-                "trades": [],
-            }
+        return trades, np.array(buy_idx, dtype=np.int64)
 
-        returns = [t["return_pct"] for t in trades]
-        win_count = sum(1 for r in returns if r > 0)
-        loss_count = len(returns) - win_count
+    def _collect_trades_vectorized(
+        self,
+        df: pd.DataFrame,
+        indicators: List[str],
+        hold_days: int,
+        min_buy_signals: int,
+    ) -> tuple:
+        """整段计算一次指标序列，用布尔列运算得到每日买入信号并收集交易，返回 (交易列表, 买入日下标数组)"""
+        n = len(df)
+        if n - hold_days <= 30:
+            return [], np.empty(0, dtype=np.int64)
 
-        return {
-            "stock_code": stock_code,
-            "indicators": indicators,
-            "hold_days": hold_days,
-            "days_history": days_history,
-            "min_buy_signals": min_buy_signals,
-            "total_signals": len(trades),
-            "win_count": win_count,
-            "loss_count": loss_count,
-            "win_rate": round(win_count / len(trades) * 100, 2),
-            "avg_return": round(np.mean(returns), 2),
-            "max_return": round(max(returns), 2),
-            "min_return": round(min(returns), 2),
-            "trades": trades,
-        }
+        # 每日买入信号数（与_count_buy_signals一致，重复或未知的指标忽略）
+        signal_frame = self.indicator_service.calculate_buy_signal_series(df)
+        selected = [key for key in signal_frame.columns if key in indicators]
+        signal_counts = signal_frame[selected].to_numpy().sum(axis=1)
+
+        # 第30天到 n-hold_days-1 天之间满足条件的买入日
+        buy_idx = np.flatnonzero(signal_counts[30 : n - hold_days] >= min_buy_signals)
+        buy_idx += 30
+        sell_idx = buy_idx + hold_days
+
+        close = df["close"].to_numpy()
+        buy_prices = close[buy_idx]
+        sell_prices = close[sell_idx]
+        returns = (sell_prices - buy_prices) / buy_prices * 100
+
+        dates = format_dates(df)
+
+        trades = [
+            {
+                "buy_date": dates[b],
+                "sell_date": dates[s],
+                "buy_price": round(float(bp), 2),
+                "sell_price": round(float(sp), 2),
+                "return_pct": round(float(r), 2),
+                "signals": int(signal_counts[b]),
+            }
+            for b, s, bp, sp, r in zip(
+                buy_idx, sell_idx, buy_prices, sell_prices, returns
+            )
+        ]
+        return trades, buy_idx
 
     def _count_buy_signals(
         self, indicators_result: dict, selected_indicators: List[str]
@@ -0,0 +1,142 @@
+# 本地日线存储
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from app.database import SessionLocal, DailyBar, BarSync
+
+BAR_COLUMNS = ['date', 'open', 'close', 'high', 'low', 'volume', 'amount']
+
+
+class BarStore:
+    """
+    日线行情的本地持久化（daily_bars表）
+
+    每只股票记录一条同步信息（bar_sync表）：start_date为本地已覆盖的最早请求日期，
+    synced_on为最近一次同步的日期，早于synced_on的K线在同步时已收盘，不会再变化。
+    """
+
+    def get_sync(self, stock_code: str) -> Optional[Tuple[date, date]]:
+        """获取同步记录 (start_date, synced_on)，从未同步过返回None"""
+        db = SessionLocal()
+        try:
+            row = db.query(BarSync.start_date, BarSync.synced_on).filter(
+                BarSync.stock_code == stock_code
+            ).first()
+            return (row.start_date, row.synced_on) if row else None
+        finally:
+            db.close()
+
+    def first_bar_date(self, stock_code: str) -> Optional[date]:
+        """获取本地最早一根K线的日期，没有K线返回None"""
+        db = SessionLocal()
+        try:
+            row = db.query(DailyBar.date).filter(
+                DailyBar.stock_code == stock_code
+            ).order_by(DailyBar.date).first()
+            return row.date if row else None
+        finally:
+            db.close()
+
+    def last_closed_bar(self, stock_code: str, before: date) -> Optional[Tuple[date, float]]:
+        """获取早于before的最后一根K线 (date, close)"""
+        db = SessionLocal()
+        try:
+            row = db.query(DailyBar.date, DailyBar.close).filter(
+                DailyBar.stock_code == stock_code,
+                DailyBar.date < before,
+            ).order_by(DailyBar.date.desc()).first()
+            return (row.date, row.close) if row else None
+        finally:
+            db.close()
+
+    def load(self, stock_code: str, start: date) -> pd.DataFrame:
+        """读取start（含）之后的日线，按日期升序"""
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                DailyBar.date, DailyBar.open, DailyBar.close, DailyBar.high,
+                DailyBar.low, DailyBar.volume, DailyBar.amount,
+            ).filter(
+                DailyBar.stock_code == stock_code,
+                DailyBar.date >= start,
+            ).order_by(DailyBar.date).all()
+        finally:
+            db.close()
+
+        df = pd.DataFrame(rows, columns=BAR_COLUMNS)
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    def load_all(self, start: date) -> pd.DataFrame:
+        """一次查询读取所有股票start（含）之后的日线，返回含stock_code列的长表"""
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                DailyBar.stock_code, DailyBar.date, DailyBar.close, DailyBar.high,
+                DailyBar.low, DailyBar.volume,
+            ).filter(DailyBar.date >= start).all()
+        finally:
+            db.close()
+
+        df = pd.DataFrame(rows, columns=['stock_code', 'date', 'close', 'high', 'low', 'volume'])
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    def save(
+        self,
+        stock_code: str,
+        df: pd.DataFrame,
+        start_date: date = None,
+        synced_on: date = None,
+        replace_from: date = None,
+    ):
+        """
+        写入日线并更新同步记录
+
+        replace_from不为None时先删除该日（含）之后的已有K线；
+        start_date/synced_on为None时保留原同步记录中的值。
+        """
+        rows = [
+            {
+                'stock_code': stock_code,
+                'date': bar_date.date(),
+                'open': float(open_),
+                'close': float(close),
+                'high': float(high),
+                'low': float(low),
+                'volume': float(volume),
+                'amount': float(amount),
+            }
+            for bar_date, open_, close, high, low, volume, amount
+            in df[BAR_COLUMNS].itertuples(index=False, name=None)
+        ]
+
+        db = SessionLocal()
+        try:
+            if replace_from is not None:
+                db.query(DailyBar).filter(
+                    DailyBar.stock_code == stock_code,
+                    DailyBar.date >= replace_from,
+                ).delete(synchronize_session=False)
+            db.bulk_insert_mappings(DailyBar, rows)
+
+            sync = db.query(BarSync).filter(BarSync.stock_code == stock_code).first()
+            if sync is None:
+                sync = BarSync(stock_code=stock_code)
+                db.add(sync)
+            if start_date is not None:
+                sync.start_date = start_date
+            if synced_on is not None:
+                sync.synced_on = synced_on
+            sync.updated_at = datetime.now()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+bar_store = BarStore()
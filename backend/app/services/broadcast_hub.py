@@ -0,0 +1,193 @@
+# WebSocket广播中心
+import asyncio
+import json
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.config import config
+from app.services.serialization import dumps_json, dumps_msgpack
+
+
+# 未订阅任何主题的连接所在的主题，接收所有推送（兼容旧客户端）
+ALL_TOPIC = "*"
+
+
+def stock_topic(code: str) -> str:
+    return f"stock:{code}"
+
+
+def industry_topic(industry: str) -> str:
+    return f"industry:{industry}"
+
+
+def delta_topic(topic: str) -> str:
+    """增量推送模式下的主题"""
+    return f"delta:{topic}"
+
+
+def stock_topics(code: str, industry: Optional[str] = None, delta: bool = False) -> List[str]:
+    """某只股票的消息应推送到的主题：股票本身和所属行业"""
+    topics = [stock_topic(code)]
+    if industry:
+        topics.append(industry_topic(industry))
+    if delta:
+        topics = [delta_topic(topic) for topic in topics]
+    return topics
+
+
+def encode_message(message: dict) -> str:
+    """序列化消息（与 WebSocket.send_json 的编码一致，FAST_JSON开启时使用orjson）"""
+    if config.FAST_JSON:
+        return dumps_json(message)
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+class _Client:
+    """一个WebSocket连接及其发送队列"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int, binary: bool = False):
+        self.websocket = websocket
+        self.binary = binary  # 是否使用MessagePack二进制帧
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: asyncio.Task = None
+        self.topics: Set[str] = {ALL_TOPIC}
+
+
+class BroadcastHub:
+    """
+    WebSocket广播中心
+
+    每条消息每种格式（JSON文本/MessagePack）只序列化一次，放入各连接的有界发送队列，由每个连接自己的任务发送，
+    慢客户端不会拖慢其他客户端。发送队列满（客户端长期跟不上）的连接会被断开。
+    
+    连接可以订阅股票（stock:代码）或行业（industry:行业名）主题，publish 通过
+    主题->连接索引只推送给订阅者。从未订阅过的连接在ALL_TOPIC中，接收所有推送。
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._clients: Dict[WebSocket, _Client] = {}
+        self._topics: Dict[str, Set[_Client]] = {}  # 主题 -> 订阅的连接
+
+    def __len__(self):
+        return len(self._clients)
+
+    def connect(self, websocket: WebSocket, binary: bool = False):
+        """注册已accept的连接并启动其发送任务（binary为True时以MessagePack发送）"""
+        client = _Client(websocket, self.queue_size, binary)
+        client.task = asyncio.create_task(self._sender(client))
+        self._clients[websocket] = client
+        self._topics.setdefault(ALL_TOPIC, set()).add(client)
+
+    def disconnect(self, websocket: WebSocket):
+        """注销连接并停止其发送任务"""
+        client = self._clients.pop(websocket, None)
+        if client is not None:
+            client.task.cancel()
+            self._remove_topics(client, list(client.topics))
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """订阅主题（首次订阅后不再接收全部推送），返回当前订阅的主题"""
+        client = self._clients.get(websocket)
+        if client is None:
+            return []
+        topics = set(topics)
+        if topics:
+            self._remove_topics(client, [ALL_TOPIC])
+        for topic in topics:
+            client.topics.add(topic)
+            self._topics.setdefault(topic, set()).add(client)
+        return sorted(client.topics)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """取消订阅主题，返回当前订阅的主题"""
+        client = self._clients.get(websocket)
+        if client is None:
+            return []
+        self._remove_topics(client, [topic for topic in topics if topic != ALL_TOPIC])
+        return sorted(client.topics)
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._topics.get(topic, ()))
+
+    def _remove_topics(self, client: _Client, topics: Iterable[str]):
+        for topic in topics:
+            client.topics.discard(topic)
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def broadcast(self, message: dict) -> int:
+        """向所有连接广播消息，返回因队列溢出被断开的连接数"""
+        if not self._clients:
+            return 0
+        return self._enqueue(list(self._clients.values()), message)
+
+    def publish(self, topics: Iterable[str], message: dict) -> int:
+        """
+        推送消息给订阅了任一主题的连接（同一连接只发送一次）
+
+        返回因队列溢出被断开的连接数。
+        """
+        clients = set()
+        for topic in topics:
+            clients.update(self._topics.get(topic, ()))
+        if not clients:
+            return 0
+        return self._enqueue(list(clients), message)
+
+    def send(self, websocket: WebSocket, message: dict):
+        """向单个连接发送消息（经同一队列，保持消息顺序）"""
+        client = self._clients.get(websocket)
+        if client is not None:
+            self._enqueue([client], message)
+
+    def _enqueue(self, clients: list, message: dict) -> int:
+        encoded = {}  # binary -> 序列化结果
+        dropped = 0
+        for client in clients:
+            payload = encoded.get(client.binary)
+            if payload is None:
+                payload = dumps_msgpack(message) if client.binary else encode_message(message)
+                encoded[client.binary] = payload
+            try:
+                client.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self._drop(client)
+                dropped += 1
+        return dropped
+
+    def _drop(self, client: _Client):
+        """断开跟不上推送速度的连接"""
+        print("WebSocket客户端发送队列已满，断开连接")
+        self.disconnect(client.websocket)
+        asyncio.create_task(self._close(client.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)  # Try Again Later
+        except Exception:
+            pass
+
+    async def _sender(self, client: _Client):
+        """逐条发送队列中的消息，发送失败时注销连接"""
+        try:
+            while True:
+                payload = await client.queue.get()
+                if client.binary:
+                    await client.websocket.send_bytes(payload)
+                else:
+                    await client.websocket.send_text(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if self._clients.get(client.websocket) is client:
+                del self._clients[client.websocket]
+                self._remove_topics(client, list(client.topics))
+
+
+broadcast_hub = BroadcastHub(config.WS_SEND_QUEUE_SIZE)
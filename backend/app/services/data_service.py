@@ -1,85 +1,301 @@
 # 数据获取服务
+import threading
 import akshare as ak
+from collections import OrderedDict
+from concurrent.futures import Future
 import pandas as pd
-from datetime import datetime, timedelta
+from typing import Optional
+from datetime import date, datetime, timedelta, time as dt_time
+from app.config import config
+from app.services.bar_store import bar_store, BAR_COLUMNS
 
 class DataService:
     def __init__(self):
-        self.cache = {}
-        self.cache_time = {}
+        # 历史K线缓存：股票代码 -> (起始日期, 数据, 获取时间, 占用字节数)，按最近使用排序
+        # 每只股票只缓存最长的窗口，更短的days请求直接切片
+        self.cache: OrderedDict = OrderedDict()
         self.cache_duration = 60  # 缓存60秒
+        self.cache_max_bytes = config.STOCK_CACHE_MAX_MB * 1024 * 1024
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        self._inflight = {}  # 股票代码 -> 进行中的加载（Future），同一股票并发请求只加载一次
+        
+        # 全市场实时行情快照（按股票代码索引，所有实时行情消费者共享）
+        self.spot_cache_duration = config.SPOT_CACHE_TTL
+        self._spot_snapshot: pd.DataFrame = None
+        self._spot_time: datetime = None
+        self._spot_lock = threading.Lock()
     
-    def get_stock_data(self, stock_code: str, days: int = 100) -> pd.DataFrame:
-        """获取股票历史数据"""
-        cache_key = f"{stock_code}_{days}"
+    def get_stock_data(self, stock_code: str, days: int = 100, max_age: int = None) -> pd.DataFrame:
+        """
+        获取股票历史数据（max_age为可接受的缓存时间，默认cache_duration）
         
-        # 检查缓存
-        if cache_key in self.cache:
-            if datetime.now() - self.cache_time[cache_key] < timedelta(seconds=self.cache_duration):
-                return self.cache[cache_key]
+        K线保存在本地日线表中，缓存过期后只向akshare补齐缺失的尾部交易日，
+        任意days窗口都从本地读取。下载失败时返回本地已有的数据。
+        内存缓存按股票代码保存最长的窗口，同一股票的并发请求只触发一次加载。
+        """
+        if max_age is None:
+            max_age = self.cache_duration
+        start = (datetime.now() - timedelta(days=days)).date()
         
-        try:
-            # 使用akshare获取数据
-            df = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="daily",
-                start_date=(datetime.now() - timedelta(days=days)).strftime("%Y%m%d"),
-                end_date=datetime.now().strftime("%Y%m%d"),
-                adjust="qfq"  # 前复权
-            )
-            
-            if df.empty:
-                return None
+        while True:
+            with self._cache_lock:
+                # 检查缓存
+                entry = self.cache.get(stock_code)
+                if entry is not None:
+                    cached_start, df, fetched_at, _ = entry
+                    if cached_start <= start and \
+                            datetime.now() - fetched_at < timedelta(seconds=max_age):
+                        self.cache.move_to_end(stock_code)
+                        return self._slice(df, start)
+                
+                future = self._inflight.get(stock_code)
+                leader = future is None
+                if leader:
+                    # 加载覆盖已缓存窗口和本次请求的最长窗口
+                    load_start = min(start, entry[0]) if entry is not None else start
+                    future = self._inflight[stock_code] = Future()
             
-            # 重命名列
-            df = df.rename(columns={
-                '日期': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'volume',
-                '成交额': 'amount'
-            })
-            
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values('date').reset_index(drop=True)
-            
-            # 更新缓存
-            self.cache[cache_key] = df
-            self.cache_time[cache_key] = datetime.now()
-            
-            return df
+            if leader:
+                df = None
+                try:
+                    df = self._load_history(stock_code, load_start)
+                finally:
+                    with self._cache_lock:
+                        del self._inflight[stock_code]
+                        if df is not None:
+                            self._cache_put(stock_code, load_start, df)
+                    future.set_result((load_start, df))
+                return self._slice(df, start)
             
+            # 等待进行中的加载；其窗口不够长时重新发起
+            loaded_start, df = future.result()
+            if df is None or loaded_start <= start:
+                return self._slice(df, start)
+    
+    def cached_last_bar(self, stock_code: str, days: int = 100) -> Optional[pd.Series]:
+        """
+        内存缓存中未过期且覆盖days窗口的数据的最后一根K线，没有时返回None
+        
+        只查看缓存，不触发加载，用于判断已有计算结果是否基于最新数据。
+        """
+        start = (datetime.now() - timedelta(days=days)).date()
+        with self._cache_lock:
+            entry = self.cache.get(stock_code)
+            if entry is None:
+                return None
+            cached_start, df, fetched_at, _ = entry
+            if cached_start > start or df is None or df.empty or \
+                    datetime.now() - fetched_at >= timedelta(seconds=self.cache_duration):
+                return None
+            return df.iloc[-1]
+    
+    def _load_history(self, stock_code: str, start: date) -> pd.DataFrame:
+        """同步本地日线并读取start之后的数据"""
+        try:
+            self._sync_history(stock_code, start)
         except Exception as e:
             print(f"获取股票数据失败: {e}")
+        
+        try:
+            df = bar_store.load(stock_code, start)
+        except Exception as e:
+            print(f"读取本地日线失败: {e}")
             return None
+        
+        return None if df.empty else df
+    
+    @staticmethod
+    def _slice(df: pd.DataFrame, start: date) -> pd.DataFrame:
+        """截取start之后的K线"""
+        if df is None:
+            return None
+        first = df['date'].searchsorted(pd.Timestamp(start))
+        if first == 0:
+            return df
+        df = df.iloc[first:].reset_index(drop=True)
+        return None if df.empty else df
+    
+    def _cache_put(self, stock_code: str, start: date, df: pd.DataFrame):
+        """写入缓存并按最近最少使用淘汰超出内存上限的股票（需持有_cache_lock）"""
+        old = self.cache.pop(stock_code, None)
+        if old is not None:
+            self._cache_bytes -= old[3]
+        
+        size = int(df.memory_usage(deep=True).sum())
+        self.cache[stock_code] = (start, df, datetime.now(), size)
+        self._cache_bytes += size
+        
+        while self._cache_bytes > self.cache_max_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self._cache_bytes -= evicted[3]
+    
+    def _sync_history(self, stock_code: str, start: date):
+        """
+        将本地日线同步到今天，并向前补齐到start
+        
+        下载结果为空（限流、临时故障）时不写入，保留本地K线和原同步日期，下次加载时重试。
+        尾部和头部分别同步，其中一段为空不影响另一段。
+        """
+        today = datetime.now().date()
+        sync = bar_store.get_sync(stock_code)
+        if sync is None:
+            df = self._fetch_history(stock_code, start, today)
+            if not df.empty:
+                bar_store.save(stock_code, df, start_date=start, synced_on=today, replace_from=start)
+            return
+        
+        start_date, synced_on = sync
+        self._sync_tail(stock_code, start_date, synced_on, today)
+        
+        # 头部：请求的窗口早于本地覆盖范围时补齐更早的K线
+        if start < start_date:
+            self._sync_head(stock_code, start, start_date)
+    
+    def _sync_tail(self, stock_code: str, start_date: date, synced_on: date, today: date):
+        """从最后一根已收盘K线开始重新下载，用它校验复权价格是否变化"""
+        anchor = bar_store.last_closed_bar(stock_code, synced_on)
+        if anchor is None:
+            df = self._fetch_history(stock_code, start_date, today)
+            if not df.empty:
+                bar_store.save(stock_code, df, synced_on=today, replace_from=start_date)
+            return
+        
+        anchor_date, anchor_close = anchor
+        df = self._fetch_history(stock_code, anchor_date, today)
+        if df.empty:
+            return
+        if df['date'].iloc[0].date() != anchor_date \
+                or abs(float(df['close'].iloc[0]) - anchor_close) > 1e-6:
+            # 除权除息后前复权价格整体变化，本地历史失效，重新下载全部窗口
+            df = self._fetch_history(stock_code, start_date, today)
+            if not df.empty:
+                bar_store.save(stock_code, df, synced_on=today, replace_from=start_date)
+        else:
+            bar_store.save(stock_code, df, synced_on=today, replace_from=anchor_date)
+    
+    def _sync_head(self, stock_code: str, start: date, start_date: date):
+        """补齐[start, start_date)区间的K线"""
+        df = self._fetch_history(stock_code, start, start_date - timedelta(days=1))
+        if not df.empty:
+            bar_store.save(stock_code, df, start_date=start)
+            return
+        
+        # 本地最早的K线远晚于原覆盖起点：股票在此之后才上市，更早的区间本就没有K线，记录为已覆盖
+        first_date = bar_store.first_bar_date(stock_code)
+        if first_date is not None and (first_date - start_date).days > config.BAR_LISTING_GAP_DAYS:
+            bar_store.save(stock_code, df, start_date=start)
+    
+    def _fetch_history(self, stock_code: str, start: date, end: date) -> pd.DataFrame:
+        """从akshare下载[start, end]区间的前复权日线"""
+        df = ak.stock_zh_a_hist(
+            symbol=stock_code,
+            period="daily",
+            start_date=start.strftime("%Y%m%d"),
+            end_date=end.strftime("%Y%m%d"),
+            adjust="qfq"  # 前复权
+        )
+        
+        if df.empty:
+            return pd.DataFrame(columns=BAR_COLUMNS)
+        
+        # 重命名列
+        df = df.rename(columns={
+            '日期': 'date',
+            '开盘': 'open',
+            '收盘': 'close',
+            '最高': 'high',
+            '最低': 'low',
+            '成交量': 'volume',
+            '成交额': 'amount'
+        })
+        
+        df['date'] = pd.to_datetime(df['date'])
+        return df.sort_values('date').reset_index(drop=True)[BAR_COLUMNS]
+    
+    def get_spot_snapshot(self) -> pd.DataFrame:
+        """
+        获取全市场实时行情快照（按股票代码索引）
+        
+        stock_zh_a_spot_em 每次下载全部A股行情，快照在 spot_cache_duration 内共享，
+        并发请求只触发一次下载。下载失败时返回上一份快照（可能为None）。
+        """
+        with self._spot_lock:
+            if self._spot_snapshot is not None and \
+                    datetime.now() - self._spot_time < timedelta(seconds=self.spot_cache_duration):
+                return self._spot_snapshot
+            
+            try:
+                df = ak.stock_zh_a_spot_em()
+                self._spot_snapshot = df.set_index('代码', drop=False)
+                self._spot_time = datetime.now()
+            except Exception as e:
+                print(f"获取实时行情快照失败: {e}")
+            
+            return self._spot_snapshot
     
     def get_realtime_quote(self, stock_code: str) -> dict:
         """获取实时行情"""
         try:
-            # 获取实时行情
-            df = ak.stock_zh_a_spot_em()
-            stock_row = df[df['代码'] == stock_code]
-            
-            if stock_row.empty:
+            snapshot = self.get_spot_snapshot()
+            if snapshot is None or stock_code not in snapshot.index:
                 return None
+            stock_row = snapshot.loc[stock_code]
             
             return {
                 'code': stock_code,
-                'name': stock_row['名称'].values[0],
-                'price': float(stock_row['最新价'].values[0]),
-                'change': float(stock_row['涨跌幅'].values[0]),
-                'volume': float(stock_row['成交量'].values[0]),
-                'amount': float(stock_row['成交额'].values[0]),
-                'high': float(stock_row['最高'].values[0]),
-                'low': float(stock_row['最低'].values[0]),
-                'open': float(stock_row['今开'].values[0]),
-                'pre_close': float(stock_row['昨收'].values[0]),
-                'timestamp': datetime.now().isoformat()
+                'name': stock_row['名称'],
+                'price': float(stock_row['最新价']),
+                'change': float(stock_row['涨跌幅']),
+                'volume': float(stock_row['成交量']),
+                'amount': float(stock_row['成交额']),
+                'high': float(stock_row['最高']),
+                'low': float(stock_row['最低']),
+                'open': float(stock_row['今开']),
+                'pre_close': float(stock_row['昨收']),
+                'timestamp': self._spot_time.isoformat()
             }
         except Exception as e:
             print(f"获取实时行情失败: {e}")
             return None
+    
+    def merge_spot_bar(self, df: pd.DataFrame, stock_code: str) -> pd.DataFrame:
+        """
+        用实时行情快照更新当日K线
+        
+        历史数据已包含当日K线时替换为快照中的最新值；交易时段内历史数据尚无当日K线时追加一根。
+        停牌、未开盘或快照与最后一根K线相同（节假日）时原样返回。不修改传入的df。
+        """
+        if df is None or df.empty:
+            return df
+        
+        snapshot = self.get_spot_snapshot()
+        if snapshot is None or stock_code not in snapshot.index:
+            return df
+        row = snapshot.loc[stock_code]
+        if pd.isna(row['最新价']) or pd.isna(row['成交量']) or row['成交量'] <= 0:
+            return df
+        
+        bar = {
+            'open': float(row['今开']),
+            'close': float(row['最新价']),
+            'high': float(row['最高']),
+            'low': float(row['最低']),
+            'volume': float(row['成交量']),
+            'amount': float(row['成交额']),
+        }
+        now = datetime.now()
+        today = pd.Timestamp(now.date())
+        last = df.iloc[-1]
+        
+        if last['date'] == today:
+            history = df.iloc[:-1]
+        elif last['date'] < today and now.weekday() < 5 and now.time() >= dt_time(9, 30) \
+                and (float(last['volume']) != bar['volume'] or float(last['close']) != bar['close']):
+            history = df
+        else:
+            return df
+        
+        return pd.concat([history, pd.DataFrame([{'date': today, **bar}])], ignore_index=True)
 
 data_service = DataService()
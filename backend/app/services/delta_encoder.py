@@ -0,0 +1,79 @@
+# 指标推送增量编码
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def flatten(data: dict, prefix: str = "") -> dict:
+    """将嵌套dict展开为以"."连接的字段路径，如 indicators.macd.dif"""
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten(value, f"{path}."))
+        else:
+            flat[path] = value
+    return flat
+
+
+def _same(a, b) -> bool:
+    # NaN与自身视为相同
+    return a == b or (a != a and b != b)
+
+
+class DeltaEncoder:
+    """
+    按股票生成指标的增量推送消息
+
+    每只股票维护最近一次推送的内容和序列号。update 返回只包含变化字段的
+    indicators_delta 消息，序列号逐次加1；客户端发现序列号不连续时可重新请求
+    snapshot（包含完整数据和当前序列号）。
+    """
+
+    def __init__(self):
+        self._latest: Dict[str, Tuple[int, dict, dict]] = {}  # 股票代码 -> (序列号, 展开后的字段, 原始结果)
+
+    def codes(self) -> List[str]:
+        return list(self._latest)
+
+    def update(self, code: str, result: dict) -> Optional[dict]:
+        """记录新的检查结果，返回增量消息（首次出现时返回快照，没有变化时返回None）"""
+        flat = flatten(result)
+        previous = self._latest.get(code)
+        if previous is None:
+            self._latest[code] = (1, flat, result)
+            return self.snapshot(code)
+
+        seq, old, _ = previous
+        changed = {
+            path: value for path, value in flat.items()
+            if path not in old or not _same(old[path], value)
+        }
+        removed = [path for path in old if path not in flat]
+        if not changed and not removed:
+            self._latest[code] = (seq, flat, result)
+            return None
+
+        seq += 1
+        self._latest[code] = (seq, flat, result)
+        message = {
+            'type': 'indicators_delta',
+            'code': code,
+            'seq': seq,
+            'changed': changed,
+        }
+        if removed:
+            message['removed'] = removed
+        return message
+
+    def snapshot(self, code: str) -> Optional[dict]:
+        """当前完整数据和序列号，没有数据时返回None"""
+        latest = self._latest.get(code)
+        if latest is None:
+            return None
+        seq, _, result = latest
+        return {'type': 'indicators_snapshot', 'code': code, 'seq': seq, 'data': result}
+
+    def snapshots(self, codes: Iterable[str]) -> List[dict]:
+        return [message for message in map(self.snapshot, codes) if message is not None]
+
+
+delta_encoder = DeltaEncoder()
@@ -0,0 +1,186 @@
+# 指标历史服务
+from datetime import datetime, timedelta, time as dt_time
+from typing import Tuple
+
+from sqlalchemy import and_, case, func, or_, select
+
+from app.config import config
+from app.database import SessionLocal, AsyncSessionLocal, IndicatorHistory, IndicatorDaily
+
+
+# 历史查询返回的列
+HISTORY_COLUMNS = (
+    IndicatorHistory.id,
+    IndicatorHistory.stock_code,
+    IndicatorHistory.timestamp,
+    IndicatorHistory.macd_signal,
+    IndicatorHistory.kdj_signal,
+    IndicatorHistory.rsi_value,
+    IndicatorHistory.rsi_signal,
+    IndicatorHistory.ma_signal,
+    IndicatorHistory.volume_signal,
+    IndicatorHistory.boll_signal,
+    IndicatorHistory.buy_signals,
+    IndicatorHistory.sell_signals,
+    IndicatorHistory.final_signal,
+)
+
+
+class HistoryService:
+    """指标历史的查询、保留与压缩"""
+
+    async def get_history(
+        self,
+        code: str = None,
+        start: datetime = None,
+        end: datetime = None,
+        signal: str = None,
+        limit: int = 100,
+        cursor: str = None,
+    ) -> dict:
+        """
+        分页查询指标历史（按时间倒序）
+
+        使用 (timestamp, id) 键集分页：cursor为上一页返回的next_cursor，
+        查询从该位置之后继续，不需要OFFSET扫描。只选取需要的列，不加载ORM对象。
+        通过异步引擎查询，不占用线程池。cursor格式不正确时抛出ValueError。
+        """
+        query_filters = []
+        if code:
+            query_filters.append(IndicatorHistory.stock_code == code)
+        if start is not None:
+            query_filters.append(IndicatorHistory.timestamp >= start)
+        if end is not None:
+            query_filters.append(IndicatorHistory.timestamp < end)
+        if signal:
+            query_filters.append(IndicatorHistory.final_signal == signal)
+        if cursor:
+            cursor_time, cursor_id = self._decode_cursor(cursor)
+            query_filters.append(or_(
+                IndicatorHistory.timestamp < cursor_time,
+                and_(IndicatorHistory.timestamp == cursor_time, IndicatorHistory.id < cursor_id),
+            ))
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(*HISTORY_COLUMNS).where(*query_filters).order_by(
+                    IndicatorHistory.timestamp.desc(), IndicatorHistory.id.desc()
+                ).limit(limit + 1)
+            )
+            rows = result.all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [
+            {**row._asdict(), 'timestamp': row.timestamp.isoformat()}
+            for row in rows
+        ]
+        next_cursor = self._encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None
+        return {'items': items, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def _encode_cursor(timestamp: datetime, row_id: int) -> str:
+        return f"{timestamp.isoformat()}_{row_id}"
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        timestamp, _, row_id = cursor.rpartition("_")
+        return datetime.fromisoformat(timestamp), int(row_id)
+
+    def compact_history(self, retention_days: int = None, now: datetime = None) -> dict:
+        """
+        将保留期之前的分钟级指标历史压缩为每股每日一行的汇总
+
+        按天逐个处理，每天在一个事务中写入汇总并删除原始记录，
+        单次事务的规模与一天的记录数成正比。返回处理的天数和删除的记录数。
+        """
+        if retention_days is None:
+            retention_days = config.HISTORY_RETENTION_DAYS
+        now = now or datetime.now()
+        cutoff = datetime.combine(now.date() - timedelta(days=retention_days), dt_time.min)
+
+        days = 0
+        rows = 0
+        while True:
+            db = SessionLocal()
+            try:
+                oldest = db.query(func.min(IndicatorHistory.timestamp)).filter(
+                    IndicatorHistory.timestamp < cutoff
+                ).scalar()
+                if oldest is None:
+                    break
+
+                day = oldest.date()
+                start = datetime.combine(day, dt_time.min)
+                in_day = and_(
+                    IndicatorHistory.timestamp >= start,
+                    IndicatorHistory.timestamp < start + timedelta(days=1),
+                )
+                self._rollup_day(db, day, in_day)
+                rows += db.query(IndicatorHistory).filter(in_day).delete(synchronize_session=False)
+                db.commit()
+                days += 1
+            except Exception as e:
+                db.rollback()
+                print(f"压缩指标历史失败: {e}")
+                break
+            finally:
+                db.close()
+
+        return {'days': days, 'rows': rows}
+
+    def _rollup_day(self, db, day, in_day):
+        """汇总一天的记录，与已有的当日汇总（压缩后又写入的迟到记录）合并"""
+        aggregates = db.query(
+            IndicatorHistory.stock_code,
+            func.count(IndicatorHistory.id),
+            func.count(IndicatorHistory.rsi_value),
+            func.avg(IndicatorHistory.rsi_value),
+            func.min(IndicatorHistory.rsi_value),
+            func.max(IndicatorHistory.rsi_value),
+            func.max(IndicatorHistory.buy_signals),
+            func.max(IndicatorHistory.sell_signals),
+            func.sum(case((IndicatorHistory.final_signal == "BUY", 1), else_=0)),
+            func.sum(case((IndicatorHistory.final_signal == "SELL", 1), else_=0)),
+        ).filter(in_day).group_by(IndicatorHistory.stock_code).all()
+
+        existing = {
+            rollup.stock_code: rollup
+            for rollup in db.query(IndicatorDaily).filter(IndicatorDaily.date == day)
+        }
+
+        for (code, count, rsi_count, rsi_avg, rsi_min, rsi_max,
+             buy_max, sell_max, buy_count, sell_count) in aggregates:
+            rollup = existing.get(code)
+            if rollup is None:
+                db.add(IndicatorDaily(
+                    stock_code=code,
+                    date=day,
+                    sample_count=count,
+                    rsi_count=rsi_count,
+                    rsi_avg=rsi_avg,
+                    rsi_min=rsi_min,
+                    rsi_max=rsi_max,
+                    buy_signals_max=buy_max or 0,
+                    sell_signals_max=sell_max or 0,
+                    buy_count=buy_count or 0,
+                    sell_count=sell_count or 0,
+                ))
+                continue
+
+            # RSI均值按有RSI值的记录数加权（avg忽略NULL）
+            rsi_total = (rollup.rsi_count or 0) + rsi_count
+            if rsi_count:
+                rollup.rsi_avg = rsi_avg if rollup.rsi_avg is None else \
+                    (rollup.rsi_avg * rollup.rsi_count + rsi_avg * rsi_count) / rsi_total
+                rollup.rsi_min = rsi_min if rollup.rsi_min is None else min(rollup.rsi_min, rsi_min)
+                rollup.rsi_max = rsi_max if rollup.rsi_max is None else max(rollup.rsi_max, rsi_max)
+            rollup.rsi_count = rsi_total
+            rollup.sample_count += count
+            rollup.buy_signals_max = max(rollup.buy_signals_max, buy_max or 0)
+            rollup.sell_signals_max = max(rollup.sell_signals_max, sell_max or 0)
+            rollup.buy_count += buy_count or 0
+            rollup.sell_count += sell_count or 0
+
+
+history_service = HistoryService()
@@ -0,0 +1,309 @@
+# 指标计算内核
+# numba为可选依赖：已安装时使用编译后的单次遍历内核，未安装时使用NumPy实现
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import numba
+except ImportError:  # pragma: no cover
+    numba = None
+
+# 内核输出的数值列（顺序与输出数组的行一致，与 calculate_indicator_series 的列名相同）
+KERNEL_COLUMNS = (
+    'dif', 'dea', 'macd',
+    'k', 'd', 'j',
+    'rsi',
+    'ma5', 'ma10', 'ma20',
+    'volume', 'volume_ma5',
+    'boll_upper', 'boll_middle', 'boll_lower',
+)
+
+# 可选的计算后端
+BACKENDS = ('pandas', 'numpy', 'numba')
+
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+KDJ_N = 9
+KDJ_ALPHA = 1 / 3  # ewm(com=2)
+RSI_PERIOD = 14
+BOLL_PERIOD, BOLL_STD = 20, 2
+
+
+def numba_available() -> bool:
+    return numba is not None
+
+
+def _ewm_step(weighted: float, old_wt: float, x: float, alpha: float):
+    """
+    ewm(adjust=False).mean() 的一步递推，返回新的 (均值, 旧权重)
+
+    与pandas的实现逐步一致：首个有效值之前为NaN，中间的NaN沿用上一个均值且旧权重继续衰减。
+    """
+    if weighted == weighted:
+        old_wt *= 1 - alpha
+        if x == x:
+            if weighted != x:
+                weighted = (old_wt * weighted + alpha * x) / (old_wt + alpha)
+            old_wt = 1.0
+    elif x == x:
+        weighted = x
+        old_wt = 1.0
+    return weighted, old_wt
+
+
+def _ewm(values: np.ndarray, alpha: float) -> np.ndarray:
+    """ewm(adjust=False).mean() 序列"""
+    out = np.empty(len(values))
+    weighted, old_wt = np.nan, 1.0
+    for i in range(len(values)):
+        weighted, old_wt = _ewm_step(weighted, old_wt, values[i], alpha)
+        out[i] = weighted
+    return out
+
+
+def _window_mean(values: np.ndarray, end: int, window: int) -> float:
+    """values[end-window+1 : end+1] 的均值，窗口不足时为NaN"""
+    if end + 1 < window:
+        return np.nan
+    total = 0.0
+    for i in range(end - window + 1, end + 1):
+        total += values[i]
+    return total / window
+
+
+def _one_pass(close, high, low, volume):
+    """单次遍历计算全部指标（由numba编译后使用），返回 len(KERNEL_COLUMNS) × n 数组"""
+    n = len(close)
+    out = np.empty((len(KERNEL_COLUMNS), n))
+    gains = np.empty(n)
+    losses = np.empty(n)
+    fast_alpha = 2.0 / (MACD_FAST + 1)
+    slow_alpha = 2.0 / (MACD_SLOW + 1)
+    signal_alpha = 2.0 / (MACD_SIGNAL + 1)
+
+    ema_fast, fast_wt = np.nan, 1.0
+    ema_slow, slow_wt = np.nan, 1.0
+    dea, dea_wt = np.nan, 1.0
+    k, k_wt = np.nan, 1.0
+    d, d_wt = np.nan, 1.0
+
+    for i in range(n):
+        c = close[i]
+
+        # MACD
+        ema_fast, fast_wt = _ewm_step(ema_fast, fast_wt, c, fast_alpha)
+        ema_slow, slow_wt = _ewm_step(ema_slow, slow_wt, c, slow_alpha)
+        dif = ema_fast - ema_slow
+        dea, dea_wt = _ewm_step(dea, dea_wt, dif, signal_alpha)
+        out[0, i] = dif
+        out[1, i] = dea
+        out[2, i] = (dif - dea) * 2
+
+        # KDJ
+        rsv = np.nan
+        if i + 1 >= KDJ_N:
+            lowest = np.inf
+            highest = -np.inf
+            for t in range(i - KDJ_N + 1, i + 1):
+                if low[t] != low[t] or high[t] != high[t]:
+                    lowest = np.nan
+                    highest = np.nan
+                    break
+                lowest = min(lowest, low[t])
+                highest = max(highest, high[t])
+            rsv = (c - lowest) / (highest - lowest) * 100
+        k, k_wt = _ewm_step(k, k_wt, rsv, KDJ_ALPHA)
+        d, d_wt = _ewm_step(d, d_wt, k, KDJ_ALPHA)
+        out[3, i] = k
+        out[4, i] = d
+        out[5, i] = 3 * k - 2 * d
+
+        # RSI（首日涨跌按0计，与pandas的 where 结果一致）
+        delta = c - close[i - 1] if i > 0 else np.nan
+        gains[i] = delta if delta > 0 else 0.0
+        losses[i] = -delta if delta < 0 else 0.0
+        gain = _window_mean(gains, i, RSI_PERIOD)
+        loss = _window_mean(losses, i, RSI_PERIOD)
+        out[6, i] = 100 - (100 / (1 + gain / loss))
+
+        # 均线、成交量
+        out[7, i] = _window_mean(close, i, 5)
+        out[8, i] = _window_mean(close, i, 10)
+        middle = _window_mean(close, i, BOLL_PERIOD)
+        out[9, i] = middle
+        out[10, i] = volume[i]
+        out[11, i] = _window_mean(volume, i, 5)
+
+        # 布林带（样本标准差）
+        std = np.nan
+        if i + 1 >= BOLL_PERIOD:
+            total = 0.0
+            for t in range(i - BOLL_PERIOD + 1, i + 1):
+                total += (close[t] - middle) ** 2
+            std = np.sqrt(total / (BOLL_PERIOD - 1))
+        out[12, i] = middle + BOLL_STD * std
+        out[13, i] = middle
+        out[14, i] = middle - BOLL_STD * std
+
+    return out
+
+
+if numba is not None:
+    # error_model='numpy'：除零得到inf/NaN而不是抛出异常，与NumPy/pandas一致
+    _ewm_step = numba.njit(error_model='numpy', cache=True)(_ewm_step)
+    _window_mean = numba.njit(error_model='numpy', cache=True)(_window_mean)
+    _one_pass = numba.njit(error_model='numpy', cache=True)(_one_pass)
+    _ewm_compiled = numba.njit(error_model='numpy', cache=True)(_ewm)
+else:  # pragma: no cover
+    _ewm_compiled = None
+
+
+def _rolling(values: np.ndarray, window: int, func, **kwargs) -> np.ndarray:
+    """滚动窗口统计，窗口不足的位置为NaN"""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = func(sliding_window_view(values, window), axis=-1, **kwargs)
+    return out
+
+
+def _numpy_pass(close, high, low, volume):
+    """NumPy实现：滚动窗口用滑动视图一次计算，只有EMA递推逐元素进行"""
+    ewm = _ewm_compiled or _ewm
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ema_fast = ewm(close, 2.0 / (MACD_FAST + 1))
+        ema_slow = ewm(close, 2.0 / (MACD_SLOW + 1))
+        dif = ema_fast - ema_slow
+        dea = ewm(dif, 2.0 / (MACD_SIGNAL + 1))
+
+        lowest = _rolling(low, KDJ_N, np.min)
+        highest = _rolling(high, KDJ_N, np.max)
+        rsv = (close - lowest) / (highest - lowest) * 100
+        k = ewm(rsv, KDJ_ALPHA)
+        d = ewm(k, KDJ_ALPHA)
+
+        delta = np.empty(len(close))
+        delta[:1] = np.nan
+        delta[1:] = np.diff(close)
+        gain = _rolling(np.where(delta > 0, delta, 0.0), RSI_PERIOD, np.mean)
+        loss = _rolling(np.where(delta < 0, -delta, 0.0), RSI_PERIOD, np.mean)
+        rsi = 100 - (100 / (1 + gain / loss))
+
+        middle = _rolling(close, BOLL_PERIOD, np.mean)
+        std = _rolling(close, BOLL_PERIOD, np.std, ddof=1)
+
+    return np.stack([
+        dif, dea, (dif - dea) * 2,
+        k, d, 3 * k - 2 * d,
+        rsi,
+        _rolling(close, 5, np.mean), _rolling(close, 10, np.mean), middle,
+        volume, _rolling(volume, 5, np.mean),
+        middle + BOLL_STD * std, middle, middle - BOLL_STD * std,
+    ])
+
+
+def compute_indicator_arrays(close, high, low, volume, backend: str = 'numba') -> dict:
+    """
+    计算全部指标的数值序列，返回 列名 -> float64数组
+
+    backend为numba时使用编译后的单次遍历内核（未安装numba时使用numpy实现）。
+    """
+    arrays = [
+        np.ascontiguousarray(values, dtype=np.float64)
+        for values in (close, high, low, volume)
+    ]
+    if backend == 'numba' and numba is not None:
+        out = _one_pass(*arrays)
+    else:
+        out = _numpy_pass(*arrays)
+    return dict(zip(KERNEL_COLUMNS, out))
+
+
+def _ewm_matrix(values: np.ndarray, alpha) -> np.ndarray:
+    """
+    对 股票×交易日 矩阵的每一行计算 ewm(adjust=False).mean()
+
+    按交易日递推，每一步对所有股票做一次向量运算（逐元素规则同 _ewm_step），
+    alpha可以是每行一个取值的列向量。
+    """
+    m, n = values.shape
+    alpha = np.broadcast_to(alpha, (m,))
+    out = np.empty((m, n))
+    weighted = np.full(m, np.nan)
+    old_wt = np.ones(m)
+    for i in range(n):
+        x = values[:, i]
+        started = weighted == weighted
+        observed = x == x
+        old_wt = np.where(started, old_wt * (1 - alpha), old_wt)
+        update = started & observed & (weighted != x)
+        weighted = np.where(
+            update, (old_wt * weighted + alpha * x) / (old_wt + alpha), weighted
+        )
+        weighted = np.where(~started & observed, x, weighted)
+        old_wt = np.where(observed, 1.0, old_wt)
+        out[:, i] = weighted
+    return out
+
+
+def _tail_windows(values: np.ndarray, window: int, tail: int) -> np.ndarray:
+    """每行最后tail个交易日各自的滚动窗口，形状 股票×tail×window（不足处补NaN）"""
+    width = window + tail - 1
+    if values.shape[1] < width:
+        pad = np.full((values.shape[0], width - values.shape[1]), np.nan)
+        values = np.hstack([pad, values])
+    return sliding_window_view(values[:, -width:], window, axis=1)
+
+
+def compute_indicator_matrix(close, high, low, volume, tail: int = 2) -> dict:
+    """
+    横截面批量计算：输入 股票×交易日 的价格/成交量矩阵，沿axis=1计算全部指标
+
+    每行为一只股票按时间升序的日线，右对齐（最后一列为最近交易日），
+    历史较短的股票左侧补NaN。EMA类指标在整段历史上递推，滚动窗口类指标只计算
+    最后tail个交易日。返回 列名（KERNEL_COLUMNS）-> 股票×tail 数组，
+    每行结果与对该股票单独调用 calculate_indicator_series 的最后tail行一致。
+    """
+    close, high, low, volume = [
+        np.ascontiguousarray(np.atleast_2d(values), dtype=np.float64)
+        for values in (close, high, low, volume)
+    ]
+    m = close.shape[0]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # MACD：快慢EMA叠成一个矩阵一起递推
+        alphas = np.repeat([2.0 / (MACD_FAST + 1), 2.0 / (MACD_SLOW + 1)], m)
+        emas = _ewm_matrix(np.vstack([close, close]), alphas)
+        dif = emas[:m] - emas[m:]
+        dea = _ewm_matrix(dif, 2.0 / (MACD_SIGNAL + 1))
+
+        # KDJ：RSV需要整段历史参与K、D的递推
+        lowest = _tail_windows(low, KDJ_N, close.shape[1]).min(axis=-1)
+        highest = _tail_windows(high, KDJ_N, close.shape[1]).max(axis=-1)
+        rsv = (close - lowest) / (highest - lowest) * 100
+        k = _ewm_matrix(rsv, KDJ_ALPHA)
+        d = _ewm_matrix(k, KDJ_ALPHA)
+
+        # RSI（首个交易日的涨跌按0计）
+        delta = np.empty_like(close)
+        delta[:, :1] = np.nan
+        delta[:, 1:] = np.diff(close, axis=1)
+        gain = _tail_windows(np.where(delta > 0, delta, 0.0), RSI_PERIOD, tail).mean(axis=-1)
+        loss = _tail_windows(np.where(delta < 0, -delta, 0.0), RSI_PERIOD, tail).mean(axis=-1)
+        rsi = 100 - (100 / (1 + gain / loss))
+
+        boll_window = _tail_windows(close, BOLL_PERIOD, tail)
+        middle = boll_window.mean(axis=-1)
+        std = boll_window.std(axis=-1, ddof=1)
+
+    return {
+        'dif': dif[:, -tail:], 'dea': dea[:, -tail:], 'macd': ((dif - dea) * 2)[:, -tail:],
+        'k': k[:, -tail:], 'd': d[:, -tail:], 'j': (3 * k - 2 * d)[:, -tail:],
+        'rsi': rsi,
+        'ma5': _tail_windows(close, 5, tail).mean(axis=-1),
+        'ma10': _tail_windows(close, 10, tail).mean(axis=-1),
+        'ma20': middle,
+        'volume': volume[:, -tail:],
+        'volume_ma5': _tail_windows(volume, 5, tail).mean(axis=-1),
+        'boll_upper': middle + BOLL_STD * std,
+        'boll_middle': middle,
+        'boll_lower': middle - BOLL_STD * std,
+    }
@@ -1,6 +1,20 @@
 # 技术指标计算服务
 import pandas as pd
 import numpy as np
+from app.config import config
+from app.services.indicator_kernels import (
+    BACKENDS, compute_indicator_arrays, compute_indicator_matrix
+)
+
+# 各指标对应的信号列及买入/卖出信号取值
+SIGNAL_COLUMNS = {
+    'macd': ('macd_signal', '金叉', '死叉'),
+    'kdj': ('kdj_signal', '金叉', '死叉'),
+    'rsi': ('rsi_signal', '超卖', '超买'),
+    'ma': ('ma_signal', '金叉', '死叉'),
+    'volume': ('volume_signal', '放量', '缩量'),
+    'boll': ('boll_signal', '下轨反弹', '上轨回落'),
+}
 
 class IndicatorService:
     def __init__(self):
@@ -39,16 +53,7 @@ class IndicatorService:
     
     def calculate_macd(self, df: pd.DataFrame, fast=12, slow=26, signal=9) -> dict:
         """计算MACD指标"""
-        close = df['close']
-        
-        # 计算EMA
-        ema_fast = close.ewm(span=fast, adjust=False).mean()
-        ema_slow = close.ewm(span=slow, adjust=False).mean()
-        
-        # DIF和DEA
-        dif = ema_fast - ema_slow
-        dea = dif.ewm(span=signal, adjust=False).mean()
-        macd = (dif - dea) * 2
+        dif, dea, macd = self._macd_series(df['close'], fast, slow, signal)
         
         # 判断信号
         current_dif = dif.iloc[-1]
@@ -71,13 +76,7 @@ class IndicatorService:
     
     def calculate_kdj(self, df: pd.DataFrame, n=9) -> dict:
         """计算KDJ指标"""
-        low_list = df['low'].rolling(window=n, min_periods=n).min()
-        high_list = df['high'].rolling(window=n, min_periods=n).max()
-        rsv = (df['close'] - low_list) / (high_list - low_list) * 100
-        
-        k = rsv.ewm(com=2, adjust=False).mean()
-        d = k.ewm(com=2, adjust=False).mean()
-        j = 3 * k - 2 * d
+        k, d, j = self._kdj_series(df, n)
         
         current_k = k.iloc[-1]
         current_d = d.iloc[-1]
@@ -99,14 +98,7 @@ class IndicatorService:
     
     def calculate_rsi(self, df: pd.DataFrame, period=14) -> dict:
         """计算RSI指标"""
-        close = df['close']
-        delta = close.diff()
-        
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
+        rsi = self._rsi_series(df['close'], period)
         
         current_rsi = rsi.iloc[-1]
         
@@ -170,10 +162,7 @@ class IndicatorService:
         """计算布林带信号"""
         close = df['close']
         
-        middle = close.rolling(window=period).mean()
-        std = close.rolling(window=period).std()
-        upper = middle + std_dev * std
-        lower = middle - std_dev * std
+        upper, middle, lower = self._boll_series(close, period, std_dev)
         
         current_close = close.iloc[-1]
         current_upper = upper.iloc[-1]
@@ -198,5 +187,219 @@ class IndicatorService:
             'lower': float(current_lower),
             'signal': signal_type
         }
+    
+    def calculate_indicator_series(self, df: pd.DataFrame, backend: str = None) -> pd.DataFrame:
+        """
+        计算整段历史的全部指标序列
+        
+        返回与df按行对齐的DataFrame，数值列为float64数组，信号列为每日信号名称。
+        第i行与 calculate_all_indicators(df.iloc[:i+1]) 的对应取值一致，
+        回测、历史查询和选股可直接复用同一次计算结果。
+        
+        backend: pandas（默认，见 config.INDICATOR_BACKEND）、numpy 或 numba。
+        numba在连续的float64数组上单次遍历计算全部指标，未安装numba时使用numpy实现，
+        各后端结果在浮点误差内一致。
+        """
+        backend = backend or config.INDICATOR_BACKEND
+        if backend not in BACKENDS:
+            raise ValueError(f"无效的指标计算后端: {backend}")
+        
+        if backend == 'pandas':
+            columns = self._pandas_series(df)
+        else:
+            columns = compute_indicator_arrays(
+                df['close'].to_numpy(), df['high'].to_numpy(),
+                df['low'].to_numpy(), df['volume'].to_numpy(), backend
+            )
+        close = df['close'].to_numpy(dtype=np.float64)
+        columns.update(self._signal_columns(columns, close))
+        
+        return pd.DataFrame(columns, index=df.index)
+    
+    def calculate_batch_signals(self, codes, close, high, low, volume) -> pd.DataFrame:
+        """
+        横截面批量计算全市场最近一个交易日的指标和信号
+        
+        close/high/low/volume为 股票×交易日 矩阵（见 stack_bars），沿axis=1一次计算所有股票。
+        返回按股票代码索引的信号表：数值列与 calculate_indicator_series 相同，
+        信号列为最近交易日的信号名称，buy_count/sell_count为买入/卖出信号数。
+        有效日线不足30天的股票（calculate_all_indicators 返回None的情况）不在结果中。
+        """
+        close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+        columns = compute_indicator_matrix(close, high, low, volume, tail=2)
+        columns.update(self._signal_columns(columns, close[:, -2:]))
+        
+        table = pd.DataFrame(
+            {name: values[:, -1] for name, values in columns.items()},
+            index=pd.Index(list(codes), name='code'),
+        )
+        table['buy_count'] = sum(
+            (table[column] == buy).to_numpy(dtype=int) for column, buy, _ in SIGNAL_COLUMNS.values()
+        )
+        table['sell_count'] = sum(
+            (table[column] == sell).to_numpy(dtype=int) for column, _, sell in SIGNAL_COLUMNS.values()
+        )
+        return table[np.count_nonzero(~np.isnan(close), axis=1) >= 30]
+    
+    @staticmethod
+    def stack_bars(bars: pd.DataFrame, days: int = 120):
+        """
+        将多只股票的日线（含stock_code列的长表）转换为 股票×交易日 矩阵
+        
+        每只股票取最近days根K线并右对齐，历史较短的股票左侧补NaN。
+        右对齐按K线数而不是日期，最后一根K线早于bars中最新日期的股票（停牌、本地日线未同步）
+        不在结果中，矩阵最后一列都是同一交易日。
+        返回 (股票代码列表, {'close'/'high'/'low'/'volume': 矩阵})。
+        """
+        if len(bars):
+            last_date = bars.groupby('stock_code')['date'].transform('max')
+            bars = bars[last_date == bars['date'].max()]
+        bars = bars.sort_values(['stock_code', 'date'], kind='stable')
+        codes, rows = np.unique(bars['stock_code'].to_numpy(), return_inverse=True)
+        from_end = bars.groupby('stock_code', sort=False).cumcount(ascending=False).to_numpy()
+        width = min(days, int(from_end.max()) + 1) if len(bars) else 0
+        keep = from_end < width
+        rows, cols = rows[keep], width - 1 - from_end[keep]
+        
+        matrices = {}
+        for field in ('close', 'high', 'low', 'volume'):
+            matrix = np.full((len(codes), width), np.nan)
+            matrix[rows, cols] = bars[field].to_numpy(dtype=np.float64)[keep]
+            matrices[field] = matrix
+        return codes.tolist(), matrices
+    
+    def _signal_columns(self, columns: dict, close: np.ndarray) -> dict:
+        """根据数值列计算各指标的信号名称（沿最后一维为时间，支持单只股票序列和 股票×交易日 矩阵）"""
+        signals = {}
+        signals['macd_signal'] = self._cross_signal(columns['dif'], columns['dea'])
+        signals['kdj_signal'] = self._cross_signal(
+            columns['k'], columns['d'],
+            golden_filter=columns['k'] < 20, dead_filter=columns['k'] > 80
+        )
+        signals['rsi_signal'] = np.select(
+            [columns['rsi'] < 30, columns['rsi'] > 70], ['超卖', '超买'], '中性'
+        ).astype(object)
+        signals['ma_signal'] = self._cross_signal(columns['ma5'], columns['ma20'])
+        signals['volume_signal'] = np.select(
+            [
+                columns['volume'] > columns['volume_ma5'] * 1.5,
+                columns['volume'] < columns['volume_ma5'] * 0.5,
+            ],
+            ['放量', '缩量'],
+            '中性'
+        ).astype(object)
+        
+        prev_close = self._shift(close)
+        signals['boll_signal'] = np.select(
+            [
+                (prev_close <= columns['boll_lower']) & (close > prev_close),
+                (prev_close >= columns['boll_upper']) & (close < prev_close),
+                close <= columns['boll_lower'],
+                close >= columns['boll_upper'],
+            ],
+            ['下轨反弹', '上轨回落', '下轨', '上轨'],
+            '中轨'
+        ).astype(object)
+        
+        return signals
+    
+    def calculate_buy_signal_series(
+        self, df: pd.DataFrame, series: pd.DataFrame = None, backend: str = None
+    ) -> pd.DataFrame:
+        """
+        一次性计算整段历史每一天的买入信号
+        
+        每列对应一个指标（macd/kdj/rsi/ma/volume/boll），第i行为True表示
+        用 df.iloc[:i+1] 调用 calculate_all_indicators 时该指标给出买入信号。
+        已有 calculate_indicator_series 结果时可通过series传入避免重复计算。
+        """
+        if series is None:
+            series = self.calculate_indicator_series(df, backend)
+        
+        return pd.DataFrame({
+            key: series[column].to_numpy() == buy
+            for key, (column, buy, _) in SIGNAL_COLUMNS.items()
+        }, index=series.index)
+    
+    def _pandas_series(self, df: pd.DataFrame) -> dict:
+        """用pandas计算全部数值序列，返回 列名 -> float64数组"""
+        close = df['close'].astype(float)
+        volume = df['volume'].astype(float)
+        
+        dif, dea, macd = self._macd_series(close)
+        k, d, j = self._kdj_series(df)
+        rsi = self._rsi_series(close)
+        ma5 = close.rolling(window=5).mean()
+        ma10 = close.rolling(window=10).mean()
+        ma20 = close.rolling(window=20).mean()
+        volume_ma5 = volume.rolling(window=5).mean()
+        upper, middle, lower = self._boll_series(close)
+        
+        columns = {
+            'dif': dif, 'dea': dea, 'macd': macd,
+            'k': k, 'd': d, 'j': j,
+            'rsi': rsi,
+            'ma5': ma5, 'ma10': ma10, 'ma20': ma20,
+            'volume': volume, 'volume_ma5': volume_ma5,
+            'boll_upper': upper, 'boll_middle': middle, 'boll_lower': lower,
+        }
+        return {name: series.to_numpy(dtype=np.float64) for name, series in columns.items()}
+    
+    def _macd_series(self, close: pd.Series, fast=12, slow=26, signal=9):
+        """计算DIF、DEA、MACD柱序列"""
+        # 计算EMA
+        ema_fast = close.ewm(span=fast, adjust=False).mean()
+        ema_slow = close.ewm(span=slow, adjust=False).mean()
+        
+        # DIF和DEA
+        dif = ema_fast - ema_slow
+        dea = dif.ewm(span=signal, adjust=False).mean()
+        macd = (dif - dea) * 2
+        return dif, dea, macd
+    
+    def _kdj_series(self, df: pd.DataFrame, n=9):
+        """计算K、D、J序列"""
+        low_list = df['low'].rolling(window=n, min_periods=n).min()
+        high_list = df['high'].rolling(window=n, min_periods=n).max()
+        rsv = (df['close'] - low_list) / (high_list - low_list) * 100
+        
+        k = rsv.ewm(com=2, adjust=False).mean()
+        d = k.ewm(com=2, adjust=False).mean()
+        j = 3 * k - 2 * d
+        return k, d, j
+    
+    def _rsi_series(self, close: pd.Series, period=14) -> pd.Series:
+        """计算RSI序列"""
+        delta = close.diff()
+        
+        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+        
+        rs = gain / loss
+        return 100 - (100 / (1 + rs))
+    
+    def _boll_series(self, close: pd.Series, period=20, std_dev=2):
+        """计算布林带上轨、中轨、下轨序列"""
+        middle = close.rolling(window=period).mean()
+        std = close.rolling(window=period).std()
+        upper = middle + std_dev * std
+        lower = middle - std_dev * std
+        return upper, middle, lower
+    
+    @staticmethod
+    def _shift(values: np.ndarray) -> np.ndarray:
+        """数组沿最后一维后移一位，首位补NaN"""
+        shifted = np.empty_like(values)
+        shifted[..., 0:1] = np.nan
+        shifted[..., 1:] = values[..., :-1]
+        return shifted
+    
+    def _cross_signal(self, fast: np.ndarray, slow: np.ndarray, golden_filter=True, dead_filter=True) -> np.ndarray:
+        """根据快慢线判断每日金叉/死叉"""
+        prev_fast = self._shift(fast)
+        prev_slow = self._shift(slow)
+        golden = (prev_fast <= prev_slow) & (fast > slow) & golden_filter
+        dead = (prev_fast >= prev_slow) & (fast < slow) & dead_filter
+        return np.select([golden, dead], ['金叉', '死叉'], '中性').astype(object)
 
 indicator_service = IndicatorService()
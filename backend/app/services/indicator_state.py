@@ -0,0 +1,422 @@
+# 增量指标状态
+import math
+from collections import deque
+from typing import Optional
+
+import pandas as pd
+
+
+def _divide(a: float, b: float) -> float:
+    """按IEEE规则相除（与pandas一致，除零得到inf或NaN）"""
+    if b == 0 or math.isnan(b):
+        if math.isnan(a) or math.isnan(b) or a == 0:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class _EWMMean:
+    """与 pandas ewm(adjust=False).mean() 逐步计算方式一致的指数移动平均"""
+
+    __slots__ = ("alpha", "value", "old_wt")
+
+    def __init__(self, com: float):
+        self.alpha = 1.0 / (1.0 + com)
+        self.value = math.nan
+        self.old_wt = 1.0
+
+    def copy(self) -> "_EWMMean":
+        other = _EWMMean.__new__(_EWMMean)
+        other.alpha, other.value, other.old_wt = self.alpha, self.value, self.old_wt
+        return other
+
+    def push(self, val: float) -> float:
+        is_observation = not math.isnan(val)
+        if not math.isnan(self.value):
+            self.old_wt *= 1.0 - self.alpha
+            if is_observation:
+                if self.value != val:
+                    self.value = self.old_wt * self.value + self.alpha * val
+                    self.value /= self.old_wt + self.alpha
+                self.old_wt = 1.0
+        elif is_observation:
+            self.value = val
+        return self.value
+
+
+class _RollingMean:
+    """与 pandas rolling(window).mean() 一致的滑动均值（Kahan求和，增量更新）"""
+
+    __slots__ = (
+        "window", "values", "nobs", "sum_x", "neg_ct",
+        "compensation_add", "compensation_remove",
+        "num_consecutive_same_value", "prev_value",
+    )
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.neg_ct = 0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = None
+
+    def copy(self) -> "_RollingMean":
+        other = _RollingMean.__new__(_RollingMean)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        other.values = self.values.copy()
+        return other
+
+    def push(self, val: float) -> float:
+        if self.prev_value is None:
+            self.prev_value = val
+
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if not math.isnan(old):
+                self.nobs -= 1
+                y = -old - self.compensation_remove
+                t = self.sum_x + y
+                self.compensation_remove = t - self.sum_x - y
+                self.sum_x = t
+                if math.copysign(1.0, old) < 0:
+                    self.neg_ct -= 1
+
+        self.values.append(val)
+        if not math.isnan(val):
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            if val == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = val
+
+        if self.nobs < self.window or self.nobs == 0:
+            return math.nan
+        result = self.sum_x / self.nobs
+        if self.num_consecutive_same_value >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+
+class _RollingStd:
+    """与 pandas rolling(window).std() 一致的滑动标准差（Welford算法，增量更新）"""
+
+    __slots__ = (
+        "window", "values", "nobs", "mean_x", "ssqdm_x",
+        "compensation_add", "compensation_remove",
+        "num_consecutive_same_value", "prev_value",
+    )
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = None
+
+    def copy(self) -> "_RollingStd":
+        other = _RollingStd.__new__(_RollingStd)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        other.values = self.values.copy()
+        return other
+
+    def push(self, val: float) -> float:
+        if self.prev_value is None:
+            self.prev_value = val
+
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if not math.isnan(old):
+                self.nobs -= 1
+                if self.nobs:
+                    prev_mean = self.mean_x - self.compensation_remove
+                    y = old - self.compensation_remove
+                    t = y - self.mean_x
+                    self.compensation_remove = t + self.mean_x - y
+                    self.mean_x = self.mean_x - t / self.nobs
+                    self.ssqdm_x = self.ssqdm_x - (old - prev_mean) * (old - self.mean_x)
+                else:
+                    self.mean_x = 0.0
+                    self.ssqdm_x = 0.0
+
+        self.values.append(val)
+        if not math.isnan(val):
+            self.nobs += 1
+            if val == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = val
+            prev_mean = self.mean_x - self.compensation_add
+            y = val - self.compensation_add
+            t = y - self.mean_x
+            self.compensation_add = t + self.mean_x - y
+            self.mean_x = self.mean_x + t / self.nobs
+            self.ssqdm_x = self.ssqdm_x + (val - prev_mean) * (val - self.mean_x)
+
+        if self.nobs < self.window or self.nobs <= 1:
+            return math.nan
+        var = self.ssqdm_x / (self.nobs - 1)
+        return math.sqrt(var) if var >= 0 else 0.0
+
+
+class _RollingExtreme:
+    """滑动窗口最小/最大值"""
+
+    __slots__ = ("window", "values", "func")
+
+    def __init__(self, window: int, func):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.func = func
+
+    def copy(self) -> "_RollingExtreme":
+        other = _RollingExtreme.__new__(_RollingExtreme)
+        other.window, other.func = self.window, self.func
+        other.values = self.values.copy()
+        return other
+
+    def push(self, val: float) -> float:
+        self.values.append(val)
+        valid = [v for v in self.values if not math.isnan(v)]
+        if len(valid) < self.window:
+            return math.nan
+        return self.func(valid)
+
+
+class _Accumulators:
+    """截至某根K线的全部指标递推状态"""
+
+    def __init__(self, fast=12, slow=26, signal=9, kdj_n=9, rsi_period=14,
+                 ma_short=5, ma_long=20, boll_period=20, boll_std=2):
+        self.count = 0
+        self.boll_std = boll_std
+
+        # MACD（span换算为com，与pandas一致）
+        self.ema_fast = _EWMMean((fast - 1) / 2.0)
+        self.ema_slow = _EWMMean((slow - 1) / 2.0)
+        self.dea = _EWMMean((signal - 1) / 2.0)
+
+        # KDJ
+        self.low_min = _RollingExtreme(kdj_n, min)
+        self.high_max = _RollingExtreme(kdj_n, max)
+        self.k = _EWMMean(2)
+        self.d = _EWMMean(2)
+
+        # RSI
+        self.gain = _RollingMean(rsi_period)
+        self.loss = _RollingMean(rsi_period)
+
+        # 均线与成交量
+        self.ma_short = _RollingMean(ma_short)
+        self.ma5 = _RollingMean(5)
+        self.ma10 = _RollingMean(10)
+        self.ma_long = _RollingMean(ma_long)
+        self.volume_ma5 = _RollingMean(5)
+
+        # 布林带
+        self.boll_middle = _RollingMean(boll_period)
+        self.boll_std_dev = _RollingStd(boll_period)
+
+        # 上一根K线的指标值（用于判断交叉）
+        self.prev_close = math.nan
+        self.prev_dif = math.nan
+        self.prev_dea = math.nan
+        self.prev_k = math.nan
+        self.prev_d = math.nan
+        self.prev_ma_short = math.nan
+        self.prev_ma_long = math.nan
+
+    def copy(self) -> "_Accumulators":
+        other = _Accumulators.__new__(_Accumulators)
+        for name, value in self.__dict__.items():
+            setattr(other, name, value.copy() if hasattr(value, "copy") else value)
+        return other
+
+    def push(self, high: float, low: float, close: float, volume: float) -> dict:
+        """推入一根K线，返回与 calculate_all_indicators 相同结构的指标"""
+        prev_close = self.prev_close
+        self.count += 1
+
+        # MACD
+        dif = self.ema_fast.push(close) - self.ema_slow.push(close)
+        dea = self.dea.push(dif)
+        macd_signal = "中性"
+        if self.prev_dif <= self.prev_dea and dif > dea:
+            macd_signal = "金叉"
+        elif self.prev_dif >= self.prev_dea and dif < dea:
+            macd_signal = "死叉"
+
+        # KDJ
+        low_n = self.low_min.push(low)
+        high_n = self.high_max.push(high)
+        rsv = _divide(close - low_n, high_n - low_n) * 100
+        k = self.k.push(rsv)
+        d = self.d.push(k)
+        kdj_signal = "中性"
+        if self.prev_k <= self.prev_d and k > d and k < 20:
+            kdj_signal = "金叉"
+        elif self.prev_k >= self.prev_d and k < d and k > 80:
+            kdj_signal = "死叉"
+
+        # RSI（首根K线的涨跌视为0，与 diff().where(..., 0) 一致）
+        delta = close - prev_close
+        gain = self.gain.push(delta if delta > 0 else 0.0)
+        loss = self.loss.push(-delta if delta < 0 else -0.0)
+        rsi = 100 - _divide(100, 1 + _divide(gain, loss))
+        rsi_signal = "中性"
+        if rsi < 30:
+            rsi_signal = "超卖"
+        elif rsi > 70:
+            rsi_signal = "超买"
+
+        # 均线
+        ma_short = self.ma_short.push(close)
+        ma_long = self.ma_long.push(close)
+        ma5 = self.ma5.push(close)
+        ma10 = self.ma10.push(close)
+        ma_signal = "中性"
+        if self.prev_ma_short <= self.prev_ma_long and ma_short > ma_long:
+            ma_signal = "金叉"
+        elif self.prev_ma_short >= self.prev_ma_long and ma_short < ma_long:
+            ma_signal = "死叉"
+
+        # 成交量
+        volume_ma5 = self.volume_ma5.push(volume)
+        volume_signal = "中性"
+        if volume > volume_ma5 * 1.5:
+            volume_signal = "放量"
+        elif volume < volume_ma5 * 0.5:
+            volume_signal = "缩量"
+
+        # 布林带
+        middle = self.boll_middle.push(close)
+        std = self.boll_std_dev.push(close)
+        upper = middle + self.boll_std * std
+        lower = middle - self.boll_std * std
+        boll_signal = "中轨"
+        if close <= lower:
+            boll_signal = "下轨"
+        elif close >= upper:
+            boll_signal = "上轨"
+        if prev_close <= lower and close > prev_close:
+            boll_signal = "下轨反弹"
+        elif prev_close >= upper and close < prev_close:
+            boll_signal = "上轨回落"
+
+        self.prev_close = close
+        self.prev_dif, self.prev_dea = dif, dea
+        self.prev_k, self.prev_d = k, d
+        self.prev_ma_short, self.prev_ma_long = ma_short, ma_long
+
+        return {
+            'macd': {'dif': dif, 'dea': dea, 'macd': (dif - dea) * 2, 'signal': macd_signal},
+            'kdj': {'k': k, 'd': d, 'j': 3 * k - 2 * d, 'signal': kdj_signal},
+            'rsi': {'value': rsi, 'signal': rsi_signal},
+            'ma': {'ma5': ma5, 'ma10': ma10, 'ma20': ma_long, 'signal': ma_signal},
+            'volume': {'current': volume, 'ma5': volume_ma5, 'signal': volume_signal},
+            'boll': {'upper': upper, 'middle': middle, 'lower': lower, 'signal': boll_signal},
+            'current_price': close,
+            'change_pct': _divide(close - prev_close, prev_close) * 100,
+        }
+
+
+class IndicatorState:
+    """
+    单只股票的增量指标状态
+
+    保存截至上一根K线的EMA递推值、滑动窗口和前值，最新一根K线（盘中会不断修正）
+    在此基础上计算，因此新增或修正最新K线都只需O(1)计算，结果与
+    calculate_all_indicators 对同一段数据的计算完全一致。
+    """
+
+    def __init__(self):
+        self._committed = _Accumulators()
+        self._pending: Optional[_Accumulators] = None
+        self._pending_date = None
+        self._pending_close = math.nan
+        self._result: Optional[dict] = None
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "IndicatorState":
+        """用历史K线初始化状态"""
+        state = cls()
+        columns = [df[name].astype(float).tolist() for name in ("high", "low", "close", "volume")]
+        for date, high, low, close, volume in zip(df["date"], *columns):
+            state._push(date, high, low, close, volume)
+        return state
+
+    @property
+    def last_date(self):
+        """最新K线日期"""
+        return self._pending_date
+
+    @property
+    def bar_count(self) -> int:
+        """已处理的K线数量（含最新K线）"""
+        return self._committed.count + (self._pending is not None)
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """判断df能否通过增量更新同步到本状态（最新K线为同一天或下一天，且历史未被修正）"""
+        if self._pending is None or df is None or len(df) < 2:
+            return False
+        last_date = df["date"].iloc[-1]
+        if last_date == self._pending_date:
+            prev_close = float(df["close"].iloc[-2])
+            return len(df) == self.bar_count and prev_close == self._committed.prev_close
+        if df["date"].iloc[-2] == self._pending_date:
+            prev_close = float(df["close"].iloc[-2])
+            return len(df) == self.bar_count + 1 and prev_close == self._pending_close
+        return False
+
+    def update(self, bar) -> Optional[dict]:
+        """
+        推入最新K线（dict或Series，需包含date/high/low/close/volume）
+
+        日期与当前最新K线相同视为修正，否则视为新K线。返回最新指标，不足30根K线时返回None。
+        """
+        date = bar["date"]
+        if self._pending_date is not None and date < self._pending_date:
+            raise ValueError(f"K线日期 {date} 早于当前最新日期 {self._pending_date}")
+        self._push(
+            date, float(bar["high"]), float(bar["low"]), float(bar["close"]), float(bar["volume"])
+        )
+        return self.snapshot()
+
+    def snapshot(self) -> Optional[dict]:
+        """返回最新指标（结构与 calculate_all_indicators 相同）"""
+        if self.bar_count < 30 or self._result is None:
+            return None
+        return {
+            key: dict(value) if isinstance(value, dict) else value
+            for key, value in self._result.items()
+        }
+
+    def _push(self, date, high, low, close, volume):
+        if self._pending is not None and date != self._pending_date:
+            # 新的一天：上一根K线定稿
+            self._committed = self._pending
+        self._pending = self._committed.copy()
+        self._pending_date = date
+        self._pending_close = close
+        self._result = self._pending.push(high, low, close, volume)
@@ -1,75 +1,295 @@
 # 行业板块服务
+import threading
+import time
 import akshare as ak
-from typing import List, Dict, Optional
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import List, Dict, NamedTuple, Optional, Tuple
+from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
+from sqlalchemy import func
 
-from app.database import get_db, Stock, Industry
+from app.config import config
+from app.database import SessionLocal, Stock, Industry
+from app.services.data_service import data_service
+
+
+# 行情快照列 -> 返回字段（数值列，缺失值按0返回）
+QUOTE_COLUMNS = {
+    "最新价": "price",
+    "涨跌幅": "change",
+    "涨跌额": "change_amount",
+    "成交量": "volume",
+    "成交额": "amount",
+    "换手率": "turnover",
+    "最高": "high",
+    "最低": "low",
+    "今开": "open",
+    "昨收": "pre_close",
+}
+
+
+class _IndustryIndex(NamedTuple):
+    """行业映射及其派生索引，整体替换，读取方不会看到不一致的组合"""
+    code_to_industry: Dict[str, str]  # 股票代码->行业名称映射
+    stocks_by_industry: Dict[str, Tuple[str, ...]]  # 行业名称->排序后的股票代码
+    industries: List[str]  # 排序后的行业列表
 
 
 class IndustryService:
     """行业板块数据服务"""
 
     def __init__(self):
-        self._industry_map: Dict[str, str] = {}  # 股票代码->行业名称映射
+        self._index = _IndustryIndex({}, {}, [])
         self._last_update: Optional[datetime] = None
+        self._last_attempt: Optional[datetime] = None  # 最近一次发起刷新的时间
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._db_checked = False  # 是否已尝试从数据库加载
+
+    @property
+    def _industry_map(self) -> Dict[str, str]:
+        """股票代码->行业名称映射"""
+        return self._index.code_to_industry
+
+    @_industry_map.setter
+    def _industry_map(self, industry_map: Dict[str, str]):
+        self._set_industry_map(industry_map)
+
+    def _set_industry_map(self, industry_map: Dict[str, str]):
+        """替换映射：先构建行业->股票的反向索引和行业列表，再一次性发布"""
+        stocks_by_industry: Dict[str, List[str]] = {}
+        for code, industry in industry_map.items():
+            stocks_by_industry.setdefault(industry, []).append(code)
+
+        self._index = _IndustryIndex(
+            industry_map,
+            {industry: tuple(sorted(codes)) for industry, codes in stocks_by_industry.items()},
+            sorted(stocks_by_industry),
+        )
+
+    def _fetch_board_stocks(self, industry_name: str) -> Optional[List[Tuple[str, str]]]:
+        """获取单个行业板块的成分股（代码, 名称），失败时重试，全部失败返回None"""
+        retries = config.INDUSTRY_FETCH_RETRIES
+        for attempt in range(1, retries + 1):
+            try:
+                stocks_df = ak.stock_board_industry_cons_em(symbol=industry_name)
+                codes = stocks_df["代码"].tolist()
+                if "名称" in stocks_df.columns:
+                    return list(zip(codes, stocks_df["名称"].tolist()))
+                return [(code, "") for code in codes]
+            except Exception as e:
+                if attempt == retries:
+                    print(f"获取行业 {industry_name} 股票列表失败: {e}")
+                    return None
+                time.sleep(config.INDUSTRY_RETRY_DELAY * attempt)
 
     def _refresh_industry_map(self):
-        """刷新行业映射缓存"""
+        """刷新行业映射缓存（各板块成分股并发获取）"""
         try:
             # 使用akshare获取行业板块数据
             # 获取东方财富行业板块
             df = ak.stock_board_industry_name_em()
+            industry_names = df["板块名称"].tolist()
+
+            with ThreadPoolExecutor(
+                max_workers=config.INDUSTRY_REFRESH_CONCURRENCY,
+                thread_name_prefix="industry",
+            ) as executor:
+                board_stocks = list(executor.map(self._fetch_board_stocks, industry_names))
 
+            # 失败的行业过多时保留现有映射，不写入数据库，也不标记为已更新
+            failed_count = sum(stocks is None for stocks in board_stocks)
+            max_failed = len(industry_names) * config.INDUSTRY_MAX_FAILED_RATIO
+            if not industry_names or failed_count > max_failed:
+                print(
+                    f"刷新行业映射失败: {failed_count}/{len(industry_names)} 个行业获取失败，"
+                    f"保留现有映射"
+                )
+                return
+
+            # 按板块顺序合并，与逐个获取时的覆盖顺序一致；获取失败的行业沿用现有映射中的成分股
+            previous = self._index.stocks_by_industry
             industry_map = {}
-            for _, row in df.iterrows():
-                industry_name = row["板块名称"]
-                try:
-                    # 获取该行业下的所有股票
-                    stocks_df = ak.stock_board_industry_cons_em(symbol=industry_name)
-                    for _, stock_row in stocks_df.iterrows():
-                        code = stock_row["代码"]
-                        industry_map[code] = industry_name
-                except Exception as e:
-                    print(f"获取行业 {industry_name} 股票列表失败: {e}")
-                    continue
+            stock_names = {}
+            for industry_name, stocks in zip(industry_names, board_stocks):
+                if stocks is None:
+                    stocks = [(code, "") for code in previous.get(industry_name, ())]
+                for code, name in stocks:
+                    industry_map[code] = industry_name
+                    stock_names[code] = name
 
-            self._industry_map = industry_map
+            self._set_industry_map(industry_map)
             self._last_update = datetime.now()
-            print(f"行业映射刷新完成，共 {len(industry_map)} 只股票")
+            print(
+                f"行业映射刷新完成，共 {len(industry_map)} 只股票，"
+                f"{failed_count} 个行业获取失败（沿用现有成分股）"
+            )
+
+            board_codes = {}
+            if "板块代码" in df.columns:
+                board_codes = dict(zip(industry_names, df["板块代码"].tolist()))
+            self._save_to_db(industry_map, stock_names, board_codes)
 
         except Exception as e:
             print(f"刷新行业映射失败: {e}")
 
+    def _save_to_db(
+        self,
+        industry_map: Dict[str, str],
+        stock_names: Dict[str, str] = None,
+        board_codes: Dict[str, str] = None,
+    ):
+        """将行业映射批量写入stocks表的industry字段和industries表"""
+        stock_names = stock_names or {}
+        board_codes = board_codes or {}
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            existing = {
+                code: (stock_id, industry)
+                for stock_id, code, industry in db.query(Stock.id, Stock.code, Stock.industry)
+            }
+
+            # 已有股票更新行业（不再属于任何行业的清空），新股票以非监控状态插入
+            updates = [
+                {"id": stock_id, "industry": industry_map.get(code)}
+                for code, (stock_id, industry) in existing.items()
+                if industry != industry_map.get(code)
+            ]
+            inserts = [
+                {
+                    "code": code,
+                    "name": stock_names.get(code, ""),
+                    "industry": industry,
+                    "watched": False,
+                    "created_at": now,
+                }
+                for code, industry in industry_map.items()
+                if code not in existing
+            ]
+            db.bulk_update_mappings(Stock, updates)
+            db.bulk_insert_mappings(Stock, inserts)
+
+            # 行业表整体替换
+            db.query(Industry).delete()
+            db.bulk_insert_mappings(
+                Industry,
+                [
+                    {
+                        "name": name,
+                        "code": board_codes.get(name),
+                        "stock_count": count,
+                        "updated_at": now,
+                    }
+                    for name, count in Counter(industry_map.values()).items()
+                ],
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"保存行业映射失败: {e}")
+        finally:
+            db.close()
+
+    def load_from_db(self) -> bool:
+        """
+        从数据库加载行业映射
+
+        映射时间取industries表的更新时间，超过24小时的映射仍会加载，
+        并由 _ensure_fresh 在后台刷新。没有持久化数据时返回False。
+        """
+        db = SessionLocal()
+        try:
+            updated_at = db.query(func.max(Industry.updated_at)).scalar()
+            rows = db.query(Stock.code, Stock.industry).filter(Stock.industry.isnot(None)).all()
+        except Exception as e:
+            print(f"从数据库加载行业映射失败: {e}")
+            return False
+        finally:
+            db.close()
+
+        if updated_at is None or not rows:
+            return False
+
+        self._set_industry_map(dict(rows))
+        self._last_update = updated_at
+        print(f"从数据库加载行业映射，共 {len(rows)} 只股票，更新于 {updated_at}")
+        return True
+
+    def warm_start(self):
+        """启动预热：从数据库加载映射，过期或没有数据时在后台刷新"""
+        self._db_checked = True
+        self.load_from_db()
+        if self._is_stale():
+            self.refresh_in_background()
+
+    def _is_stale(self) -> bool:
+        """映射是否需要刷新（从未加载或超过24小时）"""
+        return self._last_update is None or (datetime.now() - self._last_update).days >= 1
+
+    def refresh_in_background(self) -> Optional[threading.Thread]:
+        """
+        在后台线程刷新行业映射，已有刷新在进行时返回该线程
+
+        刷新失败后 INDUSTRY_RETRY_INTERVAL 秒内不再重复发起，返回None。
+        """
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return self._refresh_thread
+            recently_failed = (
+                self._last_attempt is not None
+                and (self._last_update is None or self._last_update < self._last_attempt)
+                and datetime.now() - self._last_attempt
+                < timedelta(seconds=config.INDUSTRY_RETRY_INTERVAL)
+            )
+            if recently_failed:
+                return None
+
+            self._last_attempt = datetime.now()
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_industry_map, name="industry-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+            return self._refresh_thread
+
+    def _ensure_fresh(self):
+        """映射过期时在后台刷新并继续使用旧映射；冷启动没有任何映射时等待刷新完成"""
+        if not self._index.code_to_industry and not self._db_checked:
+            self._db_checked = True
+            self.load_from_db()
+
+        if not self._is_stale():
+            return
+
+        thread = self.refresh_in_background()
+        if thread is not None and not self._index.code_to_industry:
+            thread.join()
+
     def get_stock_industry(self, code: str) -> Optional[str]:
         """获取股票所属行业"""
-        # 检查缓存是否过期（超过24小时）
-        if self._last_update is None or (datetime.now() - self._last_update).days >= 1:
-            self._refresh_industry_map()
+        self._ensure_fresh()
+
+        return self._index.code_to_industry.get(code)
 
-        return self._industry_map.get(code)
+    def get_cached_stock_industry(self, code: str) -> Optional[str]:
+        """从已加载的映射获取股票所属行业（不触发刷新，可在事件循环中调用）"""
+        return self._index.code_to_industry.get(code)
 
     def get_all_industries(self) -> List[str]:
         """获取所有行业列表"""
-        if self._last_update is None or (datetime.now() - self._last_update).days >= 1:
-            self._refresh_industry_map()
+        self._ensure_fresh()
 
-        # 返回唯一行业列表并排序
-        industries = list(set(self._industry_map.values()))
-        return sorted(industries)
+        # 返回排序后的行业列表（映射刷新时已构建）
+        return list(self._index.industries)
 
     def get_industry_stocks(self, industry_name: str) -> List[str]:
         """获取行业内的所有股票代码"""
-        if self._last_update is None or (datetime.now() - self._last_update).days >= 1:
-            self._refresh_industry_map()
+        self._ensure_fresh()
 
-        # 筛选该行业下的所有股票
-        stocks = [
-            code
-            for code, industry in self._industry_map.items()
-            if industry == industry_name
-        ]
-        return stocks
+        # 从反向索引获取该行业下的所有股票
+        return list(self._index.stocks_by_industry.get(industry_name, ()))
 
     def get_industry_stocks_with_quote(
         self, industry_name: str, sort_by: str = "change"
@@ -105,11 +325,13 @@ class IndustryService:
                     "update_time": datetime.now().isoformat(),
                 }
 
-            # 获取实时行情数据
-            df = ak.stock_zh_a_spot_em()
+            # 获取实时行情数据（共享全市场快照）
+            df = data_service.get_spot_snapshot()
+            if df is None:
+                raise Exception("获取实时行情失败")
 
-            # 筛选该行业股票
-            industry_df = df[df["代码"].isin(stock_codes)].copy()
+            # 按代码索引筛选该行业股票
+            industry_df = df.reindex(stock_codes).dropna(subset=["代码"])
 
             if industry_df.empty:
                 return {
@@ -126,46 +348,16 @@ class IndustryService:
 
             sort_field = field_map.get(sort_by, "涨跌幅")
 
-            # 按指定字段排序
-            industry_df = industry_df.sort_values(by=sort_field, ascending=False)
-
-            # 转换为列表
-            def row_to_dict(row):
-                return {
-                    "code": row["代码"],
-                    "name": row["名称"],
-                    "price": float(row["最新价"]) if pd.notna(row["最新价"]) else 0,
-                    "change": float(row["涨跌幅"]) if pd.notna(row["涨跌幅"]) else 0,
-                    "change_amount": float(row["涨跌额"])
-                    if pd.notna(row["涨跌额"])
-                    else 0,
-                    "volume": float(row["成交量"]) if pd.notna(row["成交量"]) else 0,
-                    "amount": float(row["成交额"]) if pd.notna(row["成交额"]) else 0,
-                    "turnover": float(row["换手率"]) if pd.notna(row["换手率"]) else 0,
-                    "high": float(row["最高"]) if pd.notna(row["最高"]) else 0,
-                    "low": float(row["最低"]) if pd.notna(row["最低"]) else 0,
-                    "open": float(row["今开"]) if pd.notna(row["今开"]) else 0,
-                    "pre_close": float(row["昨收"]) if pd.notna(row["昨收"]) else 0,
-                }
-
-            # 获取前10和后10
-            all_stocks = [row_to_dict(row) for _, row in industry_df.iterrows()]
-
-            if len(all_stocks) <= 20:
-                # 如果总数<=20，则分成两半
-                mid = len(all_stocks) // 2
-                top_gainers = all_stocks[:mid] if mid > 0 else []
-                top_losers = all_stocks[mid:] if len(all_stocks) > mid else []
-            else:
-                top_gainers = all_stocks[:10]
-                top_losers = all_stocks[-10:]
+            # 只选出前10和后10（降序，缺失值排在最后），不对整个行业排序
+            values = industry_df[sort_field].to_numpy(dtype=float)
+            top, bottom = self._rank_positions(values, 10)
 
             return {
                 "industry": industry_name,
                 "sort_by": sort_by,
-                "top_gainers": top_gainers,
-                "top_losers": top_losers,
-                "total_count": len(all_stocks),
+                "top_gainers": self._quote_records(industry_df, top),
+                "top_losers": self._quote_records(industry_df, bottom),
+                "total_count": len(industry_df),
                 "update_time": datetime.now().isoformat(),
             }
 
@@ -181,6 +373,47 @@ class IndustryService:
                 "error": str(e),
             }
 
+    @staticmethod
+    def _rank_positions(values: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按降序（缺失值排在最后）选出前count名和后count名的位置
+
+        结果与完整降序排序后取头尾一致：总数不超过2*count时前一半为前列、
+        后一半为后列。使用argpartition，耗时与行业规模近似线性且只排序选出的行。
+        """
+        n = len(values)
+        if n <= 2 * count:
+            order = np.argsort(-values, kind="stable")  # NaN排在最后
+            mid = n // 2
+            return order[:mid], order[mid:]
+
+        valid = np.flatnonzero(~np.isnan(values))
+        missing = np.flatnonzero(np.isnan(values))
+
+        # 前列：最大的count个有效值
+        k = min(count, len(valid))
+        top = valid[np.argpartition(-values[valid], k - 1)[:k]] if k else valid[:0]
+        top = top[np.argsort(-values[top], kind="stable")]
+        if k < count:
+            top = np.concatenate([top, missing[:count - k]])
+
+        # 后列：降序排序的最后count个，即最小的有效值（降序）加上全部缺失值
+        if len(missing) >= count:
+            return top, missing[-count:]
+        k = count - len(missing)
+        bottom = valid[np.argpartition(values[valid], k - 1)[:k]]
+        bottom = bottom[np.argsort(-values[bottom], kind="stable")]
+        return top, np.concatenate([bottom, missing])
+
+    @staticmethod
+    def _quote_records(df: pd.DataFrame, positions: np.ndarray) -> List[Dict]:
+        """将选中的行批量转换为返回格式（数值列缺失按0）"""
+        rows = df.iloc[positions]
+        records = rows[list(QUOTE_COLUMNS)].astype(float).fillna(0).rename(columns=QUOTE_COLUMNS)
+        records.insert(0, "name", rows["名称"].to_numpy())
+        records.insert(0, "code", rows["代码"].to_numpy())
+        return records.to_dict("records")
+
 
 # 创建单例
 industry_service = IndustryService()
@@ -1,9 +1,17 @@
 # 监控引擎服务
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from typing import Dict, List, Callable
+from app.config import config
+from app.services.bar_store import bar_store
 from app.services.data_service import data_service
 from app.services.indicator_service import indicator_service
-from app.database import SessionLocal, IndicatorHistory, SignalAlert
+from app.services.indicator_state import IndicatorState
+from app.services.write_buffer import write_buffer
+from sqlalchemy import select
+from app.database import SessionLocal, AsyncSessionLocal, Stock, IndicatorHistory, SignalAlert
 
 class MonitorService:
     def __init__(self):
@@ -11,29 +19,122 @@ class MonitorService:
         self.stock_name = "中金黄金"
         self.is_running = False
         self.callbacks: List[Callable] = []
-        self.last_signal = None  # 避免重复提示
+        self.last_signals: Dict[str, str] = {}  # 股票代码->上次提醒信号，避免重复提示
+        self.latest_results: Dict[str, dict] = {}  # 股票代码->最近一次检查结果
+        self.last_sweep: dict = None  # 最近一次全量扫描统计
+        self._states: Dict[str, IndicatorState] = {}  # 股票代码->增量指标状态
+        self._state_locks: Dict[str, threading.Lock] = {}  # 股票代码->状态锁（/current与全量扫描可能同时更新同一股票）
+        self._state_locks_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.MONITOR_WORKERS, thread_name_prefix="monitor"
+        )
     
     def set_stock(self, code: str, name: str = ""):
-        """设置监控股票"""
+        """设置当前关注股票（监控列表中的其他股票不受影响）"""
         self.current_stock = code
         self.stock_name = name
-        self.last_signal = None
+        self.last_signals.pop(code, None)
         print(f"切换监控股票: {code} {name}")
     
     def register_callback(self, callback: Callable):
         """注册信号回调函数"""
         self.callbacks.append(callback)
     
-    def check_signals(self) -> dict:
-        """检查指标信号"""
+    def load_watchlist(self) -> Dict[str, str]:
+        """从stocks表加载监控列表（始终包含当前股票）"""
+        watchlist = {self.current_stock: self.stock_name}
         try:
-            # 获取数据
-            df = data_service.get_stock_data(self.current_stock)
+            db = SessionLocal()
+            for code, name in db.query(Stock.code, Stock.name).filter(Stock.watched == True).all():
+                watchlist.setdefault(code, name or "")
+            db.close()
+        except Exception as e:
+            print(f"加载监控列表失败: {e}")
+        return watchlist
+    
+    def check_signals(self, code: str = None, name: str = None) -> dict:
+        """检查指标信号（默认检查当前股票）"""
+        if code is None:
+            code, name = self.current_stock, self.stock_name
+        
+        result = self._evaluate(code, name or "")
+        if result is not None:
+            self._dispatch_alert(result)
+        return result
+    
+    def check_watchlist(self) -> List[dict]:
+        """检查监控列表中所有股票的信号，返回各股票的检查结果"""
+        start = time.perf_counter()
+        watchlist = self.load_watchlist()
+        
+        # 本轮扫描共用一份全市场行情快照
+        data_service.get_spot_snapshot()
+        
+        # 数据获取和指标计算并发执行，提醒在调用线程中统一触发
+        results = list(self._executor.map(
+            lambda item: self._evaluate(*item), watchlist.items()
+        ))
+        results = [result for result in results if result is not None]
+        for result in results:
+            self._dispatch_alert(result)
+        
+        elapsed = time.perf_counter() - start
+        self.last_sweep = {
+            'timestamp': datetime.now().isoformat(),
+            'stock_count': len(watchlist),
+            'success_count': len(results),
+            'elapsed': round(elapsed, 3),
+        }
+        if elapsed > config.MONITOR_INTERVAL:
+            print(f"监控扫描耗时 {elapsed:.1f} 秒，超过监控间隔 {config.MONITOR_INTERVAL} 秒")
+        return results
+    
+    def scan_market(self, days: int = 120, min_buy_signals: int = 1, limit: int = 100) -> dict:
+        """
+        用本地日线横截面扫描所有股票最近一个交易日的信号
+        
+        每只股票取最近days个交易日的K线，按股票堆叠成矩阵后一次计算全部指标，
+        返回买入信号数不少于min_buy_signals的股票，按买入信号数降序。
+        只扫描最后一根K线为最新交易日（结果中的date）的股票，
+        停牌或本地日线未同步到该日的股票计入stale，不参与排序。
+        """
+        start_time = time.time()
+        # 交易日约为自然日的2/3，另加长假余量
+        calendar_days = days * 3 // 2 + 20
+        bars = bar_store.load_all((datetime.now() - timedelta(days=calendar_days)).date())
+        if bars.empty:
+            return {'date': None, 'scanned': 0, 'stale': 0, 'count': 0, 'stocks': [], 'elapsed_ms': 0}
+        
+        codes, matrices = indicator_service.stack_bars(bars, days)
+        table = indicator_service.calculate_batch_signals(
+            codes, matrices['close'], matrices['high'], matrices['low'], matrices['volume']
+        )
+        matched = table[table['buy_count'] >= min_buy_signals].sort_values(
+            ['buy_count', 'sell_count'], ascending=[False, True], kind='stable'
+        )
+        stocks = matched.head(limit)
+        stocks = stocks.astype(object).where(stocks.notna(), None)
+        
+        return {
+            'date': bars['date'].max().date().isoformat(),
+            'scanned': len(table),
+            'stale': bars['stock_code'].nunique() - len(codes),
+            'count': len(matched),
+            'stocks': stocks.reset_index().to_dict('records'),
+            'elapsed_ms': round((time.time() - start_time) * 1000, 1),
+        }
+    
+    def _evaluate(self, code: str, name: str) -> dict:
+        """获取数据并计算单只股票的信号（不触发提醒）"""
+        try:
+            # 获取数据（历史K线使用较长缓存，当日K线由实时行情快照更新）
+            df = data_service.get_stock_data(code, max_age=config.MONITOR_HISTORY_TTL)
+            df = data_service.merge_spot_bar(df, code)
             if df is None:
                 return None
             
-            # 计算指标
-            indicators = indicator_service.calculate_all_indicators(df)
+            # 计算指标（增量更新）
+            indicators = self._update_indicators(code, df)
             if indicators is None:
                 return None
             
@@ -89,8 +190,8 @@ class MonitorService:
                 signal_count = sell_count
             
             result = {
-                'stock_code': self.current_stock,
-                'stock_name': self.stock_name,
+                'stock_code': code,
+                'stock_name': name,
                 'timestamp': datetime.now().isoformat(),
                 'price': indicators['current_price'],
                 'change_pct': indicators['change_pct'],
@@ -104,55 +205,71 @@ class MonitorService:
             # 保存到数据库
             self._save_to_db(result)
             
-            # 触发信号提醒
-            if final_signal in ["BUY", "SELL"] and final_signal != self.last_signal:
-                self._trigger_alert(result)
-                self.last_signal = final_signal
-            
+            self.latest_results[code] = result
             return result
             
         except Exception as e:
-            print(f"检查信号失败: {e}")
+            print(f"检查信号失败 {code}: {e}")
             return None
     
+    def _dispatch_alert(self, result: dict):
+        """按股票去重后触发信号提醒"""
+        code = result['stock_code']
+        final_signal = result['final_signal']
+        if final_signal in ["BUY", "SELL"] and final_signal != self.last_signals.get(code):
+            self._trigger_alert(result)
+            self.last_signals[code] = final_signal
+    
+    def _update_indicators(self, code: str, df) -> dict:
+        """增量更新指标状态，数据无法增量同步时（换日、复权调整等）用完整数据重建"""
+        with self._state_lock(code):
+            state = self._states.get(code)
+            if state is not None and state.matches(df):
+                return state.update(df.iloc[-1])
+            
+            state = IndicatorState.from_dataframe(df)
+            self._states[code] = state
+            return state.snapshot()
+    
+    def _state_lock(self, code: str) -> threading.Lock:
+        with self._state_locks_lock:
+            lock = self._state_locks.get(code)
+            if lock is None:
+                lock = self._state_locks[code] = threading.Lock()
+            return lock
+    
     def _save_to_db(self, result: dict):
-        """保存到数据库"""
+        """保存到数据库（缓冲写入，由 write_buffer.flush_async 每轮批量提交）"""
         try:
-            db = SessionLocal()
-            history = IndicatorHistory(
-                stock_code=result['stock_code'],
-                macd_signal=result['indicators']['macd']['signal'],
-                kdj_signal=result['indicators']['kdj']['signal'],
-                rsi_value=result['indicators']['rsi']['value'],
-                rsi_signal=result['indicators']['rsi']['signal'],
-                ma_signal=result['indicators']['ma']['signal'],
-                volume_signal=result['indicators']['volume']['signal'],
-                boll_signal=result['indicators']['boll']['signal'],
-                buy_signals=result['buy_signals'],
-                sell_signals=result['sell_signals'],
-                final_signal=result['final_signal']
-            )
-            db.add(history)
-            db.commit()
-            db.close()
+            write_buffer.add(IndicatorHistory, {
+                'stock_code': result['stock_code'],
+                'timestamp': datetime.now(),
+                'macd_signal': result['indicators']['macd']['signal'],
+                'kdj_signal': result['indicators']['kdj']['signal'],
+                'rsi_value': result['indicators']['rsi']['value'],
+                'rsi_signal': result['indicators']['rsi']['signal'],
+                'ma_signal': result['indicators']['ma']['signal'],
+                'volume_signal': result['indicators']['volume']['signal'],
+                'boll_signal': result['indicators']['boll']['signal'],
+                'buy_signals': result['buy_signals'],
+                'sell_signals': result['sell_signals'],
+                'final_signal': result['final_signal']
+            })
         except Exception as e:
             print(f"保存历史记录失败: {e}")
     
     def _trigger_alert(self, result: dict):
         """触发信号提醒"""
         try:
-            # 保存提醒记录
-            db = SessionLocal()
-            alert = SignalAlert(
-                stock_code=result['stock_code'],
-                signal_type=result['final_signal'],
-                signal_count=result['signal_count'],
-                price=result['price'],
-                details=f"{result['buy_signals']}个买入信号, {result['sell_signals']}个卖出信号"
-            )
-            db.add(alert)
-            db.commit()
-            db.close()
+            # 保存提醒记录（缓冲写入）
+            write_buffer.add(SignalAlert, {
+                'stock_code': result['stock_code'],
+                'timestamp': datetime.now(),
+                'signal_type': result['final_signal'],
+                'signal_count': result['signal_count'],
+                'price': result['price'],
+                'details': f"{result['buy_signals']}个买入信号, {result['sell_signals']}个卖出信号"
+            })
             
             # 调用回调函数
             for callback in self.callbacks:
@@ -164,27 +281,24 @@ class MonitorService:
         except Exception as e:
             print(f"触发提醒失败: {e}")
     
-    def get_recent_alerts(self, limit: int = 20) -> list:
-        """获取最近的信号提醒"""
+    async def get_recent_alerts(self, limit: int = 20, code: str = None) -> list:
+        """获取最近的信号提醒（默认当前股票，异步查询）"""
         try:
-            db = SessionLocal()
-            alerts = db.query(SignalAlert).filter(
-                SignalAlert.stock_code == self.current_stock
-            ).order_by(SignalAlert.timestamp.desc()).limit(limit).all()
-            
-            result = []
-            for alert in alerts:
-                result.append({
-                    'id': alert.id,
-                    'signal_type': alert.signal_type,
-                    'signal_count': alert.signal_count,
-                    'price': alert.price,
-                    'timestamp': alert.timestamp.isoformat(),
-                    'details': alert.details
-                })
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(
+                        SignalAlert.id, SignalAlert.signal_type, SignalAlert.signal_count,
+                        SignalAlert.price, SignalAlert.timestamp, SignalAlert.details
+                    ).where(
+                        SignalAlert.stock_code == (code or self.current_stock)
+                    ).order_by(SignalAlert.timestamp.desc()).limit(limit)
+                )
+                alerts = result.all()
             
-            db.close()
-            return result
+            return [
+                {**alert._asdict(), 'timestamp': alert.timestamp.isoformat()}
+                for alert in alerts
+            ]
         except Exception as e:
             print(f"获取提醒历史失败: {e}")
             return []
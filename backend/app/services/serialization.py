@@ -0,0 +1,53 @@
+# 序列化工具
+# orjson和msgpack为可选依赖：未安装时JSON回退到标准库，WebSocket不提供MessagePack
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+# WebSocket子协议名称，客户端在握手时声明即使用MessagePack二进制帧
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+
+def dumps_json(obj: Any) -> str:
+    """序列化为紧凑JSON文本（与 WebSocket.send_json 的输出一致）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_msgpack(obj: Any) -> bytes:
+    """序列化为MessagePack"""
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def loads_msgpack(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False)
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    使用orjson编码的JSON响应（未安装orjson时与JSONResponse相同）
+
+    orjson直接输出UTF-8字节，编码大列表（回测交易明细、行业行情）明显快于标准库；
+    NaN/Infinity输出为null，而标准库会拒绝编码。
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,32 @@
+# 阻塞任务线程池
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from app.config import config
+
+
+class WorkerPool:
+    """
+    有界线程池，用于在事件循环之外执行阻塞任务
+
+    akshare的HTTP请求、pandas指标计算和同步数据库操作都会阻塞线程，
+    异步代码通过 await worker_pool.run(...) 调用，事件循环保持响应。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="blocking"
+        )
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """在线程池中执行func并等待结果"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+
+worker_pool = WorkerPool(config.BLOCKING_WORKERS)
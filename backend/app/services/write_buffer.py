@@ -0,0 +1,110 @@
+# 数据库缓冲写入
+import asyncio
+import threading
+from typing import Callable, Dict, List
+
+from sqlalchemy import insert
+
+from app.config import config
+from app.database import SessionLocal, AsyncSessionLocal
+
+
+class WriteBuffer:
+    """
+    批量写入缓冲区
+
+    监控每轮扫描为每只股票写一条指标历史，逐条提交会在每条记录上触发一次fsync。
+    记录先缓存在内存中，在一个事务内批量插入：监控每轮扫描结束时由事件循环调用
+    flush_async（异步引擎，不占用线程池），缓存行数达到 max_rows 时在写入线程中立即 flush。
+    两种写入共用 _flush_lock，取出批次和提交都在锁内完成，批次按取出的顺序写入。
+    """
+
+    def __init__(
+        self,
+        max_rows: int = 500,
+        session_factory: Callable = SessionLocal,
+        async_session_factory: Callable = AsyncSessionLocal,
+    ):
+        self.max_rows = max_rows
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self._pending: Dict[type, List[dict]] = {}  # 模型类 -> 待写入的行
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # 保证批次按顺序写入
+
+    def add(self, model: type, row: dict):
+        """缓存一行待写入的记录"""
+        with self._lock:
+            self._pending.setdefault(model, []).append(row)
+            self._pending_count += 1
+            full = self._pending_count >= self.max_rows
+        if full:
+            self.flush()
+
+    def pending_count(self) -> int:
+        """尚未写入的行数"""
+        return self._pending_count
+
+    def _take(self):
+        """取出所有缓存的记录"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            count, self._pending_count = self._pending_count, 0
+        return pending, count
+
+    def flush(self) -> int:
+        """在一个事务中写入所有缓存的记录，返回写入的行数"""
+        with self._flush_lock:
+            pending, count = self._take()
+            if not count:
+                return 0
+
+            db = self.session_factory()
+            try:
+                for model, rows in pending.items():
+                    db.bulk_insert_mappings(model, rows)
+                db.commit()
+                return count
+            except Exception as e:
+                db.rollback()
+                print(f"批量写入数据库失败（{count}条记录）: {e}")
+                return 0
+            finally:
+                db.close()
+
+    async def flush_async(self) -> int:
+        """flush 的异步版本，在事件循环中通过异步引擎写入"""
+        await self._acquire_flush_lock()
+        try:
+            pending, count = self._take()
+            if not count:
+                return 0
+
+            async with self.async_session_factory() as db:
+                try:
+                    for model, rows in pending.items():
+                        await db.execute(insert(model), rows)
+                    await db.commit()
+                    return count
+                except Exception as e:
+                    await db.rollback()
+                    print(f"批量写入数据库失败（{count}条记录）: {e}")
+                    return 0
+        finally:
+            self._flush_lock.release()
+
+    async def _acquire_flush_lock(self):
+        """获取写入锁，锁被写入线程占用时在线程池中等待，不阻塞事件循环"""
+        if self._flush_lock.acquire(blocking=False):
+            return
+        waiter = asyncio.get_running_loop().run_in_executor(None, self._flush_lock.acquire)
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # 等待被取消时线程仍会拿到锁，拿到后立即释放
+            waiter.add_done_callback(lambda _: self._flush_lock.release())
+            raise
+
+
+write_buffer = WriteBuffer(config.DB_WRITE_BATCH_SIZE)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+指标历史写入基准：逐条提交 vs 缓冲批量写入（WAL）
+
+模拟监控扫描：每轮为每只股票写一条IndicatorHistory，使用临时数据库文件。
+用法（在backend目录下）：python benchmarks/bench_db_writes.py [股票数] [轮数]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, IndicatorHistory, set_sqlite_pragmas
+from app.services.write_buffer import WriteBuffer
+
+
+def make_row(code: str) -> dict:
+    return {
+        'stock_code': code,
+        'timestamp': datetime.now(),
+        'macd_signal': '中性',
+        'kdj_signal': '中性',
+        'rsi_value': 55.0,
+        'rsi_signal': '中性',
+        'ma_signal': '金叉',
+        'volume_signal': '中性',
+        'boll_signal': '中轨',
+        'buy_signals': 1,
+        'sell_signals': 0,
+        'final_signal': 'HOLD',
+    }
+
+
+def make_session_factory(path: str, wal: bool):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if wal:
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def bench_per_row(path: str, codes: list, ticks: int) -> float:
+    """改造前：每条记录一个会话、一次提交（默认journal模式）"""
+    engine, Session = make_session_factory(path, wal=False)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for code in codes:
+            db = Session()
+            db.add(IndicatorHistory(**make_row(code)))
+            db.commit()
+            db.close()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+def bench_buffered(path: str, codes: list, ticks: int) -> float:
+    """改造后：WAL + 每轮扫描一次批量提交"""
+    engine, Session = make_session_factory(path, wal=True)
+    buffer = WriteBuffer(max_rows=500, session_factory=Session)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for code in codes:
+            buffer.add(IndicatorHistory, make_row(code))
+        buffer.flush()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+def main():
+    stock_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    codes = [f"{600000 + i}" for i in range(stock_count)]
+    rows = stock_count * ticks
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = bench_per_row(os.path.join(tmp, "per_row.db"), codes, ticks)
+        after = bench_buffered(os.path.join(tmp, "buffered.db"), codes, ticks)
+
+    print(f"{stock_count}只股票 x {ticks}轮 = {rows}条记录")
+    print(f"逐条提交:     {before:8.3f} 秒  {rows / before:10.0f} 行/秒")
+    print(f"缓冲批量写入: {after:8.3f} 秒  {rows / after:10.0f} 行/秒")
+    print(f"提升: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+指标计算后端基准：pandas vs NumPy vs numba，以及全市场横截面批量计算
+
+对模拟的多只股票日线计算全部指标序列（calculate_indicator_series），对比每只股票的耗时；
+再用 calculate_batch_signals 对 5000只股票×120个交易日 的矩阵一次计算最近交易日的信号。
+numba首次调用需要编译，计时前先预热。用法（在backend目录下）：python benchmarks/bench_indicators.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.indicator_kernels import BACKENDS, numba_available
+from app.services.indicator_service import indicator_service
+
+
+def make_history(seed: int, n: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.025, n)))
+    return pd.DataFrame({
+        'date': pd.bdate_range("2025-01-02", periods=n),
+        'close': close,
+        'high': close * (1 + rng.uniform(0, 0.02, n)),
+        'low': close * (1 - rng.uniform(0, 0.02, n)),
+        'volume': rng.lognormal(12, 0.5, n).round(),
+    })
+
+
+def main(stocks: int = 500):
+    frames = [make_history(seed) for seed in range(stocks)]
+    if not numba_available():
+        print("未安装numba，numba后端使用NumPy实现")
+
+    print(f"{'后端':<10}{'总耗时(秒)':>12}{'每只股票(毫秒)':>16}")
+    for backend in BACKENDS:
+        indicator_service.calculate_indicator_series(frames[0], backend)  # 预热/编译
+        start = time.perf_counter()
+        for df in frames:
+            indicator_service.calculate_indicator_series(df, backend)
+        elapsed = time.perf_counter() - start
+        print(f"{backend:<10}{elapsed:>12.3f}{elapsed / stocks * 1000:>16.3f}")
+
+
+def bench_batch(stocks: int = 5000, days: int = 120):
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.025, (stocks, days)), axis=1))
+    high = close * (1 + rng.uniform(0, 0.02, (stocks, days)))
+    low = close * (1 - rng.uniform(0, 0.02, (stocks, days)))
+    volume = rng.lognormal(12, 0.5, (stocks, days)).round()
+    codes = [f"{i:06d}" for i in range(stocks)]
+
+    start = time.perf_counter()
+    table = indicator_service.calculate_batch_signals(codes, close, high, low, volume)
+    elapsed = time.perf_counter() - start
+    print(f"\n横截面批量计算（{stocks}只股票×{days}个交易日）: {elapsed:.3f}秒，"
+          f"{int((table['buy_count'] > 0).sum())}只股票有买入信号")
+
+
+if __name__ == "__main__":
+    main()
+    bench_batch()
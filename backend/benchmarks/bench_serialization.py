@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+序列化基准：标准库JSON vs orjson vs MessagePack
+
+负载为回测结果（使用模拟日线运行向量化回测，交易明细较多）和行业行情列表，
+对比编码耗时和输出字节数。用法（在backend目录下）：python benchmarks/bench_serialization.py
+"""
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+
+from app.services.backtest_service import backtest_service
+from app.services.serialization import FastJSONResponse, dumps_msgpack, orjson
+
+
+def make_history(n: int = 1500) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.025, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    volume = rng.lognormal(12, 0.5, n).round()
+    return pd.DataFrame({
+        'date': pd.bdate_range("2019-01-02", periods=n),
+        'open': open_,
+        'close': close,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, n)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, n)),
+        'volume': volume,
+        'amount': volume * close,
+    })
+
+
+def backtest_payload() -> dict:
+    history = make_history()
+    backtest_service.data_service.get_stock_data = lambda code, days=100, **kwargs: history
+    return backtest_service.run_backtest(
+        stock_code="600489",
+        indicators=["macd", "kdj", "rsi", "ma", "volume", "boll"],
+        hold_days=5,
+        days_history=1095,
+        min_buy_signals=1,
+    )
+
+
+def industry_payload(n: int = 500) -> dict:
+    rng = np.random.default_rng(11)
+    stocks = [
+        {
+            'code': f"{600000 + i}",
+            'name': f"示例股份{i}",
+            'price': round(float(rng.uniform(3, 200)), 2),
+            'change': round(float(rng.normal(0, 2)), 2),
+            'change_amount': round(float(rng.normal(0, 0.5)), 2),
+            'volume': float(rng.integers(10000, 5000000)),
+            'amount': float(rng.uniform(1e6, 5e9)),
+            'turnover': round(float(rng.uniform(0, 10)), 2),
+        }
+        for i in range(n)
+    ]
+    return {'industry': "示例行业", 'stocks': stocks, 'count': n}
+
+
+def bench(name: str, payload: dict, number: int = 200):
+    encoders = {
+        'json (JSONResponse)': lambda: JSONResponse(payload).body,
+        'json (ws send_json)': lambda: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(),
+    }
+    if orjson is not None:
+        encoders['orjson (FastJSONResponse)'] = lambda: FastJSONResponse(payload).body
+    encoders['msgpack'] = lambda: dumps_msgpack(payload)
+
+    print(f"\n{name}")
+    print(f"{'编码器':<28}{'耗时(微秒/次)':>16}{'字节数':>12}")
+    for label, encode in encoders.items():
+        seconds = min(timeit.repeat(encode, number=number, repeat=5)) / number
+        print(f"{label:<28}{seconds * 1e6:>16.1f}{len(encode()):>12}")
+
+
+def main():
+    trades = backtest_payload()
+    bench(f"回测结果（{len(trades['trades'])}笔交易）", trades)
+    industry = industry_payload()
+    bench(f"行业行情（{industry['count']}只股票）", industry)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 Pytest配置和Fixtures
 """
 
+import numpy as np
+import pandas as pd
 import pytest
 from fastapi.testclient import TestClient
 
@@ -46,3 +48,26 @@ def industry_service():
     }
     service._last_update = None
     return service
+
+
+@pytest.fixture
+def sample_stock_df():
+    """生成可复现的模拟日线数据（随机游走）"""
+    rng = np.random.default_rng(20240101)
+    n = 400
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.025, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, n))
+    volume = rng.lognormal(12, 0.5, n).round()
+    return pd.DataFrame(
+        {
+            "date": pd.bdate_range("2023-01-02", periods=n),
+            "open": open_,
+            "close": close,
+            "high": high,
+            "low": low,
+            "volume": volume,
+            "amount": volume * close,
+        }
+    )
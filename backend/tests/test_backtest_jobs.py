@@ -0,0 +1,139 @@
+"""
+回测任务队列单元测试
+"""
+
+import time
+
+import pandas as pd
+import pytest
+
+from app.services.backtest_jobs import BacktestJobQueue, DONE, FAILED, cache_key, data_version
+from app.services.backtest_service import BacktestService
+from app.services.data_service import DataService
+
+PARAMS = {
+    "stock_code": "600489",
+    "indicators": ["macd", "kdj", "rsi", "ma", "volume", "boll"],
+    "hold_days": 5,
+    "days_history": 365,
+    "min_buy_signals": 1,
+    "mode": "vectorized",
+}
+
+
+@pytest.fixture
+def jobs(sample_stock_df, monkeypatch):
+    """使用模拟数据的任务队列，记录历史数据的获取次数"""
+    service = BacktestService()
+    service.data_service = DataService()
+    service.data_service.fetch_count = 0
+
+    def get_stock_data(code, days=100, **kwargs):
+        service.data_service.fetch_count += 1
+        return sample_stock_df
+
+    monkeypatch.setattr(service.data_service, "get_stock_data", get_stock_data)
+    monkeypatch.setattr(
+        service.data_service, "cached_last_bar",
+        lambda code, days=100: sample_stock_df.iloc[-1],
+    )
+    return BacktestJobQueue(service=service)
+
+
+def wait_for(jobs, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get_job(job_id)
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("回测任务未完成")
+
+
+class TestBacktestJobQueue:
+    """测试回测任务队列"""
+
+    def test_job_result_matches_run_backtest(self, jobs):
+        """测试任务结果与直接运行回测一致"""
+        job = jobs.submit(PARAMS)
+        assert job["job_id"]
+
+        job = wait_for(jobs, job["job_id"])
+        assert job["status"] == DONE
+        assert job["progress"] == 100
+        assert job["cached"] is False
+        assert job["result"] == jobs.service.run_backtest(**PARAMS)
+
+    def test_repeat_submit_is_cached(self, jobs):
+        """测试相同请求命中缓存，提交即完成且不再获取数据"""
+        wait_for(jobs, jobs.submit(PARAMS)["job_id"])
+        fetch_count = jobs.service.data_service.fetch_count
+
+        job = jobs.submit(dict(PARAMS, mode="loop"))
+
+        assert job["status"] == DONE
+        assert job["cached"] is True
+        assert jobs.service.data_service.fetch_count == fetch_count
+
+    def test_run_shares_cache(self, jobs):
+        """测试同步运行与任务共用缓存"""
+        result = jobs.run(PARAMS)
+        job = jobs.submit(PARAMS)
+        assert job["cached"] is True
+        assert job["result"] is result
+
+    def test_insufficient_data_fails(self, jobs, monkeypatch):
+        """测试数据不足时任务失败"""
+        monkeypatch.setattr(jobs.service.data_service, "cached_last_bar", lambda code, days=100: None)
+        monkeypatch.setattr(
+            jobs.service.data_service, "get_stock_data", lambda code, days=100, **kwargs: None
+        )
+        job = wait_for(jobs, jobs.submit(PARAMS)["job_id"])
+        assert job["status"] == FAILED
+        assert job["error"]
+
+    def test_cache_key(self, sample_stock_df):
+        """测试缓存键包含最后一根K线的日期和价格，最少信号数默认值与显式指定等价"""
+        bar = sample_stock_df.iloc[-1]
+        version = data_version(bar)
+        key = cache_key(PARAMS, version)
+
+        assert key == cache_key(dict(PARAMS, mode="loop"), version)
+        next_day = bar.copy()
+        next_day["date"] = pd.Timestamp("2026-10-19")
+        revised = bar.copy()
+        revised["close"] += 0.01
+
+        assert key != cache_key(PARAMS, data_version(next_day))
+        assert key != cache_key(PARAMS, data_version(revised))
+        assert key != cache_key(dict(PARAMS, hold_days=3), version)
+        assert cache_key(dict(PARAMS, min_buy_signals=None), version) == \
+            cache_key(dict(PARAMS, min_buy_signals=6), version)
+
+    def test_intraday_bar_change_recomputes(self, jobs, sample_stock_df, monkeypatch):
+        """测试盘中最新K线变化（日期不变）后不再使用缓存结果"""
+        first = jobs.run(PARAMS)
+
+        revised = sample_stock_df.copy()
+        revised.loc[revised.index[-1], "close"] *= 1.05
+        monkeypatch.setattr(
+            jobs.service.data_service, "get_stock_data", lambda code, days=100, **kwargs: revised
+        )
+        monkeypatch.setattr(
+            jobs.service.data_service, "cached_last_bar", lambda code, days=100: revised.iloc[-1]
+        )
+
+        job = jobs.submit(PARAMS)
+        assert job["cached"] is False
+        job = wait_for(jobs, job["job_id"])
+        assert job["cached"] is False
+        assert job["result"] is not first
+
+    def test_job_endpoints(self, test_client):
+        """测试任务接口的参数校验和不存在的任务"""
+        assert test_client.get("/api/backtest/jobs/unknown").status_code == 404
+
+        response = test_client.post(
+            "/api/backtest/jobs", json=dict(PARAMS, indicators=["unknown"])
+        )
+        assert response.status_code == 400
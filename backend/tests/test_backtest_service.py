@@ -0,0 +1,196 @@
+"""
+回测服务单元测试
+"""
+
+import pytest
+
+import numpy as np
+
+from app.services.backtest_service import BacktestService, performance_metrics
+
+
+@pytest.fixture
+def backtest_service(sample_stock_df, monkeypatch):
+    """使用模拟数据的回测服务"""
+    service = BacktestService()
+    monkeypatch.setattr(
+        service.data_service, "get_stock_data", lambda code, days=100, **kwargs: sample_stock_df
+    )
+    return service
+
+
+class TestBacktestService:
+    """测试回测服务"""
+
+    @pytest.mark.parametrize(
+        "indicators,min_buy_signals,hold_days",
+        [
+            (["macd", "kdj", "rsi", "ma", "volume", "boll"], 1, 5),
+            (["macd", "volume"], 1, 3),
+            (["rsi", "boll"], 1, 10),
+            (["kdj", "ma", "volume"], 2, 5),
+            (["macd", "kdj", "rsi"], None, 5),
+        ],
+    )
+    def test_vectorized_matches_loop(
+        self, backtest_service, indicators, min_buy_signals, hold_days
+    ):
+        """测试向量化回测与逐日回测结果完全一致"""
+        kwargs = dict(
+            stock_code="600489",
+            indicators=indicators,
+            hold_days=hold_days,
+            min_buy_signals=min_buy_signals,
+        )
+        loop_result = backtest_service.run_backtest(mode="loop", **kwargs)
+        vectorized_result = backtest_service.run_backtest(mode="vectorized", **kwargs)
+
+        assert vectorized_result == loop_result
+
+    def test_vectorized_produces_trades(self, backtest_service):
+        """测试模拟数据下能产生交易"""
+        result = backtest_service.run_backtest(
+            "600489", ["macd", "kdj", "rsi", "ma", "volume", "boll"], min_buy_signals=1
+        )
+        assert result["total_signals"] > 0
+        assert len(result["trades"]) == result["total_signals"]
+
+
+class TestBacktestMetrics:
+    """测试资金曲线和绩效指标"""
+
+    def test_metrics_match_daily_loop(self, backtest_service, sample_stock_df):
+        """测试向量化指标与逐日模拟持仓的结果一致"""
+        hold_days = 5
+        result = backtest_service.run_backtest(
+            "600489", ["macd", "kdj", "rsi", "ma", "volume", "boll"],
+            hold_days=hold_days, min_buy_signals=1,
+        )
+        close = sample_stock_df["close"].to_numpy()
+        dates = sample_stock_df["date"].dt.strftime("%Y-%m-%d").tolist()
+        buys = [dates.index(t["buy_date"]) for t in result["trades"]]
+
+        equity, overlaps, daily = [1.0], [], []
+        for t in range(31, len(close)):
+            positions = sum(1 for b in buys if b < t <= b + hold_days)
+            r = close[t] / close[t - 1] - 1 if positions else 0.0
+            equity.append(equity[-1] * (1 + r))
+            daily.append(r)
+            if positions:
+                overlaps.append(positions)
+
+        peak, drawdown = equity[0], 0.0
+        for e in equity:
+            peak = max(peak, e)
+            drawdown = min(drawdown, e / peak - 1)
+
+        metrics = result["metrics"]
+        assert metrics["total_return"] == pytest.approx((equity[-1] - 1) * 100, abs=0.011)
+        assert metrics["max_drawdown"] == pytest.approx(drawdown * 100, abs=0.011)
+        assert metrics["avg_overlap"] == pytest.approx(np.mean(overlaps), abs=0.011)
+        assert metrics["sharpe"] == pytest.approx(
+            np.mean(daily) / np.std(daily, ddof=1) * np.sqrt(252), abs=0.001
+        )
+        assert metrics["benchmark_return"] == pytest.approx((close[-1] / close[30] - 1) * 100, abs=0.011)
+        assert metrics["excess_return"] == pytest.approx(
+            metrics["total_return"] - metrics["benchmark_return"], abs=0.02
+        )
+        assert len(result["equity_curve"]) == len(close) - 30
+        assert result["equity_curve"][-1]["equity"] == pytest.approx(equity[-1], abs=1e-4)
+
+    def test_no_trades_flat_equity(self):
+        """测试没有交易时资金曲线不变"""
+        close = np.linspace(10, 20, 60)
+        dates = [str(i) for i in range(60)]
+        metrics, curve = performance_metrics(close, dates, np.array([], dtype=int), 5)
+
+        assert metrics["total_return"] == 0
+        assert metrics["max_drawdown"] == 0
+        assert metrics["exposure"] == 0
+        assert metrics["avg_overlap"] == 0
+        assert metrics["benchmark_return"] == pytest.approx(100 * (20 / close[30] - 1), abs=0.011)
+        assert {point["equity"] for point in curve} == {1.0}
+
+    def test_overlapping_positions(self):
+        """测试持仓重叠的计数"""
+        close = np.full(40, 10.0)
+        metrics, _ = performance_metrics(close, [""] * 40, np.array([30, 31, 32]), 3, start=30)
+
+        # 第31-35天持仓数依次为 1,2,3,2,1
+        assert metrics["max_overlap"] == 3
+        assert metrics["avg_overlap"] == pytest.approx(9 / 5)
+        assert metrics["exposure"] == pytest.approx(50.0)
+
+
+class TestBacktestSweep:
+    """测试多股票回测扫描"""
+
+    COMBINATIONS = [
+        ["macd", "kdj", "rsi", "ma", "volume", "boll"],
+        ["macd", "volume"],
+        ["rsi", "boll"],
+        ["kdj", "ma", "volume"],
+    ]
+
+    @pytest.mark.parametrize("min_buy_signals", [None, 1, 2])
+    def test_sweep_matches_run_backtest(self, backtest_service, min_buy_signals):
+        """测试扫描结果与逐个运行 run_backtest 的统计一致"""
+        result = backtest_service.run_sweep(
+            ["600489"],
+            combinations=self.COMBINATIONS,
+            hold_days=[3, 5, 10],
+            min_buy_signals=[min_buy_signals],
+            limit=1000,
+        )
+        assert len(result["results"]) == len(self.COMBINATIONS) * 3
+
+        for row in result["results"]:
+            expected = backtest_service.run_backtest(
+                "600489", row["indicators"], row["hold_days"],
+                min_buy_signals=min_buy_signals,
+            )
+            for key in ("total_signals", "win_count", "loss_count",
+                        "win_rate", "avg_return", "max_return", "min_return"):
+                assert row[key] == pytest.approx(expected[key]), key
+
+    def test_sweep_ranking(self, backtest_service):
+        """测试结果按排序字段降序，默认评估全部组合"""
+        result = backtest_service.run_sweep(["600489"], sort_by="win_rate", limit=1000)
+
+        assert result["combination_count"] == 63
+        win_rates = [row["win_rate"] for row in result["results"]]
+        assert win_rates == sorted(win_rates, reverse=True)
+        assert "return_sum" not in result["results"][0]
+
+    def test_sweep_multiple_stocks(self, backtest_service, monkeypatch):
+        """测试多只股票在进程池中计算，汇总跨股票合计，缺少数据的股票被跳过"""
+        from app.config import config
+
+        frames = {"600489": backtest_service.data_service.get_stock_data("600489")}
+        frames["000001"] = frames["600489"]
+        monkeypatch.setattr(config, "BACKTEST_PROCESSES", 2)
+        monkeypatch.setattr(
+            backtest_service.data_service, "get_stock_data",
+            lambda code, days=100, **kwargs: frames.get(code),
+        )
+
+        try:
+            result = backtest_service.run_sweep(
+                ["600489", "000001", "999999"],
+                combinations=self.COMBINATIONS, hold_days=[5], limit=1000,
+            )
+            pool = backtest_service._process_pool
+            assert pool._mp_context.get_start_method() == "spawn"
+        finally:
+            backtest_service.shutdown()
+        assert backtest_service._process_pool is None
+
+        assert result["stock_count"] == 2
+        assert result["skipped"] == ["999999"]
+        assert len(result["results"]) == len(self.COMBINATIONS) * 2
+        for group in result["summary"]:
+            rows = [
+                row for row in result["results"] if row["indicators"] == group["indicators"]
+            ]
+            assert group["total_signals"] == sum(row["total_signals"] for row in rows)
+            assert group["avg_return"] == pytest.approx(rows[0]["avg_return"], abs=0.01)
@@ -0,0 +1,195 @@
+"""
+WebSocket广播中心单元测试
+"""
+
+import asyncio
+import json
+import time
+
+from app.services import broadcast_hub as hub_module
+from app.services.broadcast_hub import (
+    ALL_TOPIC,
+    BroadcastHub,
+    industry_topic,
+    stock_topic,
+    stock_topics,
+)
+
+
+class FakeWebSocket:
+    """记录收到的文本，可设置每次发送的延迟"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = None
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+class TestBroadcastHub:
+    """测试广播中心"""
+
+    def test_serialize_once(self, monkeypatch):
+        """测试每条广播只序列化一次"""
+        calls = []
+        original = hub_module.encode_message
+        monkeypatch.setattr(
+            hub_module, "encode_message", lambda message: calls.append(message) or original(message)
+        )
+
+        async def scenario():
+            hub = BroadcastHub()
+            clients = [FakeWebSocket() for _ in range(50)]
+            for ws in clients:
+                hub.connect(ws)
+            hub.broadcast({"type": "signal", "data": {"stock_code": "600489", "name": "中金黄金"}})
+            await asyncio.sleep(0.01)
+            return clients
+
+        clients = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert all(
+            json.loads(ws.sent[0])["data"]["name"] == "中金黄金" for ws in clients
+        )
+
+    def test_slow_client_does_not_delay_others(self):
+        """测试慢客户端不影响其他客户端，1000个连接时广播耗时不随客户端数增长"""
+
+        async def scenario():
+            hub = BroadcastHub(queue_size=10)
+            slow = FakeWebSocket(delay=10)
+            fast = [FakeWebSocket() for _ in range(1000)]
+            hub.connect(slow)
+            for ws in fast:
+                hub.connect(ws)
+
+            start = time.perf_counter()
+            hub.broadcast({"type": "indicators", "data": {"price": 12.5}})
+            enqueue_time = time.perf_counter() - start
+
+            await asyncio.sleep(0.05)
+            delivered = sum(len(ws.sent) for ws in fast)
+            for ws in [slow, *fast]:
+                hub.disconnect(ws)
+            return enqueue_time, delivered
+
+        enqueue_time, delivered = asyncio.run(scenario())
+        assert delivered == 1000
+        assert enqueue_time < 0.1
+
+    def test_overflowing_client_dropped(self):
+        """测试发送队列溢出的客户端被断开"""
+
+        async def scenario():
+            hub = BroadcastHub(queue_size=3)
+            slow = FakeWebSocket(delay=10)
+            fast = FakeWebSocket()
+            hub.connect(slow)
+            hub.connect(fast)
+
+            dropped = []
+            for i in range(6):
+                dropped.append(hub.broadcast({"seq": i}))
+                await asyncio.sleep(0)  # 让发送任务运行
+            await asyncio.sleep(0.01)
+            remaining = len(hub)
+            hub.disconnect(fast)
+            return dropped, remaining, slow, fast
+
+        dropped, remaining, slow, fast = asyncio.run(scenario())
+        # 第一条消息被发送任务取走，队列在第5条时溢出
+        assert dropped == [0, 0, 0, 0, 1, 0]
+        assert remaining == 1
+        assert slow.closed == 1013
+        assert [json.loads(text)["seq"] for text in fast.sent] == list(range(6))
+
+    def test_send_to_single_client(self):
+        """测试单发消息只发给指定客户端"""
+
+        async def scenario():
+            hub = BroadcastHub()
+            a, b = FakeWebSocket(), FakeWebSocket()
+            hub.connect(a)
+            hub.connect(b)
+            hub.send(a, {"type": "pong"})
+            await asyncio.sleep(0.01)
+            hub.disconnect(a)
+            hub.disconnect(b)
+            return a, b
+
+        a, b = asyncio.run(scenario())
+        assert a.sent == ['{"type":"pong"}']
+        assert b.sent == []
+
+
+class TestTopics:
+    """测试主题订阅"""
+
+    def test_publish_routes_to_subscribers(self):
+        """测试消息只推送给订阅者，未订阅的连接接收全部推送"""
+
+        async def scenario():
+            hub = BroadcastHub()
+            legacy, by_stock, by_industry, other = (FakeWebSocket() for _ in range(4))
+            for ws in (legacy, by_stock, by_industry, other):
+                hub.connect(ws)
+            hub.subscribe(by_stock, [stock_topic("600489")])
+            hub.subscribe(by_industry, [industry_topic("贵金属")])
+            hub.subscribe(other, [stock_topic("000001")])
+
+            hub.publish(stock_topics("600489", "贵金属") + [ALL_TOPIC], {"code": "600489"})
+            hub.publish(stock_topics("600519", "酿酒行业"), {"code": "600519"})
+            await asyncio.sleep(0.01)
+            for ws in (legacy, by_stock, by_industry, other):
+                hub.disconnect(ws)
+            return legacy, by_stock, by_industry, other
+
+        legacy, by_stock, by_industry, other = asyncio.run(scenario())
+        assert legacy.sent == ['{"code":"600489"}']
+        assert by_stock.sent == ['{"code":"600489"}']
+        assert by_industry.sent == ['{"code":"600489"}']
+        assert other.sent == []
+
+    def test_subscriber_receives_once(self):
+        """测试同时订阅股票和行业的连接只收到一次"""
+
+        async def scenario():
+            hub = BroadcastHub()
+            ws = FakeWebSocket()
+            hub.connect(ws)
+            hub.subscribe(ws, [stock_topic("600489"), industry_topic("贵金属")])
+            hub.publish(stock_topics("600489", "贵金属"), {"code": "600489"})
+            await asyncio.sleep(0.01)
+            hub.disconnect(ws)
+            return ws
+
+        assert len(asyncio.run(scenario()).sent) == 1
+
+    def test_unsubscribe_and_disconnect_clean_index(self):
+        """测试取消订阅和断开连接后索引中不再保留该连接"""
+
+        async def scenario():
+            hub = BroadcastHub()
+            a, b = FakeWebSocket(), FakeWebSocket()
+            hub.connect(a)
+            hub.connect(b)
+            topics = hub.subscribe(a, [stock_topic("600489"), stock_topic("000001")])
+            hub.subscribe(b, [stock_topic("600489")])
+            remaining = hub.unsubscribe(a, [stock_topic("000001")])
+            counts = [hub.subscriber_count(stock_topic("600489")), hub.subscriber_count(ALL_TOPIC)]
+            hub.disconnect(a)
+            hub.disconnect(b)
+            return topics, remaining, counts, hub
+
+        topics, remaining, counts, hub = asyncio.run(scenario())
+        assert topics == ["stock:000001", "stock:600489"]
+        assert remaining == ["stock:600489"]
+        assert counts == [2, 0]
+        assert hub._topics == {}
@@ -0,0 +1,378 @@
+"""
+数据服务单元测试
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from app.services.data_service import DataService
+
+
+def make_spot_df():
+    """模拟 stock_zh_a_spot_em 返回的全市场行情"""
+    return pd.DataFrame(
+        {
+            "代码": ["600489", "000001", "600519"],
+            "名称": ["中金黄金", "平安银行", "贵州茅台"],
+            "最新价": [12.5, 10.2, 1500.0],
+            "涨跌幅": [1.2, -0.5, 0.3],
+            "涨跌额": [0.15, -0.05, 4.5],
+            "成交量": [350000.0, 800000.0, 20000.0],
+            "成交额": [4.3e8, 8.1e8, 3.0e9],
+            "换手率": [0.8, 0.4, 0.2],
+            "最高": [12.8, 10.3, 1510.0],
+            "最低": [12.1, 10.1, 1490.0],
+            "今开": [12.3, 10.25, 1495.0],
+            "昨收": [12.35, 10.25, 1495.5],
+        }
+    )
+
+
+@pytest.fixture
+def spot_calls(monkeypatch):
+    """替换全市场行情接口并记录调用次数"""
+    calls = []
+
+    def fake_spot():
+        calls.append(datetime.now())
+        return make_spot_df()
+
+    monkeypatch.setattr("app.services.data_service.ak.stock_zh_a_spot_em", fake_spot)
+    return calls
+
+
+class TestSpotSnapshot:
+    """测试全市场行情快照"""
+
+    def test_snapshot_shared_within_ttl(self, spot_calls):
+        """测试TTL内多次查询只下载一次"""
+        service = DataService()
+
+        for code in ("600489", "000001", "600519", "600489"):
+            quote = service.get_realtime_quote(code)
+            assert quote["code"] == code
+        service.get_spot_snapshot()
+
+        assert len(spot_calls) == 1
+        assert service.get_realtime_quote("600489")["price"] == 12.5
+        assert service.get_realtime_quote("999999") is None
+
+    def test_snapshot_refresh_after_ttl(self, spot_calls):
+        """测试TTL过期后重新下载"""
+        service = DataService()
+        service.get_spot_snapshot()
+        service._spot_time -= timedelta(seconds=service.spot_cache_duration + 1)
+        service.get_spot_snapshot()
+
+        assert len(spot_calls) == 2
+
+    def test_snapshot_keeps_stale_on_failure(self, spot_calls, monkeypatch):
+        """测试下载失败时返回上一份快照"""
+        service = DataService()
+        snapshot = service.get_spot_snapshot()
+        service._spot_time -= timedelta(seconds=service.spot_cache_duration + 1)
+
+        def broken():
+            raise ConnectionError("network down")
+
+        monkeypatch.setattr("app.services.data_service.ak.stock_zh_a_spot_em", broken)
+        assert service.get_spot_snapshot() is snapshot
+
+
+class TestMergeSpotBar:
+    """测试用实时快照更新当日K线"""
+
+    def test_replace_today_bar(self, spot_calls, sample_stock_df):
+        """测试历史数据已含当日K线时替换为快照值"""
+        service = DataService()
+        df = sample_stock_df.copy()
+        df.loc[df.index[-1], "date"] = pd.Timestamp(datetime.now().date())
+
+        merged = service.merge_spot_bar(df, "600489")
+
+        assert len(merged) == len(df)
+        assert merged["close"].iloc[-1] == 12.5
+        assert merged["high"].iloc[-1] == 12.8
+        assert merged["close"].iloc[:-1].equals(df["close"].iloc[:-1])
+        # 不修改原数据
+        assert df["close"].iloc[-1] != 12.5
+
+    def test_unknown_code_unchanged(self, spot_calls, sample_stock_df):
+        """测试快照中没有的股票原样返回"""
+        service = DataService()
+        assert service.merge_spot_bar(sample_stock_df, "999999") is sample_stock_df
+
+
+class HistCalls(list):
+    """日线接口调用记录，history为模拟的完整历史"""
+
+
+@pytest.fixture
+def hist_calls(monkeypatch, db_session, sample_stock_df):
+    """替换日线接口（数据截止今天），记录每次请求的起止日期"""
+    history = sample_stock_df.copy()
+    history["date"] = pd.bdate_range(end=datetime.now().date(), periods=len(history))
+    calls = HistCalls()
+    calls.history = history
+
+    def fake_hist(symbol, period, start_date, end_date, adjust):
+        calls.append((start_date, end_date))
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        df = history[(history["date"] >= start) & (history["date"] <= end)]
+        return df.rename(
+            columns={
+                "date": "日期",
+                "open": "开盘",
+                "close": "收盘",
+                "high": "最高",
+                "low": "最低",
+                "volume": "成交量",
+                "amount": "成交额",
+            }
+        )
+
+    monkeypatch.setattr("app.services.data_service.ak.stock_zh_a_hist", fake_hist)
+    return calls
+
+
+class TestBarStore:
+    """测试本地日线存储与增量同步"""
+
+    def test_first_fetch_then_trailing_only(self, hist_calls):
+        """测试首次下载完整窗口，之后只下载尾部"""
+        service = DataService()
+        df = service.get_stock_data("600489", days=100)
+        assert len(hist_calls) == 1
+
+        service.cache.clear()
+        again = service.get_stock_data("600489", days=100)
+
+        assert len(hist_calls) == 2
+        # 尾部请求从最后一根已收盘（早于今天）的K线开始
+        dates = hist_calls.history["date"]
+        last_closed = dates[dates < pd.Timestamp(datetime.now().date())].iloc[-1]
+        assert hist_calls[1][0] == last_closed.strftime("%Y%m%d")
+        pd.testing.assert_frame_equal(again, df)
+
+    def test_shorter_window_served_locally(self, hist_calls):
+        """测试更短的窗口直接从本地读取，不补齐头部"""
+        service = DataService()
+        full = service.get_stock_data("600489", days=200)
+        service.cache.clear()
+        short = service.get_stock_data("600489", days=30)
+
+        assert len(hist_calls) == 2  # 第二次只有尾部请求
+        assert len(short) < len(full)
+        pd.testing.assert_frame_equal(short, full.iloc[-len(short):].reset_index(drop=True))
+
+    def test_longer_window_fetches_head(self, hist_calls):
+        """测试更长的窗口只补齐更早的K线"""
+        service = DataService()
+        service.get_stock_data("600489", days=30)
+        df = service.get_stock_data("600489", days=200)
+
+        head_start, head_end = hist_calls[-1]
+        assert head_end < hist_calls[0][0]
+        start = pd.Timestamp(datetime.now().date() - timedelta(days=200))
+        expected = hist_calls.history[hist_calls.history["date"] >= start]
+        assert df["close"].tolist() == pytest.approx(expected["close"].tolist())
+
+    def test_adjustment_change_refetches(self, hist_calls):
+        """测试前复权价格变化（除权）时重新下载整个窗口"""
+        service = DataService()
+        service.get_stock_data("600489", days=100)
+        hist_calls.history[["open", "close", "high", "low"]] *= 0.9
+
+        service.cache.clear()
+        df = service.get_stock_data("600489", days=100)
+
+        # 首次下载、尾部校验、整体重新下载
+        assert len(hist_calls) == 3
+        expected = hist_calls.history["close"].iloc[-len(df):]
+        assert df["close"].tolist() == pytest.approx(expected.tolist())
+
+    def test_empty_fetch_keeps_local_bars(self, hist_calls, monkeypatch):
+        """测试接口返回空数据（限流等）时保留本地K线且不更新同步日期"""
+        from app.services.bar_store import bar_store
+
+        service = DataService()
+        df = service.get_stock_data("600489", days=100)
+        sync = bar_store.get_sync("600489")
+
+        def empty(**kwargs):
+            hist_calls.append((kwargs["start_date"], kwargs["end_date"]))
+            return pd.DataFrame(columns=["日期", "开盘", "收盘", "最高", "最低", "成交量", "成交额"])
+
+        monkeypatch.setattr("app.services.data_service.ak.stock_zh_a_hist", empty)
+        service.cache.clear()
+
+        pd.testing.assert_frame_equal(service.get_stock_data("600489", days=100), df)
+        assert bar_store.get_sync("600489") == sync
+        # 首次同步为空时不写入同步记录
+        assert service.get_stock_data("000001", days=100) is None
+        assert bar_store.get_sync("000001") is None
+
+    @staticmethod
+    def empty_when(hist_calls, monkeypatch, predicate):
+        """让满足predicate(起始日期, 结束日期)的日线请求返回空数据"""
+        import app.services.data_service as data_service_module
+
+        fetch = data_service_module.ak.stock_zh_a_hist
+
+        def hist(**kwargs):
+            if predicate(kwargs["start_date"], kwargs["end_date"]):
+                hist_calls.append((kwargs["start_date"], kwargs["end_date"]))
+                return pd.DataFrame(columns=["日期", "开盘", "收盘", "最高", "最低", "成交量", "成交额"])
+            return fetch(**kwargs)
+
+        monkeypatch.setattr(data_service_module.ak, "stock_zh_a_hist", hist)
+        return fetch
+
+    def test_empty_tail_still_fetches_head(self, hist_calls, monkeypatch):
+        """测试尾部下载为空时仍补齐头部"""
+        from app.services.bar_store import bar_store
+
+        service = DataService()
+        service.get_stock_data("600489", days=30)
+        today = datetime.now().date()
+        self.empty_when(hist_calls, monkeypatch, lambda start, end: end == today.strftime("%Y%m%d"))
+
+        df = service.get_stock_data("600489", days=200)
+
+        start = today - timedelta(days=200)
+        assert bar_store.get_sync("600489")[0] == start
+        expected = hist_calls.history[hist_calls.history["date"] >= pd.Timestamp(start)]
+        assert df["close"].tolist() == pytest.approx(expected["close"].tolist())
+
+    def test_empty_head_not_recorded(self, hist_calls, monkeypatch):
+        """测试头部下载为空时不记录为已覆盖，下次加载时重新下载"""
+        from app.services.bar_store import bar_store
+
+        service = DataService()
+        short = service.get_stock_data("600489", days=30)
+        sync = bar_store.get_sync("600489")
+        today = datetime.now().date().strftime("%Y%m%d")
+        fetch = self.empty_when(hist_calls, monkeypatch, lambda start, end: end != today)
+
+        service.cache.clear()
+        pd.testing.assert_frame_equal(service.get_stock_data("600489", days=200), short)
+        assert bar_store.get_sync("600489") == sync
+
+        monkeypatch.setattr("app.services.data_service.ak.stock_zh_a_hist", fetch)
+        service.cache.clear()
+        start = pd.Timestamp(datetime.now().date() - timedelta(days=200))
+        df = service.get_stock_data("600489", days=200)
+        assert len(df) == (hist_calls.history["date"] >= start).sum()
+
+    def test_pre_listing_head_recorded(self, hist_calls):
+        """测试上市前的头部区间为空时记录为已覆盖，不再重复下载"""
+        from app.services.bar_store import bar_store
+
+        # 模拟历史约560个自然日，窗口起点早于上市日
+        service = DataService()
+        service.get_stock_data("600489", days=600)
+        service.get_stock_data("600489", days=800)
+
+        today = datetime.now().date()
+        assert bar_store.get_sync("600489")[0] == today - timedelta(days=800)
+
+        service.cache.clear()
+        calls = len(hist_calls)
+        df = service.get_stock_data("600489", days=800)
+        # 只有尾部请求
+        assert len(hist_calls) == calls + 1
+        assert hist_calls[-1][1] == today.strftime("%Y%m%d")
+        assert len(df) == len(hist_calls.history)
+
+    def test_serves_local_on_failure(self, hist_calls, monkeypatch):
+        """测试下载失败时返回本地数据"""
+        service = DataService()
+        df = service.get_stock_data("600489", days=100)
+
+        def broken(**kwargs):
+            raise ConnectionError("network down")
+
+        monkeypatch.setattr("app.services.data_service.ak.stock_zh_a_hist", broken)
+        service.cache.clear()
+        pd.testing.assert_frame_equal(service.get_stock_data("600489", days=100), df)
+        assert service.get_stock_data("000001", days=100) is None
+
+
+class TestStockCache:
+    """测试按股票代码缓存的历史K线"""
+
+    def test_shorter_window_sliced_from_cache(self, hist_calls):
+        """测试更短的窗口直接从缓存切片"""
+        service = DataService()
+        full = service.get_stock_data("600489", days=415)
+        short = service.get_stock_data("600489", days=100)
+
+        assert len(hist_calls) == 1
+        assert list(service.cache) == ["600489"]
+        start = pd.Timestamp(datetime.now().date() - timedelta(days=100))
+        pd.testing.assert_frame_equal(short, full[full["date"] >= start].reset_index(drop=True))
+
+    def test_longer_window_replaces_entry(self, hist_calls):
+        """测试更长的窗口重新加载并替换缓存，之后短窗口不再加载"""
+        service = DataService()
+        service.get_stock_data("600489", days=100)
+        service.get_stock_data("600489", days=415)
+        calls = len(hist_calls)
+        service.get_stock_data("600489", days=200)
+
+        assert len(hist_calls) == calls
+        assert len(service.cache) == 1
+
+    def test_cached_last_bar(self, hist_calls):
+        """测试只查看缓存的最后一根K线：未缓存、窗口不够或过期时返回None"""
+        service = DataService()
+        assert service.cached_last_bar("600489", days=100) is None
+
+        df = service.get_stock_data("600489", days=100)
+        pd.testing.assert_series_equal(service.cached_last_bar("600489", days=100), df.iloc[-1])
+        assert service.cached_last_bar("600489", days=415) is None
+
+        service.cache_duration = 0
+        assert service.cached_last_bar("600489", days=100) is None
+        assert len(hist_calls) == 1
+
+    def test_lru_eviction(self, hist_calls):
+        """测试超出内存上限时淘汰最近最少使用的股票"""
+        service = DataService()
+        service.get_stock_data("600489", days=100)
+        size = service._cache_bytes
+        service.cache_max_bytes = size * 2
+
+        service.get_stock_data("000001", days=100)
+        service.get_stock_data("600489", days=100)  # 600489变为最近使用
+        service.get_stock_data("600519", days=100)
+
+        assert list(service.cache) == ["600489", "600519"]
+        assert service._cache_bytes == 2 * size
+
+    def test_concurrent_misses_single_flight(self, hist_calls, monkeypatch):
+        """测试同一股票的并发请求只加载一次"""
+        service = DataService()
+        loads = []
+        release = threading.Event()
+        original = service._load_history
+
+        def slow_load(code, start):
+            loads.append(code)
+            release.wait(5)
+            return original(code, start)
+
+        monkeypatch.setattr(service, "_load_history", slow_load)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(service.get_stock_data, "600489", 100) for _ in range(8)]
+            time.sleep(0.2)
+            release.set()
+            results = [future.result() for future in futures]
+
+        assert loads == ["600489"]
+        assert all(result is results[0] for result in results)
@@ -0,0 +1,77 @@
+"""
+指标增量编码单元测试
+"""
+
+import json
+import math
+
+from app.services.delta_encoder import DeltaEncoder, flatten
+
+
+def make_result(price=12.5, dif=0.1, signal="HOLD"):
+    return {
+        "stock_code": "600489",
+        "price": price,
+        "final_signal": signal,
+        "indicators": {
+            "macd": {"dif": dif, "dea": 0.05, "signal": "中性"},
+            "rsi": {"value": 55.0, "signal": "中性"},
+        },
+    }
+
+
+class TestDeltaEncoder:
+    """测试增量编码"""
+
+    def test_flatten(self):
+        """测试嵌套字段展开为路径"""
+        flat = flatten(make_result())
+        assert flat["indicators.macd.dif"] == 0.1
+        assert flat["price"] == 12.5
+        assert "indicators" not in flat
+
+    def test_first_update_is_snapshot(self):
+        """测试首次出现的股票返回快照"""
+        encoder = DeltaEncoder()
+        message = encoder.update("600489", make_result())
+        assert message["type"] == "indicators_snapshot"
+        assert message["seq"] == 1
+        assert message["data"] == make_result()
+
+    def test_delta_contains_changed_fields(self):
+        """测试增量只包含变化的字段，序列号递增"""
+        encoder = DeltaEncoder()
+        encoder.update("600489", make_result())
+
+        assert encoder.update("600489", make_result()) is None
+        delta = encoder.update("600489", make_result(price=12.6, dif=0.2))
+        assert delta == {
+            "type": "indicators_delta",
+            "code": "600489",
+            "seq": 2,
+            "changed": {"price": 12.6, "indicators.macd.dif": 0.2},
+        }
+        assert encoder.update("600489", make_result(price=12.6, dif=0.2, signal="BUY"))["seq"] == 3
+        assert encoder.snapshot("600489")["seq"] == 3
+        assert encoder.snapshot("600489")["data"]["final_signal"] == "BUY"
+
+    def test_removed_fields_and_nan(self):
+        """测试删除的字段和NaN比较"""
+        encoder = DeltaEncoder()
+        result = make_result(dif=math.nan)
+        encoder.update("600489", result)
+        assert encoder.update("600489", make_result(dif=math.nan)) is None
+
+        smaller = make_result(dif=math.nan)
+        del smaller["indicators"]["rsi"]
+        delta = encoder.update("600489", smaller)
+        assert delta["changed"] == {}
+        assert sorted(delta["removed"]) == ["indicators.rsi.signal", "indicators.rsi.value"]
+
+    def test_delta_smaller_than_full(self):
+        """测试增量消息小于完整消息"""
+        encoder = DeltaEncoder()
+        encoder.update("600489", make_result())
+        delta = encoder.update("600489", make_result(price=12.6))
+        full = {"type": "indicators", "data": make_result(price=12.6)}
+        assert len(json.dumps(delta)) < len(json.dumps(full)) / 2
@@ -0,0 +1,187 @@
+"""
+指标历史服务单元测试
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import inspect
+
+from app.database import IndicatorDaily, IndicatorHistory, engine
+from app.services.history_service import HistoryService
+
+NOW = datetime(2024, 6, 20, 15, 0)
+
+
+def add_history(db_session, code, timestamp, rsi, final_signal="HOLD", buy=1, sell=0):
+    db_session.add(
+        IndicatorHistory(
+            stock_code=code,
+            timestamp=timestamp,
+            rsi_value=rsi,
+            buy_signals=buy,
+            sell_signals=sell,
+            final_signal=final_signal,
+        )
+    )
+
+
+@pytest.fixture
+def minute_history(db_session):
+    """两只股票各60条分钟记录，部分时间戳重复（验证id作为次序键）"""
+    base = datetime(2024, 6, 20, 9, 30)
+    for minute in range(60):
+        timestamp = base + timedelta(minutes=minute // 2)
+        final_signal = "BUY" if minute % 10 == 0 else "HOLD"
+        add_history(db_session, "600489", timestamp, 50.0 + minute, final_signal)
+        add_history(db_session, "000001", timestamp, 40.0, "HOLD")
+    db_session.commit()
+    return base
+
+
+class TestGetHistory:
+    """测试指标历史分页查询"""
+
+    def test_keyset_pages_cover_all_rows(self, minute_history):
+        """测试按游标翻页不重复、不遗漏，按时间倒序"""
+        service = HistoryService()
+        seen = []
+        cursor = None
+        while True:
+            page = asyncio.run(service.get_history(code="600489", limit=7, cursor=cursor))
+            seen.extend(page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert len(seen) == 60
+        assert len({item["id"] for item in seen}) == 60
+        keys = [(item["timestamp"], item["id"]) for item in seen]
+        assert keys == sorted(keys, reverse=True)
+        assert {item["stock_code"] for item in seen} == {"600489"}
+
+    def test_filters(self, minute_history):
+        """测试时间范围和信号筛选"""
+        service = HistoryService()
+        page = asyncio.run(service.get_history(
+            code="600489",
+            start=minute_history + timedelta(minutes=5),
+            end=minute_history + timedelta(minutes=20),
+            signal="BUY",
+        ))
+
+        assert [item["rsi_value"] for item in page["items"]] == [80.0, 70.0, 60.0]
+        assert page["next_cursor"] is None
+        assert len(asyncio.run(service.get_history(limit=1000))["items"]) == 120
+
+    def test_invalid_cursor(self, minute_history):
+        """测试无效游标"""
+        with pytest.raises(ValueError):
+            asyncio.run(HistoryService().get_history(cursor="not-a-cursor"))
+
+    def test_history_endpoint(self, minute_history, test_client):
+        """测试历史查询API"""
+        response = test_client.get(
+            "/api/indicators/history", params={"code": "000001", "limit": 50}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) == 50
+        assert data["next_cursor"]
+
+        response = test_client.get(
+            "/api/indicators/history",
+            params={"code": "000001", "limit": 50, "cursor": data["next_cursor"]},
+        )
+        assert len(response.json()["items"]) == 10
+
+        assert test_client.get("/api/indicators/history", params={"cursor": "bad"}).status_code == 400
+
+
+class TestCompactHistory:
+    """测试指标历史压缩"""
+
+    def test_old_history_rolled_up(self, db_session):
+        """测试保留期之前的记录按股票和日期汇总后删除"""
+        old_day = datetime(2024, 6, 10, 9, 30)
+        for minute, rsi in enumerate([20.0, 30.0, 40.0]):
+            add_history(db_session, "600489", old_day + timedelta(minutes=minute), rsi)
+        add_history(db_session, "600489", old_day + timedelta(days=1), 50.0, "BUY", buy=4)
+        add_history(db_session, "000001", old_day, 60.0, "SELL", buy=0, sell=5)
+        add_history(db_session, "600489", datetime(2024, 6, 19, 10, 0), 55.0)
+        db_session.commit()
+
+        result = HistoryService().compact_history(retention_days=7, now=NOW)
+
+        assert result == {"days": 2, "rows": 5}
+        remaining = db_session.query(IndicatorHistory).all()
+        assert [(r.stock_code, r.rsi_value) for r in remaining] == [("600489", 55.0)]
+
+        rollups = {
+            (r.stock_code, r.date): r for r in db_session.query(IndicatorDaily).all()
+        }
+        assert set(rollups) == {
+            ("600489", date(2024, 6, 10)),
+            ("600489", date(2024, 6, 11)),
+            ("000001", date(2024, 6, 10)),
+        }
+        day = rollups[("600489", date(2024, 6, 10))]
+        assert day.sample_count == 3
+        assert day.rsi_avg == pytest.approx(30.0)
+        assert (day.rsi_min, day.rsi_max) == (20.0, 40.0)
+        assert rollups[("600489", date(2024, 6, 11))].buy_count == 1
+        assert rollups[("000001", date(2024, 6, 10))].sell_count == 1
+        assert rollups[("000001", date(2024, 6, 10))].sell_signals_max == 5
+
+    def test_late_rows_merged_into_rollup(self, db_session):
+        """测试压缩后写入的迟到记录与已有汇总合并"""
+        service = HistoryService()
+        add_history(db_session, "600489", datetime(2024, 6, 10, 9, 30), 20.0)
+        db_session.commit()
+        service.compact_history(retention_days=7, now=NOW)
+
+        add_history(db_session, "600489", datetime(2024, 6, 10, 14, 0), 50.0, "BUY", buy=4)
+        db_session.commit()
+        assert service.compact_history(retention_days=7, now=NOW) == {"days": 1, "rows": 1}
+
+        db_session.expire_all()
+        rollup = db_session.query(IndicatorDaily).one()
+        assert rollup.sample_count == 2
+        assert rollup.rsi_avg == pytest.approx(35.0)
+        assert (rollup.rsi_min, rollup.rsi_max) == (20.0, 50.0)
+        assert rollup.buy_signals_max == 4
+        assert rollup.buy_count == 1
+
+    def test_late_rows_rsi_weighted_by_rsi_count(self, db_session):
+        """测试合并时RSI均值只按有RSI值的记录加权"""
+        service = HistoryService()
+        add_history(db_session, "600489", datetime(2024, 6, 10, 9, 30), 20.0)
+        add_history(db_session, "600489", datetime(2024, 6, 10, 9, 31), None)
+        db_session.commit()
+        service.compact_history(retention_days=7, now=NOW)
+
+        add_history(db_session, "600489", datetime(2024, 6, 10, 14, 0), 50.0)
+        db_session.commit()
+        service.compact_history(retention_days=7, now=NOW)
+
+        db_session.expire_all()
+        rollup = db_session.query(IndicatorDaily).one()
+        assert (rollup.sample_count, rollup.rsi_count) == (3, 2)
+        assert rollup.rsi_avg == pytest.approx(35.0)
+
+    def test_nothing_to_compact(self, db_session):
+        """测试没有过期记录时不做任何修改"""
+        add_history(db_session, "600489", NOW - timedelta(hours=1), 50.0)
+        db_session.commit()
+
+        assert HistoryService().compact_history(retention_days=7, now=NOW) == {"days": 0, "rows": 0}
+        assert db_session.query(IndicatorHistory).count() == 1
+
+
+def test_composite_indexes(db_session):
+    """测试 (stock_code, timestamp) 复合索引"""
+    inspector = inspect(engine)
+    for table in ("indicator_history", "signal_alerts"):
+        columns = [index["column_names"] for index in inspector.get_indexes(table)]
+        assert ["stock_code", "timestamp"] in columns
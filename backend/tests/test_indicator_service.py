@@ -0,0 +1,193 @@
+"""
+指标服务单元测试
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import indicator_kernels
+from app.services.indicator_kernels import KERNEL_COLUMNS
+from app.services.indicator_service import IndicatorService, SIGNAL_COLUMNS
+
+
+# 全量序列列名 -> calculate_all_indicators结果中的位置
+SERIES_FIELDS = {
+    "dif": ("macd", "dif"),
+    "dea": ("macd", "dea"),
+    "macd": ("macd", "macd"),
+    "macd_signal": ("macd", "signal"),
+    "k": ("kdj", "k"),
+    "d": ("kdj", "d"),
+    "j": ("kdj", "j"),
+    "kdj_signal": ("kdj", "signal"),
+    "rsi": ("rsi", "value"),
+    "rsi_signal": ("rsi", "signal"),
+    "ma5": ("ma", "ma5"),
+    "ma10": ("ma", "ma10"),
+    "ma20": ("ma", "ma20"),
+    "ma_signal": ("ma", "signal"),
+    "volume": ("volume", "current"),
+    "volume_ma5": ("volume", "ma5"),
+    "volume_signal": ("volume", "signal"),
+    "boll_upper": ("boll", "upper"),
+    "boll_middle": ("boll", "middle"),
+    "boll_lower": ("boll", "lower"),
+    "boll_signal": ("boll", "signal"),
+}
+
+
+def assert_same_value(actual, expected):
+    """数值完全相等（NaN视为相等），字符串直接比较"""
+    if isinstance(expected, float) and math.isnan(expected):
+        assert math.isnan(actual)
+    else:
+        assert actual == expected
+
+
+class TestIndicatorSeries:
+    """测试全量指标序列"""
+
+    def test_series_aligned_with_input(self, sample_stock_df):
+        """测试序列与输入按行对齐"""
+        service = IndicatorService()
+        series = service.calculate_indicator_series(sample_stock_df)
+
+        assert len(series) == len(sample_stock_df)
+        assert series.index.equals(sample_stock_df.index)
+        assert set(SERIES_FIELDS) <= set(series.columns)
+        assert series["dif"].dtype == "float64"
+
+    def test_series_matches_scalar_indicators(self, sample_stock_df):
+        """测试每一行与逐日切片计算的指标完全一致"""
+        service = IndicatorService()
+        series = service.calculate_indicator_series(sample_stock_df)
+
+        for i in range(30, len(sample_stock_df)):
+            expected = service.calculate_all_indicators(sample_stock_df.iloc[: i + 1])
+            row = series.iloc[i]
+            for column, (group, field) in SERIES_FIELDS.items():
+                assert_same_value(row[column], expected[group][field])
+
+    def test_buy_signal_series(self, sample_stock_df):
+        """测试买入信号布尔列与信号名称列一致"""
+        service = IndicatorService()
+        series = service.calculate_indicator_series(sample_stock_df)
+        buy_signals = service.calculate_buy_signal_series(sample_stock_df, series)
+
+        assert list(buy_signals.columns) == list(SIGNAL_COLUMNS)
+        for key, (column, buy, _) in SIGNAL_COLUMNS.items():
+            assert (buy_signals[key] == (series[column] == buy)).all()
+        assert buy_signals.to_numpy().any()
+
+
+@pytest.fixture
+def flat_stock_df(sample_stock_df):
+    """含连续一字板（最高价=最低价，RSV为0/0）和长期无下跌的模拟数据"""
+    df = sample_stock_df.copy()
+    df.loc[100:114, ["open", "close", "high", "low"]] = df.loc[100, "close"]
+    df.loc[200:220, "close"] = np.linspace(df.loc[200, "close"], df.loc[200, "close"] * 1.3, 21)
+    return df
+
+
+class TestIndicatorBackends:
+    """测试NumPy/numba计算后端与pandas结果一致"""
+
+    @pytest.mark.parametrize("backend", ["numpy", "numba"])
+    @pytest.mark.parametrize("data", ["sample_stock_df", "flat_stock_df"])
+    def test_backend_matches_pandas(self, backend, data, request):
+        df = request.getfixturevalue(data)
+        service = IndicatorService()
+        expected = service.calculate_indicator_series(df, backend="pandas")
+        actual = service.calculate_indicator_series(df, backend=backend)
+
+        for column in KERNEL_COLUMNS:
+            np.testing.assert_allclose(
+                actual[column], expected[column], rtol=1e-9, atol=1e-9, err_msg=column
+            )
+        for column, _, _ in SIGNAL_COLUMNS.values():
+            assert (actual[column] == expected[column]).all(), column
+
+    def test_numpy_fallback_without_numba(self, flat_stock_df, monkeypatch):
+        """测试未安装numba时numba后端使用纯NumPy实现"""
+        monkeypatch.setattr(indicator_kernels, "numba", None)
+        monkeypatch.setattr(indicator_kernels, "_ewm_compiled", None)
+        if hasattr(indicator_kernels._ewm_step, "py_func"):
+            monkeypatch.setattr(indicator_kernels, "_ewm_step", indicator_kernels._ewm_step.py_func)
+
+        service = IndicatorService()
+        expected = service.calculate_indicator_series(flat_stock_df, backend="pandas")
+        actual = service.calculate_indicator_series(flat_stock_df, backend="numba")
+        for column in KERNEL_COLUMNS:
+            np.testing.assert_allclose(
+                actual[column], expected[column], rtol=1e-9, atol=1e-9, err_msg=column
+            )
+
+    def test_invalid_backend(self, sample_stock_df):
+        with pytest.raises(ValueError):
+            IndicatorService().calculate_indicator_series(sample_stock_df, backend="gpu")
+
+
+def make_bars(sample_stock_df, lengths):
+    """由模拟数据生成多只股票的日线长表（各股票长度不同，价格按比例缩放，最后一根K线同日）"""
+    frames = []
+    for i, length in enumerate(lengths):
+        df = sample_stock_df.iloc[i * 7 : i * 7 + length].reset_index(drop=True)
+        df[["open", "close", "high", "low"]] *= 1 + i / 10
+        df["date"] = sample_stock_df["date"].iloc[-length:].to_numpy()
+        frames.append(df.assign(stock_code=f"{600000 + i}"))
+    return pd.concat(frames, ignore_index=True)
+
+
+class TestBatchSignals:
+    """测试横截面批量指标计算"""
+
+    def test_stack_bars_right_aligned(self, sample_stock_df):
+        """测试矩阵按最近交易日右对齐，较短的历史左侧补NaN"""
+        bars = make_bars(sample_stock_df, [50, 80, 20])
+        codes, matrices = IndicatorService.stack_bars(bars.sample(frac=1, random_state=1), days=60)
+
+        assert codes == ["600000", "600001", "600002"]
+        close = matrices["close"]
+        assert close.shape == (3, 60)
+        np.testing.assert_array_equal(close[0, 10:], bars[bars.stock_code == "600000"]["close"])
+        np.testing.assert_array_equal(close[1], bars[bars.stock_code == "600001"]["close"].iloc[-60:])
+        assert np.isnan(close[2, :40]).all()
+
+    def test_stack_bars_drops_stale_stocks(self, sample_stock_df):
+        """测试最后一根K线早于最新交易日的股票（停牌、未同步）不进入矩阵"""
+        bars = make_bars(sample_stock_df, [50, 80])
+        stale = sample_stock_df.iloc[:-3].tail(60).assign(stock_code="000001")
+        codes, matrices = IndicatorService.stack_bars(pd.concat([bars, stale]), days=60)
+
+        assert codes == ["600000", "600001"]
+        assert matrices["close"].shape == (2, 60)
+
+    def test_batch_matches_per_stock_series(self, sample_stock_df, flat_stock_df):
+        """测试每只股票的批量结果与单独计算的最后一行一致，历史不足30天的股票被排除"""
+        bars = pd.concat([
+            make_bars(sample_stock_df, [120, 60, 31, 29, 200]),
+            flat_stock_df.iloc[50:170].assign(
+                stock_code="000001", date=sample_stock_df["date"].iloc[-120:].to_numpy()
+            ),
+        ], ignore_index=True)
+        service = IndicatorService()
+        codes, m = service.stack_bars(bars, days=120)
+        table = service.calculate_batch_signals(codes, m["close"], m["high"], m["low"], m["volume"])
+
+        assert "600003" not in table.index
+        assert len(table) == 5
+        for code, df in bars.groupby("stock_code"):
+            if code not in table.index:
+                continue
+            expected = service.calculate_indicator_series(df.tail(120).reset_index(drop=True)).iloc[-1]
+            row = table.loc[code]
+            for column in KERNEL_COLUMNS:
+                np.testing.assert_allclose(row[column], expected[column], rtol=1e-9, err_msg=column)
+            for column, buy, sell in SIGNAL_COLUMNS.values():
+                assert row[column] == expected[column], column
+            assert row["buy_count"] == sum(
+                expected[column] == buy for column, buy, _ in SIGNAL_COLUMNS.values()
+            )
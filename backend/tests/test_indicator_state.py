@@ -0,0 +1,95 @@
+"""
+增量指标状态单元测试
+"""
+
+import math
+
+import pytest
+
+from app.services.indicator_service import IndicatorService
+from app.services.indicator_state import IndicatorState
+
+
+def assert_same_indicators(actual, expected, approx_keys=()):
+    """逐字段比较指标结果，要求完全相等（NaN视为相等），approx_keys中的指标允许末位舍入误差"""
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, dict):
+            assert actual[key].keys() == value.keys()
+            for field, expected_value in value.items():
+                actual_value = actual[key][field]
+                if isinstance(expected_value, float) and math.isnan(expected_value):
+                    assert math.isnan(actual_value), (key, field)
+                elif key in approx_keys and field != "signal":
+                    assert actual_value == pytest.approx(expected_value, rel=1e-12), (key, field)
+                else:
+                    assert actual_value == expected_value, (key, field)
+        else:
+            assert actual[key] == value, key
+
+
+class TestIndicatorState:
+    """测试增量指标状态"""
+
+    def test_streaming_matches_full_calculation(self, sample_stock_df):
+        """测试逐根推入K线与全量计算完全一致"""
+        service = IndicatorService()
+        state = IndicatorState.from_dataframe(sample_stock_df.iloc[:20])
+        assert state.snapshot() is None
+
+        for i in range(20, len(sample_stock_df)):
+            result = state.update(sample_stock_df.iloc[i])
+            expected = service.calculate_all_indicators(sample_stock_df.iloc[: i + 1])
+            if expected is None:
+                assert result is None
+            else:
+                assert_same_indicators(result, expected)
+
+    def test_revised_last_bar(self, sample_stock_df):
+        """测试盘中修正最新K线后与全量计算一致"""
+        service = IndicatorService()
+        df = sample_stock_df.copy()
+        state = IndicatorState.from_dataframe(df.iloc[:-1])
+
+        for close in (10.0, 12.5, df["close"].iloc[-2] * 0.9):
+            df.loc[df.index[-1], ["close", "high", "low"]] = [close, close * 1.01, close * 0.99]
+            result = state.update(df.iloc[-1])
+            assert_same_indicators(result, service.calculate_all_indicators(df))
+        assert state.bar_count == len(df)
+
+    def test_flat_prices(self, sample_stock_df):
+        """
+        测试停牌等价格不变的情况（除零、恒定窗口）
+
+        pandas不同版本对恒定窗口后的滑动方差处理细节不同，布林带数值只要求末位一致。
+        """
+        service = IndicatorService()
+        df = sample_stock_df.iloc[:120].copy()
+        df.loc[60:90, ["open", "high", "low", "close"]] = 10.0
+        df.loc[60:90, "volume"] = 0.0
+        state = IndicatorState.from_dataframe(df.iloc[:30])
+
+        for i in range(30, len(df)):
+            result = state.update(df.iloc[i])
+            expected = service.calculate_all_indicators(df.iloc[: i + 1])
+            assert_same_indicators(result, expected, approx_keys=("boll",))
+
+    def test_matches(self, sample_stock_df):
+        """测试判断数据能否增量同步"""
+        df = sample_stock_df
+        state = IndicatorState.from_dataframe(df.iloc[:100])
+
+        assert state.matches(df.iloc[:100])
+        assert state.matches(df.iloc[:101])
+        assert not state.matches(df.iloc[:102])
+        assert not state.matches(df.iloc[1:101])
+
+        adjusted = df.iloc[:101].copy()
+        adjusted["close"] = adjusted["close"] * 0.95
+        assert not state.matches(adjusted)
+
+    def test_out_of_order_bar(self, sample_stock_df):
+        """测试推入更早的K线时报错"""
+        state = IndicatorState.from_dataframe(sample_stock_df.iloc[:50])
+        with pytest.raises(ValueError):
+            state.update(sample_stock_df.iloc[10])
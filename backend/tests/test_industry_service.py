@@ -2,8 +2,17 @@
 行业服务单元测试
 """
 
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
 import pytest
-from datetime import datetime
+
+from app.config import config
+from app.database import Industry, Stock
+from app.services.industry_service import QUOTE_COLUMNS, IndustryService
 
 
 class TestIndustryService:
@@ -58,3 +67,264 @@ class TestIndustryService:
             assert isinstance(industry, str)
             assert len(code) == 6  # A股代码为6位
             assert len(industry) > 0
+
+
+class TestIndustryRefresh:
+    """测试行业映射并发刷新"""
+
+    BOARDS = {
+        "银行": ["000001", "600036"],
+        "贵金属": ["600489"],
+        "酿酒行业": ["600519", "000858"],
+        "保险": ["601318"],
+    }
+
+    @pytest.fixture
+    def fake_akshare(self, monkeypatch):
+        """模拟akshare行业接口，记录并发数，每个板块第一次请求失败"""
+        state = {"active": 0, "max_active": 0, "calls": []}
+        lock = threading.Lock()
+        release = threading.Event()
+        release.set()
+
+        def board_names():
+            return pd.DataFrame({"板块名称": list(self.BOARDS)})
+
+        def board_cons(symbol):
+            release.wait()
+            with lock:
+                state["calls"].append(symbol)
+                first_call = state["calls"].count(symbol) == 1
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+            time.sleep(0.02)
+            with lock:
+                state["active"] -= 1
+            if first_call:
+                raise ConnectionError("temporary failure")
+            return pd.DataFrame({"代码": self.BOARDS[symbol]})
+
+        monkeypatch.setattr(
+            "app.services.industry_service.ak.stock_board_industry_name_em", board_names
+        )
+        monkeypatch.setattr(
+            "app.services.industry_service.ak.stock_board_industry_cons_em", board_cons
+        )
+        monkeypatch.setattr(IndustryService, "_save_to_db", lambda self, *args: None)
+        monkeypatch.setattr(config, "INDUSTRY_RETRY_DELAY", 0)
+        monkeypatch.setattr(config, "INDUSTRY_REFRESH_CONCURRENCY", 2)
+        state["release"] = release
+        return state
+
+    def test_refresh_with_retry_and_bounded_concurrency(self, fake_akshare):
+        """测试刷新时按并发上限获取板块并重试失败的板块"""
+        service = IndustryService()
+        service._refresh_industry_map()
+
+        assert service._industry_map == {
+            code: name for name, codes in self.BOARDS.items() for code in codes
+        }
+        assert service._last_update is not None
+        assert fake_akshare["max_active"] <= 2
+        assert len(fake_akshare["calls"]) == 2 * len(self.BOARDS)
+
+    def test_failed_board_keeps_previous_stocks(self, fake_akshare, monkeypatch):
+        """测试个别行业获取失败时沿用现有映射中的成分股"""
+        saved = []
+        monkeypatch.setattr(IndustryService, "_save_to_db", lambda self, *args: saved.append(args[0]))
+        monkeypatch.setattr(config, "INDUSTRY_MAX_FAILED_RATIO", 0.5)
+        monkeypatch.setattr(config, "INDUSTRY_FETCH_RETRIES", 1)
+        fake_akshare["calls"].extend(name for name in self.BOARDS if name != "贵金属")
+        service = IndustryService()
+        service._industry_map = {"600489": "贵金属", "600547": "贵金属", "000001": "保险"}
+
+        service._refresh_industry_map()
+
+        expected = {code: name for name, codes in self.BOARDS.items() for code in codes}
+        expected["600547"] = "贵金属"
+        assert service._industry_map == expected
+        assert saved == [expected]
+        assert service._last_update is not None
+
+    def test_all_boards_failed_keeps_map(self, fake_akshare, monkeypatch):
+        """测试全部行业获取失败时保留现有映射，不写入数据库也不标记为已更新"""
+        saved = []
+        monkeypatch.setattr(IndustryService, "_save_to_db", lambda self, *args: saved.append(args[0]))
+        monkeypatch.setattr(config, "INDUSTRY_FETCH_RETRIES", 1)
+        service = IndustryService()
+        service._industry_map = {"600489": "贵金属"}
+        industry_map = service._industry_map
+        last_update = service._last_update = datetime.now() - timedelta(days=2)
+
+        service._refresh_industry_map()
+
+        assert service._industry_map is industry_map
+        assert service._last_update == last_update
+        assert saved == []
+
+    def test_stale_map_served_during_refresh(self, fake_akshare):
+        """测试后台刷新期间继续返回旧映射"""
+        service = IndustryService()
+        service._industry_map = {"600489": "旧行业"}
+        service._last_update = datetime.now() - timedelta(days=2)
+        fake_akshare["release"].clear()
+
+        assert service.get_stock_industry("600489") == "旧行业"
+        thread = service._refresh_thread
+        assert thread is not None and thread.is_alive()
+
+        fake_akshare["release"].set()
+        thread.join(timeout=5)
+        assert service.get_stock_industry("600489") == "贵金属"
+
+    def test_cold_start_waits_for_refresh(self, fake_akshare):
+        """测试冷启动没有映射时等待刷新完成"""
+        service = IndustryService()
+        assert service.get_stock_industry("601318") == "保险"
+
+
+class TestIndustryPersistence:
+    """测试行业映射持久化与预热"""
+
+    def test_save_and_warm_start(self, db_session):
+        """测试刷新结果写入数据库后，新实例无需刷新即可查询"""
+        db_session.add(Stock(code="600489", name="中金黄金"))
+        db_session.commit()
+
+        service = IndustryService()
+        service._save_to_db(
+            {"600489": "贵金属", "000001": "银行", "600036": "银行"},
+            {"000001": "平安银行", "600036": "招商银行"},
+            {"银行": "BK0475"},
+        )
+
+        db_session.expire_all()
+        stocks = {stock.code: stock for stock in db_session.query(Stock)}
+        # 已在监控列表中的股票保持监控，新写入的股票不加入监控
+        assert stocks["600489"].watched and stocks["600489"].industry == "贵金属"
+        assert not stocks["000001"].watched and stocks["000001"].name == "平安银行"
+        bank = db_session.query(Industry).filter_by(name="银行").one()
+        assert bank.stock_count == 2 and bank.code == "BK0475"
+
+        restarted = IndustryService()
+        assert restarted.load_from_db()
+        assert not restarted._is_stale()
+        assert restarted.get_stock_industry("600036") == "银行"
+        assert restarted.get_all_industries() == sorted(["贵金属", "银行"])
+
+    def test_resave_updates_and_clears(self, db_session):
+        """测试再次保存时更新行业并清空已移除的股票"""
+        service = IndustryService()
+        service._save_to_db({"600489": "贵金属", "000001": "银行"})
+        service._save_to_db({"000001": "保险"})
+
+        db_session.expire_all()
+        stocks = {stock.code: stock.industry for stock in db_session.query(Stock)}
+        assert stocks == {"600489": None, "000001": "保险"}
+        assert [i.name for i in db_session.query(Industry)] == ["保险"]
+
+    def test_old_map_loaded_as_stale(self, db_session):
+        """测试超过24小时的持久化映射仍会加载，但标记为需要刷新"""
+        service = IndustryService()
+        service._save_to_db({"600489": "贵金属"})
+        db_session.query(Industry).update({"updated_at": datetime.now() - timedelta(days=3)})
+        db_session.commit()
+
+        restarted = IndustryService()
+        assert restarted.load_from_db()
+        assert restarted._industry_map == {"600489": "贵金属"}
+        assert restarted._is_stale()
+
+    def test_load_without_data(self, db_session):
+        """测试数据库中没有映射时返回False"""
+        assert not IndustryService().load_from_db()
+
+
+class TestIndustryIndex:
+    """测试行业反向索引"""
+
+    def test_index_rebuilt_on_map_change(self, industry_service):
+        """测试替换映射后反向索引和行业列表同步更新"""
+        industry_service._industry_map = {
+            "600036": "银行",
+            "000001": "银行",
+            "601318": "保险",
+        }
+
+        assert industry_service.get_industry_stocks("银行") == ["000001", "600036"]
+        assert industry_service.get_industry_stocks("贵金属") == []
+        assert industry_service.get_all_industries() == ["保险", "银行"]
+
+    def test_returned_lists_are_copies(self, industry_service):
+        """测试修改返回结果不影响索引"""
+        industry_service.get_industry_stocks("银行").append("999999")
+        industry_service.get_all_industries().clear()
+
+        assert industry_service.get_industry_stocks("银行") == ["000001"]
+        assert "银行" in industry_service.get_all_industries()
+
+
+def make_quote_df(n, seed, nan_ratio=0.0):
+    """模拟全市场行情快照（按代码索引）"""
+    rng = np.random.default_rng(seed)
+    codes = [f"{600000 + i}" for i in range(n)]
+    df = pd.DataFrame(
+        {
+            "代码": codes,
+            "名称": [f"股票{i}" for i in range(n)],
+            "最新价": rng.uniform(3, 100, n),
+            "涨跌幅": rng.normal(0, 3, n).round(6),
+            "涨跌额": rng.normal(0, 1, n),
+            "成交量": rng.uniform(1e4, 1e7, n),
+            "成交额": rng.uniform(1e6, 1e9, n),
+            "换手率": rng.uniform(0, 10, n),
+            "最高": rng.uniform(3, 100, n),
+            "最低": rng.uniform(3, 100, n),
+            "今开": rng.uniform(3, 100, n),
+            "昨收": rng.uniform(3, 100, n),
+        }
+    )
+    for column in ("涨跌幅", "成交量", "换手率"):
+        df.loc[rng.random(n) < nan_ratio, column] = np.nan
+    return df.set_index("代码", drop=False)
+
+
+def reference_ranking(df, sort_field):
+    """原实现：整体排序后逐行转换"""
+
+    def value(row, column):
+        return float(row[column]) if pd.notna(row[column]) else 0
+
+    rows = [
+        {"code": row["代码"], "name": row["名称"], **{field: value(row, column) for column, field in QUOTE_COLUMNS.items()}}
+        for _, row in df.sort_values(by=sort_field, ascending=False, kind="stable").iterrows()
+    ]
+    if len(rows) <= 20:
+        mid = len(rows) // 2
+        return rows[:mid], rows[mid:]
+    return rows[:10], rows[-10:]
+
+
+class TestIndustryRanking:
+    """测试行业内股票排名"""
+
+    @pytest.mark.parametrize(
+        "n,nan_ratio",
+        [(1, 0.0), (7, 0.3), (20, 0.0), (21, 0.2), (300, 0.0), (300, 0.1), (300, 0.97)],
+    )
+    @pytest.mark.parametrize("sort_by,sort_field", [("change", "涨跌幅"), ("volume", "成交量")])
+    def test_matches_full_sort(self, industry_service, monkeypatch, n, nan_ratio, sort_by, sort_field):
+        """测试部分选择与整体排序的结果一致"""
+        df = make_quote_df(n, seed=n, nan_ratio=nan_ratio)
+        industry_service._industry_map = {code: "测试行业" for code in df.index}
+        monkeypatch.setattr(
+            "app.services.industry_service.data_service.get_spot_snapshot", lambda: df
+        )
+
+        result = industry_service.get_industry_stocks_with_quote("测试行业", sort_by)
+        gainers, losers = reference_ranking(df, sort_field)
+
+        assert result["total_count"] == n
+        assert result["top_gainers"] == gainers
+        assert result["top_losers"] == losers
+        assert all(type(stock["price"]) is float for stock in result["top_gainers"])
@@ -0,0 +1,128 @@
+"""
+主应用（定时任务、事件循环）单元测试
+"""
+
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from app import main
+
+
+class TestMonitorTask:
+    """测试定时监控任务不阻塞事件循环"""
+
+    def test_health_latency_during_sweep(self, monkeypatch):
+        """测试监控扫描期间 /health 的p99延迟"""
+
+        def slow_sweep():
+            # 模拟akshare下载和指标计算
+            time.sleep(1.0)
+            return []
+
+        monkeypatch.setattr(main.monitor_service, "check_watchlist", slow_sweep)
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                sweep = asyncio.create_task(main.monitor_task())
+                latencies = []
+                while not sweep.done():
+                    start = time.perf_counter()
+                    response = await client.get("/health")
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200
+                await sweep
+            return latencies
+
+        latencies = asyncio.run(scenario())
+        p99 = float(np.percentile(latencies, 99))
+
+        assert len(latencies) > 20
+        assert p99 < 0.2
+
+    def test_signal_callback_from_worker_thread(self, monkeypatch):
+        """测试工作线程中触发的信号被投递到事件循环广播"""
+        received = []
+
+        async def fake_publish(code, message, include_all=True):
+            received.append(message)
+
+        monkeypatch.setattr(main, "publish_stock_message", fake_publish)
+
+        async def scenario():
+            monkeypatch.setattr(main, "event_loop", asyncio.get_running_loop())
+            await asyncio.to_thread(main.on_signal_triggered, {"stock_code": "600489"})
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+        assert received == [{"type": "signal", "data": {"stock_code": "600489"}}]
+
+
+class TestWebSocket:
+    """测试 /ws 端点"""
+
+    def test_ping_pong(self, test_client):
+        """测试心跳经发送队列返回"""
+        with test_client.websocket_connect("/ws") as ws:
+            ws.send_text('{"type": "ping"}')
+            assert ws.receive_json()["type"] == "pong"
+
+    def test_subscribe_routes_messages(self, test_client, monkeypatch):
+        """测试订阅后只收到所订阅股票的推送"""
+        monkeypatch.setattr(
+            main.industry_service, "get_cached_stock_industry", lambda code: None
+        )
+        with test_client.websocket_connect("/ws") as ws:
+            ws.send_text('{"type": "subscribe", "stocks": ["000001"]}')
+            assert ws.receive_json() == {"type": "subscribed", "topics": ["stock:000001"]}
+
+            for code in ("600519", "000001"):
+                asyncio.run_coroutine_threadsafe(
+                    main.publish_stock_message(code, {"type": "indicators", "code": code}),
+                    main.event_loop,
+                ).result(1)
+            assert ws.receive_json() == {"type": "indicators", "code": "000001"}
+
+            ws.send_text('{"type": "unsubscribe", "stocks": ["000001"]}')
+            assert ws.receive_json() == {"type": "subscribed", "topics": []}
+
+    def test_delta_subscription(self, test_client, monkeypatch):
+        """测试增量订阅：订阅后先收到快照，之后只收到变化的字段"""
+        code = "300750"
+        results = [
+            {"stock_code": code, "price": 200.0, "final_signal": "HOLD"},
+            {"stock_code": code, "price": 201.0, "final_signal": "HOLD"},
+        ]
+        monkeypatch.setattr(
+            main.monitor_service, "check_watchlist", lambda: [results.pop(0)]
+        )
+        monkeypatch.setattr(
+            main.industry_service, "get_cached_stock_industry", lambda code: None
+        )
+
+        def run_tick():
+            asyncio.run_coroutine_threadsafe(main.monitor_task(), main.event_loop).result(5)
+
+        with test_client.websocket_connect("/ws") as ws:
+            ws.send_text('{"type": "subscribe", "stocks": ["%s"], "mode": "delta"}' % code)
+            assert ws.receive_json()["topics"] == [f"delta:stock:{code}"]
+
+            run_tick()
+            snapshot = ws.receive_json()
+            assert snapshot["type"] == "indicators_snapshot"
+            assert snapshot["data"]["price"] == 200.0
+
+            run_tick()
+            delta = ws.receive_json()
+            assert delta == {
+                "type": "indicators_delta",
+                "code": code,
+                "seq": snapshot["seq"] + 1,
+                "changed": {"price": 201.0},
+            }
+
+            ws.send_text('{"type": "snapshot", "stocks": ["%s"]}' % code)
+            assert ws.receive_json()["seq"] == delta["seq"]
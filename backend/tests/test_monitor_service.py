@@ -0,0 +1,198 @@
+"""
+监控服务单元测试
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from app.services.monitor_service import MonitorService
+from app.services.write_buffer import write_buffer
+
+
+@pytest.fixture
+def monitor_service(sample_stock_df, monkeypatch):
+    """使用模拟数据、不写数据库的监控服务"""
+    service = MonitorService()
+    frames = {
+        "600489": sample_stock_df,
+        "000001": sample_stock_df.iloc[:200],
+        "600519": sample_stock_df.iloc[:300],
+    }
+    monkeypatch.setattr(
+        "app.services.monitor_service.data_service.get_stock_data",
+        lambda code, days=100, **kwargs: frames.get(code),
+    )
+    monkeypatch.setattr(
+        "app.services.monitor_service.data_service.get_spot_snapshot", lambda: None
+    )
+    monkeypatch.setattr(service, "_save_to_db", lambda result: None)
+    monkeypatch.setattr(
+        service,
+        "load_watchlist",
+        lambda: {"600489": "中金黄金", "000001": "平安银行", "600519": "贵州茅台", "999999": ""},
+    )
+    return service
+
+
+class TestMonitorService:
+    """测试监控服务"""
+
+    def test_check_watchlist(self, monitor_service):
+        """测试一次扫描检查所有股票"""
+        results = monitor_service.check_watchlist()
+
+        # 无数据的股票被跳过
+        assert sorted(r["stock_code"] for r in results) == ["000001", "600489", "600519"]
+        assert monitor_service.last_sweep["stock_count"] == 4
+        assert monitor_service.last_sweep["success_count"] == 3
+        assert set(monitor_service.latest_results) == {"000001", "600489", "600519"}
+
+        prices = {r["stock_code"]: r["price"] for r in results}
+        assert prices["000001"] != prices["600489"]
+
+    def test_alert_dedup_per_stock(self, monitor_service, monkeypatch):
+        """测试每只股票独立去重提醒"""
+        alerts = []
+        monkeypatch.setattr(monitor_service, "_trigger_alert", alerts.append)
+
+        buy_a = {"stock_code": "600489", "final_signal": "BUY"}
+        buy_b = {"stock_code": "000001", "final_signal": "BUY"}
+        sell_a = {"stock_code": "600489", "final_signal": "SELL"}
+        hold_a = {"stock_code": "600489", "final_signal": "HOLD"}
+
+        for result in (buy_a, buy_b, buy_a, hold_a, buy_b, sell_a, sell_a):
+            monitor_service._dispatch_alert(result)
+
+        assert alerts == [buy_a, buy_b, sell_a]
+        assert monitor_service.last_signals == {"600489": "SELL", "000001": "BUY"}
+
+    def test_switch_resets_dedup(self, monitor_service, monkeypatch):
+        """测试切换关注股票后重新提醒"""
+        alerts = []
+        monkeypatch.setattr(monitor_service, "_trigger_alert", alerts.append)
+        buy = {"stock_code": "000001", "final_signal": "BUY"}
+
+        monitor_service._dispatch_alert(buy)
+        monitor_service.set_stock("000001", "平安银行")
+        monitor_service._dispatch_alert(buy)
+
+        assert len(alerts) == 2
+
+    def test_alerts_persisted_and_read_async(self, monitor_service, db_session):
+        """测试提醒缓冲写入后可通过异步查询读取"""
+        result = {
+            "stock_code": "000001",
+            "final_signal": "BUY",
+            "signal_count": 4,
+            "price": 10.5,
+            "buy_signals": 4,
+            "sell_signals": 1,
+        }
+        monitor_service._dispatch_alert(result)
+        asyncio.run(write_buffer.flush_async())
+
+        alerts = asyncio.run(monitor_service.get_recent_alerts(code="000001"))
+        assert [(a["signal_type"], a["price"]) for a in alerts] == [("BUY", 10.5)]
+        assert alerts[0]["details"] == "4个买入信号, 1个卖出信号"
+
+    def test_concurrent_state_updates(self, sample_stock_df, monkeypatch):
+        """测试/current和全量扫描同时更新同一股票时状态更新串行执行，结果与全量计算一致"""
+        from tests.test_indicator_state import assert_same_indicators
+        from app.services.indicator_service import IndicatorService
+        from app.services.indicator_state import IndicatorState
+
+        service = MonitorService()
+        service._update_indicators("600489", sample_stock_df.iloc[:-1])
+
+        # 更新过程中让出线程，记录同一状态上同时进行的更新数
+        active, overlaps = [0], []
+        original_update = IndicatorState.update
+
+        def slow_update(state, bar):
+            active[0] += 1
+            overlaps.append(active[0])
+            time.sleep(0.001)
+            try:
+                return original_update(state, bar)
+            finally:
+                active[0] -= 1
+
+        monkeypatch.setattr(IndicatorState, "update", slow_update)
+        barrier = threading.Barrier(8)
+
+        def revise(i):
+            df = sample_stock_df.copy()
+            barrier.wait()
+            for j in range(5):
+                close = 10.0 + i + j / 10
+                df.loc[df.index[-1], ["close", "high", "low"]] = [close, close * 1.01, close * 0.99]
+                service._update_indicators("600489", df)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(revise, range(8)))
+
+        assert len(overlaps) == 40
+        assert max(overlaps) == 1
+
+        df = sample_stock_df.copy()
+        df.loc[df.index[-1], ["close", "high", "low"]] = [12.0, 12.12, 11.88]
+        assert_same_indicators(
+            service._update_indicators("600489", df),
+            IndicatorService().calculate_all_indicators(df),
+        )
+
+    def test_scan_market_from_local_bars(self, sample_stock_df, db_session):
+        """测试从本地日线横截面扫描全市场信号"""
+        from app.services.bar_store import bar_store
+
+        recent = sample_stock_df.iloc[-150:].assign(
+            date=pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=150)
+        )
+        for i, code in enumerate(["600489", "000001", "600519"]):
+            bar_store.save(code, recent.iloc[i * 10 :])
+        # 停牌：最后一根K线早于最新交易日
+        bar_store.save("601318", recent.iloc[:-5])
+
+        result = MonitorService().scan_market(days=180, min_buy_signals=0, limit=2)
+
+        assert result["date"] == recent["date"].iloc[-1].date().isoformat()
+        assert result["scanned"] == 3
+        assert result["stale"] == 1
+        assert result["count"] == 3
+        assert len(result["stocks"]) == 2
+        counts = [stock["buy_count"] for stock in result["stocks"]]
+        assert counts == sorted(counts, reverse=True)
+        assert {"code", "rsi", "macd_signal", "sell_count"} <= set(result["stocks"][0])
+
+    def test_scan_days_are_trading_days(self, sample_stock_df, db_session, monkeypatch):
+        """测试days按交易日计：读取的自然日窗口足以填满days根K线"""
+        from app.services.bar_store import bar_store
+        from app.services.indicator_service import IndicatorService
+
+        bar_store.save("600489", sample_stock_df.assign(
+            date=pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=len(sample_stock_df))
+        ))
+        widths = []
+        stack_bars = IndicatorService.stack_bars
+
+        def recording_stack_bars(bars, days):
+            codes, matrices = stack_bars(bars, days)
+            widths.append(matrices["close"].shape[1])
+            return codes, matrices
+
+        monkeypatch.setattr(
+            "app.services.monitor_service.indicator_service.stack_bars", recording_stack_bars
+        )
+
+        MonitorService().scan_market(days=120, min_buy_signals=0)
+        assert widths == [120]
+
+    def test_scan_endpoint_without_bars(self, test_client, db_session):
+        response = test_client.get("/api/indicators/scan")
+        assert response.status_code == 200
+        assert response.json()["scanned"] == 0
@@ -0,0 +1,70 @@
+"""
+序列化工具单元测试
+"""
+
+import json
+import math
+
+import msgpack
+from fastapi.responses import JSONResponse
+
+from app.services.serialization import FastJSONResponse, dumps_json, dumps_msgpack, loads_msgpack
+
+PAYLOAD = {
+    "industry": "贵金属",
+    "stocks": [
+        {"code": "600489", "name": "中金黄金", "price": 12.5, "change": 1.23, "volume": 350000},
+        {"code": "600547", "name": "山东黄金", "price": 25.1, "change": -0.4, "volume": 120000},
+    ],
+    "count": 2,
+}
+
+
+class TestSerialization:
+    """测试JSON和MessagePack编码"""
+
+    def test_fast_json_matches_standard(self):
+        """测试orjson响应与标准JSON响应内容一致"""
+        fast = FastJSONResponse(PAYLOAD).body
+        standard = JSONResponse(PAYLOAD).body
+        assert json.loads(fast) == json.loads(standard)
+        assert "贵金属".encode() in fast
+
+    def test_fast_json_nan_as_null(self):
+        """测试NaN编码为null"""
+        assert json.loads(FastJSONResponse({"value": math.nan}).body) == {"value": None}
+
+    def test_dumps_json_compact(self):
+        """测试WebSocket文本编码为紧凑JSON"""
+        assert dumps_json({"type": "pong", "name": "中金黄金"}) == '{"type":"pong","name":"中金黄金"}'
+
+    def test_msgpack_roundtrip(self):
+        """测试MessagePack编码可还原且更小"""
+        packed = dumps_msgpack(PAYLOAD)
+        assert loads_msgpack(packed) == PAYLOAD
+        assert len(packed) < len(dumps_json(PAYLOAD).encode())
+
+
+class TestMsgpackWebSocket:
+    """测试 /ws 的MessagePack协商"""
+
+    def test_msgpack_subprotocol(self, test_client):
+        """测试声明msgpack子协议后收发二进制帧"""
+        with test_client.websocket_connect("/ws", subprotocols=["msgpack"]) as ws:
+            assert ws.accepted_subprotocol == "msgpack"
+            ws.send_bytes(msgpack.packb({"type": "ping"}))
+            assert msgpack.unpackb(ws.receive_bytes())["type"] == "pong"
+
+            # 文本帧仍可接收
+            ws.send_text('{"type": "subscribe", "stocks": ["600489"]}')
+            assert msgpack.unpackb(ws.receive_bytes()) == {
+                "type": "subscribed",
+                "topics": ["stock:600489"],
+            }
+
+    def test_json_by_default(self, test_client):
+        """测试未声明子协议时仍使用JSON文本帧"""
+        with test_client.websocket_connect("/ws") as ws:
+            assert ws.accepted_subprotocol is None
+            ws.send_text('{"type": "ping"}')
+            assert ws.receive_json()["type"] == "pong"
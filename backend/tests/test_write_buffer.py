@@ -0,0 +1,103 @@
+"""
+缓冲写入单元测试
+"""
+
+import asyncio
+import threading
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.database import IndicatorHistory, SessionLocal, SignalAlert, engine
+from app.services.write_buffer import WriteBuffer
+
+
+def history_row(code):
+    return {"stock_code": code, "timestamp": datetime.now(), "final_signal": "HOLD"}
+
+
+class TestWriteBuffer:
+    """测试批量写入缓冲区"""
+
+    def test_rows_written_on_flush(self, db_session):
+        """测试记录在flush时一次写入"""
+        buffer = WriteBuffer(max_rows=100)
+        for code in ("600489", "000001", "600519"):
+            buffer.add(IndicatorHistory, history_row(code))
+        buffer.add(SignalAlert, {"stock_code": "600489", "signal_type": "BUY", "signal_count": 4})
+
+        assert db_session.query(IndicatorHistory).count() == 0
+        assert buffer.pending_count() == 4
+
+        assert buffer.flush() == 4
+        assert buffer.pending_count() == 0
+        assert db_session.query(IndicatorHistory).count() == 3
+        assert db_session.query(SignalAlert).one().signal_type == "BUY"
+        assert buffer.flush() == 0
+
+    def test_flush_async(self, db_session):
+        """测试通过异步引擎写入"""
+        buffer = WriteBuffer(max_rows=100)
+        for code in ("600489", "000001"):
+            buffer.add(IndicatorHistory, history_row(code))
+
+        assert asyncio.run(buffer.flush_async()) == 2
+        assert buffer.pending_count() == 0
+        assert db_session.query(IndicatorHistory).count() == 2
+
+    def test_flush_async_waits_for_running_flush(self, db_session):
+        """测试异步写入等待正在进行的同步写入，批次按顺序写入"""
+        release = threading.Event()
+
+        def slow_session():
+            release.wait(5)
+            return SessionLocal()
+
+        buffer = WriteBuffer(max_rows=100, session_factory=slow_session)
+        buffer.add(IndicatorHistory, history_row("600489"))
+        writer = threading.Thread(target=buffer.flush)
+        writer.start()
+        while buffer.pending_count():
+            pass
+
+        async def run():
+            buffer.add(IndicatorHistory, history_row("000001"))
+            task = asyncio.create_task(buffer.flush_async())
+            await asyncio.sleep(0.1)
+            # 同步写入未完成前不取出新批次
+            assert not task.done()
+            assert buffer.pending_count() == 1
+            release.set()
+            return await task
+
+        assert asyncio.run(run()) == 1
+        writer.join()
+        rows = db_session.query(IndicatorHistory).order_by(IndicatorHistory.id).all()
+        assert [row.stock_code for row in rows] == ["600489", "000001"]
+
+    def test_flush_on_size_threshold(self, db_session):
+        """测试达到批量大小时自动写入"""
+        buffer = WriteBuffer(max_rows=3)
+        for i in range(4):
+            buffer.add(IndicatorHistory, history_row(f"60000{i}"))
+
+        assert db_session.query(IndicatorHistory).count() == 3
+        assert buffer.pending_count() == 1
+
+    def test_failed_flush_does_not_raise(self, db_session):
+        """测试写入失败时打印错误并丢弃该批次"""
+        buffer = WriteBuffer(max_rows=100)
+        # 主键冲突
+        buffer.add(IndicatorHistory, {"id": 1, **history_row("600489")})
+        buffer.add(IndicatorHistory, {"id": 1, **history_row("000001")})
+
+        assert buffer.flush() == 0
+        assert db_session.query(IndicatorHistory).count() == 0
+        assert buffer.pending_count() == 0
+
+
+def test_sqlite_wal_mode():
+    """测试SQLite连接启用WAL模式"""
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
@@ -98,6 +98,19 @@ export const ws = {
     return this.connection
   },
   
+  // 订阅股票或行业，订阅后只接收相关推送
+  subscribe(stocks = [], industries = []) {
+    if (this.connection && this.connection.readyState === WebSocket.OPEN) {
+      this.connection.send(JSON.stringify({ type: 'subscribe', stocks, industries }))
+    }
+  },
+  
+  unsubscribe(stocks = [], industries = []) {
+    if (this.connection && this.connection.readyState === WebSocket.OPEN) {
+      this.connection.send(JSON.stringify({ type: 'unsubscribe', stocks, industries }))
+    }
+  },
+  
   close() {
     if (this.connection) {
       this.connection.close()